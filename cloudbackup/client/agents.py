@@ -3,14 +3,24 @@ Rackspace Cloud Backup Agent API
 """
 from __future__ import print_function
 
-import datetime
+import collections
 import json
 import logging
-import requests
-import time
 import threading
 
+try:
+    # Python3
+    from sys import intern
+except ImportError:
+    # Python2
+    pass
+
+from cloudbackup.client.inventory import AgentInventory
+from cloudbackup.client.wake import KeepAwakeScheduler, WakeCoordinator
+from cloudbackup.common.cache import monotonic, TtlCache
 from cloudbackup.common.command import Command
+from cloudbackup.common.convert import date_to_epoch_ms, epoch_ms_to_datetime, size_to_bytes
+from cloudbackup.common.workers import get_rate_limiter, run_concurrently
 
 
 class ParameterError(Exception):
@@ -20,91 +30,22 @@ class ParameterError(Exception):
     pass
 
 
-# function for Agents class to use to keep a given agent awake
-def _keep_agent_wake_thread_fn(my_notifier=None, user=None, apikey=None, rse_app=None, rse_version=None, rse_agentkey=None, rse_log=None, rse_apihost=None, rse_period=None, apihost=None, agent_id=None):
+def _collect_results(results):
     """
-    (Internal) Thread function that will periodically post the wake agent message and look for the specified agent
-    Aside from my_notifier, the function maintains its own objects internally in thread local data storage for thread-safety purposes
-
-    Require parameters:
-        my_notifier - threading.Event object instance that signals thread termination
-        user - username for Keystone/Identity authentication
-        apikey - apikey for Keystone/Identity authentication
-        rse_app - RSE Application Name
-        rse_version - RSE Application Version
-        rse_agentkey - RSE Channel to listen to
-        rse_period - period between wake agent calls
-        apihost - Rackspace Cloud Backup API URL
-        agent_id -  machine agent identifier for the agent to monitor for
-
-    Option parameters:
-        rse_log - Base log file name, the thread will append data to create a unique RSE log file name for the thread's RSE queries. If not desired, specify None
-        rse_apihost - RSE API URL See cloudbackup.clients.rse.Rse for details
+    (Internal) Gather (key, value, exception) tuples into a dictionary of values and a dictionary of exceptions
     """
-    if None in (my_notifier, user, apikey, rse_app, rse_version, rse_agentkey, rse_period, apihost, agent_id):
-        raise RuntimeError('Invalid parameters. Some optional parameters were not properly specified')
-
-    log = logging.getLogger(__name__)
-
-    # For threading simplicity we are going to create thread local version of each of the required objects
-    import cloudbackup.client.auth
-    import cloudbackup.client.rse
-    data = threading.local()
-    data.thread_id = threading.current_thread().ident
-    data.log_prefix = 'RSE Wakeup Thread[{0:}] Log'.format(data.thread_id)
-    data.auth_engine = cloudbackup.client.auth.Authentication(user, apikey)
-    data.agent_engine = cloudbackup.client.agents.Agents(True, data.auth_engine, apihost)
-    data.logfile = None
-    if rse_log is not None:
-        data.logfile = '{0:}.thread_{1:}'.format(rse_log, data.thread_id)
-
-    log.debug('{0:}: {1:}'.format(data.log_prefix, data.logfile))
-    log.debug('{0:}: Agent Id - {1:}'.format(data.log_prefix, agent_id))
-    log.debug('{0:}: RSE Period - {1:}'.format(data.log_prefix, rse_period))
-
-    data.rse_engine = cloudbackup.client.rse.Rse(rse_app, rse_version, data.auth_engine, data.agent_engine, rse_agentkey, logfile=data.logfile, apihost=rse_apihost)
-
-    def __check_notifier(notifier):
-        """
-        Simple wrapper to check the notifier and return whether or not the loop should exit
-
-        Parameters:
-            notifier - threading.Event object instance
-
-        Returns:
-            True if the loop should continue (event is not set)
-            False if the loop should terminate (event is set)
-        """
-        if notifier.is_set():
-            notifier.clear()
-            log.debug('{0:}: Detected termination.'.format(data.log_prefix))
-            return False
-        return True
-
-    # 10 second timeout
-    rse_timeout = 10000
-
-    continue_loop = True
-
-    while continue_loop:
-        # Check the thread status before we try to wake the agent
-        continue_loop = __check_notifier(my_notifier)
-        if not continue_loop:
-            break
-
-        if data.agent_engine.WakeSpecificAgent(agent_id, data.rse_engine, rse_timeout):
-            # Agent is awake, so wait for the period before checking again
-            start_time = int(round(time.time() * 1000))
-            finish_time = start_time + rse_period
-            while ((int(round(time.time() * 1000))) < finish_time) and continue_loop:
-                # check the thread status every 1 second throughout the entire period wait
-                continue_loop = __check_notifier(my_notifier)
-                time.sleep(1)
+    values = {}
+    errors = {}
+    for key, value, ex in results:
+        if ex is None:
+            values[key] = value
         else:
-            # Failed to wake the agent
-            log.debug('{0:}: Failed to wake agent - {1:}'.format(data.log_prefix, agent_id))
+            errors[key] = ex
+    return (values, errors)
 
-    log.debug('{0:}: Terminating'.format(data.log_prefix))
+
+# Outcome of a bulk agent operation, see Agents.RemoveAgents() and Agents.EnableDisableAgents()
+AgentOperationResult = collections.namedtuple('AgentOperationResult', ['machine_agent_id', 'success', 'status_code', 'latency', 'dry_run'])
 
 
 class AgentDetailsNotAvailable(Exception):
@@ -121,27 +62,65 @@ class AgentConfigurationNotAvailable(Exception):
     pass
 
 
+class AgentListNotAvailable(Exception):
+    """
+    Agent List is not available
+    """
+    pass
+
+
 class AgentLogLevel(Command):
     """
     Object controlling the log levels for agents
     """
-    def __init__(self, sslenabled, authenticator, apihost):
+    def __init__(self, sslenabled, authenticator, apihost, selector=None, region=None):
+        """
+        Initialize the Agent Log Level control
+          sslenabled - True if using HTTPS; otherwise False
+          authenticator - instance of cloudbackup.client.auth.Authentication to use
+          apihost - server to use for API calls
+          selector - instance of cloudbackup.client.endpoints.EndpointSelector; if given the fastest reachable
+                     cloudBackup endpoint in 'region' replaces apihost, failing over when it cannot be
+                     reached, see cloudbackup.common.command.Command.SelectApiHost()
+          region - region (data center) to select the endpoint in; None for any region
+        """
         super(self.__class__, self).__init__(sslenabled, apihost, '/')
         self.log = logging.getLogger(__name__)
 
         # save the ssl status for the various reinits done for each API call supported
         self.sslenabled = sslenabled
         self.authenticator = authenticator
+        if selector is not None:
+            self.SelectApiHost(selector, 'cloudBackup', region)
         self.loglevel = {}
+        self._lock = threading.RLock()
 
     def __del__(self):
-        try:
-            if len(self.loglevel):
-                for machine_agent in self.loglevel.keys():
-                    while self.HasLogLevels(machine_agent):
-                        self.PopLogLevel(machine_agent)
-        except:
-            pass
+        """
+        Warn about any agents left with stacked log levels
+
+        Note: Nothing is restored here as it would mean API calls during garbage collection or
+              interpreter shutdown; call RestoreAll() with a deadline before releasing the object
+        """
+        stacked = self._stacked()
+        if len(stacked):
+            self.log.warning('Machine Agent Ids {0:} still have stacked log levels; call RestoreAll(deadline) to restore them'.format(sorted(entry[0] for entry in stacked)))
+
+    def _stacked(self):
+        """
+        (Internal) Return a list of (machine_agent_id, stack depth) for the agents with stacked log levels
+        """
+        with self._lock:
+            return [(machine_agent_id, len(stack)) for machine_agent_id, stack in self.loglevel.items() if len(stack)]
+
+    def _api_headers(self):
+        """
+        (Internal) Build the headers for an API call without modifying the object so it may be used from multiple threads
+        """
+        headers = {}
+        headers['X-Auth-Token'] = self.authenticator.AuthToken
+        headers['Content-Type'] = 'application/json; charset=utf-8'
+        return headers
 
     def GetLogLevel(self, machine_agent_id):
         """
@@ -155,11 +134,10 @@ class AgentLogLevel(Command):
             Debug
             Trace
             All
+
+        Note: Does not modify the object so it may be used from multiple threads
         """
-        self.ReInit(self.sslenabled, "/v1.0/agent/logging/" + str(machine_agent_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'application/json; charset=utf-8'
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.MakeUri(self.sslenabled, "/v1.0/agent/logging/" + str(machine_agent_id)), headers=self._api_headers())
         if res.status_code == 200:
             # the text will be data like "Warn" (with quotes) so remove the quotes.
             return res.text.replace('"', '')
@@ -181,13 +159,12 @@ class AgentLogLevel(Command):
             All
 
         'level' may also be a numeric value inclusively between 1 and 7.
+
+        Note: Does not modify the object so it may be used from multiple threads
         """
         if level not in ('Fatal', 'Error', 'Warn', 'Info', 'Debug', 'Trace', 'All', 1, 2, 3, 4, 5, 6, 7):
             raise ValueError('Log Level (' + str(level) + ') is not valid.')
 
-        self.ReInit(self.sslenabled, "/v1.0/agent/logging")
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'application/json; charset=utf-8'
         o = {}
         o['MachineAgentId'] = machine_agent_id
 
@@ -205,9 +182,7 @@ class AgentLogLevel(Command):
         else:
             o['LoggingLevelid'] = level
 
-        self.body = json.dumps(o)
-
-        res = requests.put(self.Uri, headers=self.Headers, data=self.Body)
+        res = self.session.put(self.MakeUri(self.sslenabled, "/v1.0/agent/logging"), headers=self._api_headers(), data=json.dumps(o))
         if res.status_code == 204:
             return True
         else:
@@ -220,24 +195,42 @@ class AgentLogLevel(Command):
 
         See SetLogLevel() for valid values of 'level'
 
+        Returns whether or not the new log level was set
+
         Note: Log Levels are stored as a Stack. Use PopLogLevel() to restore the log level to the value prior to calling PushLogLevel().
         """
-        if machine_agent_id not in self.loglevel:
-            self.loglevel[machine_agent_id] = list()
         current = self.GetLogLevel(machine_agent_id)
-        self.loglevel[machine_agent_id].append(current)
-        self.SetLogLevel(machine_agent_id, level)
+        with self._lock:
+            self.loglevel.setdefault(machine_agent_id, list()).append(current)
+        return self.SetLogLevel(machine_agent_id, level)
 
     def HasLogLevels(self, machine_agent_id):
         """
         Returns whether or not there are any log levels for the given machine agent id
         """
-        if machine_agent_id in self.loglevel:
-            if len(self.loglevel[machine_agent_id]):
-                return True
-            else:
+        with self._lock:
+            return len(self.loglevel.get(machine_agent_id, ())) > 0
+
+    def _restore_log_level(self, machine_agent_id, depth):
+        """
+        (Internal) Restore the log level saved 'depth' entries from the top of the agent's stack, discarding the entries above it
+
+        Returns whether or not the log level was restored
+        """
+        with self._lock:
+            stack = self.loglevel.get(machine_agent_id, [])
+            if not len(stack):
                 return False
+            index = max(0, len(stack) - depth)
+            level = stack[index]
+
+        if self.SetLogLevel(machine_agent_id, level):
+            with self._lock:
+                del self.loglevel[machine_agent_id][index:]
+            self.log.info('Restored Machine Agent Id (' + str(machine_agent_id) + ') Log Level to ' + level)
+            return True
         else:
+            self.log.error('Error while resetting the log level for Machine Agent Id (' + str(machine_agent_id) + ') to ' + level)
             return False
 
     def PopLogLevel(self, machine_agent_id):
@@ -245,22 +238,88 @@ class AgentLogLevel(Command):
         Restore the previous log level if it exists.
         If not log level has been saved, then it does nothing.
 
+        Returns whether or not the log level was restored
+
         Note: Log Levels are stored as a Stack. Log Levels are added to the stack by calling PushLogLevel().
         """
-        if machine_agent_id in self.loglevel:
-            if len(self.loglevel[machine_agent_id]):
-                index = len(self.loglevel[machine_agent_id]) - 1
-                level = self.loglevel[machine_agent_id][index]
-                if self.SetLogLevel(machine_agent_id, level):
-                    self.loglevel[machine_agent_id].pop(index)
-                    self.log.info('Restored Machine Agent Id (' + str(machine_agent_id) + ') Log Level to ' + level)
-                else:
-                    self.log.error('Error while resetting the log level for Machine Agent Id (' + str(machine_agent_id) + ') to ' + level)
-
-            else:
-                self.log.error('Machine Agent Id (' + str(machine_agent_id) + ') is already at the root log level. Nothing left to pop.')
-        else:
+        if not self.HasLogLevels(machine_agent_id):
             self.log.error('Machine Agent Id (' + str(machine_agent_id) + ') does not have any stacked log levels')
+            return False
+        return self._restore_log_level(machine_agent_id, 1)
+
+    def PushLogLevels(self, machine_agent_ids, level, max_workers=10, rate_limiter=None):
+        """
+        Push 'level' onto the log level stack of many agents concurrently, see PushLogLevel()
+          machine_agent_ids - iterable of agent ids to change
+          max_workers - maximum number of agents to change at once
+          rate_limiter - cloudbackup.common.workers.RateLimiter to pace the agents; defaults to the shared limiter
+
+        Returns a tuple of two dictionaries:
+            machine_agent_id -> whether or not the new log level was set
+            machine_agent_id -> exception for each agent whose change raised
+        """
+        if rate_limiter is None:
+            rate_limiter = get_rate_limiter()
+        return _collect_results(run_concurrently(lambda machine_agent_id: self.PushLogLevel(machine_agent_id, level), machine_agent_ids, max_workers=max_workers, rate_limiter=rate_limiter))
+
+    def PopLogLevels(self, machine_agent_ids, max_workers=10, rate_limiter=None):
+        """
+        Restore the previous log level of many agents concurrently, see PopLogLevel()
+
+        Returns a tuple of two dictionaries:
+            machine_agent_id -> whether or not the log level was restored
+            machine_agent_id -> exception for each agent whose restore raised
+        """
+        if rate_limiter is None:
+            rate_limiter = get_rate_limiter()
+        return _collect_results(run_concurrently(self.PopLogLevel, machine_agent_ids, max_workers=max_workers, rate_limiter=rate_limiter))
+
+    def RestoreAll(self, deadline=None, max_workers=10):
+        """
+        Restore every agent with stacked log levels to its original log level concurrently
+          deadline - maximum number of seconds to wait; None to wait until all agents are restored
+          max_workers - maximum number of agents to restore at once
+
+        Each agent is set straight to the bottom of its stack with a single call. At the deadline
+        the restores that have not started yet are cancelled; those agents keep their stacks and
+        are reported as not restored.
+
+        Note: A call already sent to the API when the deadline passes is not interrupted; it still
+              completes in the background and updates the agent's stack if it succeeds, but the
+              agent is reported as not restored
+
+        Returns a dictionary of machine_agent_id -> whether or not the log level was restored
+        """
+        pending = self._stacked()
+        results = dict((entry[0], False) for entry in pending)
+        if not len(pending):
+            return results
+
+        cancelled = threading.Event()
+
+        def __restore_one(entry):
+            """
+            Restore a single agent unless the deadline has passed
+            """
+            if cancelled.is_set():
+                return False
+            return self._restore_log_level(*entry)
+
+        def __restore():
+            """
+            Restore the agents, recording each result as it completes
+            """
+            for entry, result, ex in run_concurrently(__restore_one, pending, max_workers=max_workers):
+                results[entry[0]] = bool(result)
+
+        restorer = threading.Thread(target=__restore)
+        restorer.daemon = True
+        restorer.start()
+        restorer.join(deadline)
+        if restorer.is_alive():
+            cancelled.set()
+            self.log.warning('Log levels were not restored for all agents within {0:} seconds'.format(deadline))
+        return dict(results)
 
 
 class AgentDetails(object):
@@ -275,6 +334,7 @@ class AgentDetails(object):
 
         # Some cached data needed
         self._details = details
+        self._last_successful_backup = self
 
     @property
     def agent_id(self):
@@ -395,15 +455,28 @@ class AgentDetails(object):
         """
         return self._details['TimeOfLastSuccessfulBackup']
 
+    @property
+    def LastSuccessfulBackupEpoch(self):
+        """
+        When was the agent last succcessful with its backup? (milliseconds since the Unix Epoch; None if never)
+        """
+        if self._last_successful_backup is self:
+            self._last_successful_backup = date_to_epoch_ms(self.TimeOfLastSuccessfulBackup)
+        return self._last_successful_backup
+
     @property
     def DateTimeOfLastSuccessfulBackup(self):
         """
         When was the agent last succcessful with its backup?
         """
-        a = self.TimeOfLastSuccessfulBackup.split('(')
-        b = a[1].split(')')
-        unix_epoch = b[0]
-        return datetime.datetime.utcfromtimestamp(float(unix_epoch) / 1000.0)
+        return epoch_ms_to_datetime(self.LastSuccessfulBackupEpoch)
+
+    @property
+    def BackupVaultBytes(self):
+        """
+        Current size of the Backup Vault in bytes
+        """
+        return size_to_bytes(self.BackupVaultSize)
 
     @property
     def UseServiceNet(self):
@@ -419,6 +492,70 @@ class AgentDetails(object):
         """
         return self._details['HostServerId']
 
+    def Compact(self):
+        """
+        Return a CompactAgentDetails holding the same agent
+        """
+        return CompactAgentDetails(self._details)
+
+
+def _intern(value):
+    """
+    (Internal) Share a single copy of repeated strings (data centers, versions, etc) between agents
+    """
+    if isinstance(value, str):
+        return intern(value)
+    return value
+
+
+class CompactAgentDetails(object):
+    """
+    Memory efficient, read-only form of AgentDetails for holding large numbers of agents
+
+    Only the fields used for reporting are kept. Times and sizes are converted once when the
+    object is created: LastSuccessfulBackupEpoch is milliseconds since the Unix Epoch and
+    BackupVaultBytes is a number of bytes. Repeated strings are interned.
+
+    Accepts either the Agent Details or the agent list (/v1.0/user/agents) form of an agent.
+    """
+    __slots__ = ('agent_id', 'AgentVersion', 'Architecture', 'Flavor', 'BackupVaultBytes', 'CleanupAllowed', 'Datacenter', 'IPAddress', 'IsDisabled', 'IsEncrypted', 'MachineName', 'OperatingSystem', 'OperatingSystemVersion', 'Status', 'LastSuccessfulBackupEpoch', 'UseServiceNet', 'HostServerId')
+
+    def __init__(self, details):
+        self.agent_id = details['MachineAgentId']
+        self.AgentVersion = _intern(details['AgentVersion'])
+        self.Architecture = _intern(details['Architecture'])
+        self.Flavor = _intern(details['Flavor'])
+        self.BackupVaultBytes = size_to_bytes(details['BackupVaultSize'])
+        self.CleanupAllowed = details['CleanupAllowed']
+        self.Datacenter = _intern(details['Datacenter'])
+        self.IPAddress = details['IPAddress']
+        self.IsDisabled = details['IsDisabled']
+        self.IsEncrypted = details['IsEncrypted']
+        self.MachineName = details['MachineName']
+        self.OperatingSystem = _intern(details['OperatingSystem'])
+        self.OperatingSystemVersion = _intern(details['OperatingSystemVersion'])
+        self.Status = _intern(details['Status'])
+        self.LastSuccessfulBackupEpoch = date_to_epoch_ms(details['TimeOfLastSuccessfulBackup'])
+        self.UseServiceNet = details['UseServiceNet']
+        self.HostServerId = details['HostServerId']
+
+    def __repr__(self):
+        return 'CompactAgentDetails(agent_id={0:}, MachineName={1:})'.format(self.agent_id, self.MachineName)
+
+    @property
+    def IsEnabled(self):
+        """
+        Is the Agent Enabled?
+        """
+        return not self.IsDisabled
+
+    @property
+    def DateTimeOfLastSuccessfulBackup(self):
+        """
+        When was the agent last succcessful with its backup?
+        """
+        return epoch_ms_to_datetime(self.LastSuccessfulBackupEpoch)
+
 
 class AgentConfiguration(object):
     """
@@ -434,6 +571,14 @@ class AgentConfiguration(object):
 
         # some cached data needed
         self._configuration = configuration
+        self._build_indexes()
+
+    @property
+    def Configuration(self):
+        """
+        The agent configuration as returned by the API
+        """
+        return self._configuration
 
     # Volumes[]
     # -> DataServices
@@ -561,85 +706,80 @@ class AgentConfiguration(object):
     def RseHeartbeatConfig(self):
         return self.Rse['Heartbeat']
 
+    def _build_indexes(self):
+        """
+        (Internal) Index the backup configurations and volumes so the lookups below do not scan the lists
+
+        Note: When duplicates exist the indexes return the same entries the original list scans did
+        """
+        self._backups_by_id = {}
+        self._backups_by_name = {}
+        self._backup_name_to_id = {}
+        self._backup_id_to_name = {}
+        for backupconfig in self._configuration.get('BackupConfigurations', []):
+            self._backups_by_id.setdefault(backupconfig['Id'], backupconfig)
+            self._backups_by_name.setdefault(backupconfig['Name'], backupconfig)
+            self._backup_name_to_id[backupconfig['Name']] = backupconfig['Id']
+            self._backup_id_to_name[backupconfig['Id']] = backupconfig['Name']
+
+        self._volumes_by_uri = {}
+        for volume in self._configuration.get('Volumes', []):
+            self._volumes_by_uri[volume['Uri']] = volume
+
     def GetBackupIds(self):
         """
         Retrieve the list of Backup Configuration Ids for the agent as reported by GetAgentConfiguration()
         """
-        backupids = set()
-        for backupconfig in self.BackupConfigurations:
-            backupids.add(backupconfig['Id'])
-        return backupids
+        return set(self._backups_by_id)
 
     def GetBackupNames(self):
         """
         Retrieve the list of Backup Configuration Names for the agent as reported by GetAgentConfiguration()
         """
-        backupnames = set()
-        for backupconfig in self.BackupConfigurations:
-            backupnames.add(backupconfig['Name'])
-        return backupnames
+        return set(self._backups_by_name)
 
     def GetBackupNameIdMap(self):
         """
         Retrieve the list of Backup Configuration Names for the agent as reported by GetAgentConfiguration()
         """
-        backupnamemap = {}
-        for backupconfig in self.BackupConfigurations:
-            backupnamemap[backupconfig['Name']] = backupconfig['Id']
-        return backupnamemap
+        return dict(self._backup_name_to_id)
 
     def GetBackupIdNameMap(self):
         """
         Retrieve the list of Backup Configuration Names for the agent as reported by GetAgentConfiguration()
         """
-        backupidmap = {}
-        for backupconfig in self.BackupConfigurations:
-            backupidmap[backupconfig['Id']] = backupconfig['Name']
-        return backupidmap
+        return dict(self._backup_id_to_name)
 
     def GetBackupIdFromName(self, backup_name):
         """
         Translate the backup name into a backup id based on the agent data reported by GetAgentConfiguration()
-
-        Note: It would be more performant to simply retrieve the configuration by the name instead of doing the translation
         """
-        backupnamemap = self.GetBackupNameIdMap()
-        return backupnamemap[backup_name]
+        return self._backup_name_to_id[backup_name]
 
     def GetBackupNameFromId(self, backup_id):
         """
         Translate the backup id into a backup name based on the agent data reported by GetAgentConfiguration()
-
-        Note: It would be more performant to simply retrieve the configuration by the id instead of doing the translation
         """
-        backupidmap = self.GetBackupIdNameMap()
-        return backupidmap[backup_id]
+        return self._backup_id_to_name[backup_id]
 
     def GetBackupConfigurationById(self, backup_id):
         """
         Retrieve the entire backup configuration for the agent given a backup id, data as reported by GetAgentConfiguration()
         """
-        backupconf = {}
-        for backupconfig in self.BackupConfigurations:
-            if backupconfig['Id'] == backup_id:
-                backupconf = backupconfig
-                break
-            else:
-                continue
-        return backupconf
+        return self._backups_by_id.get(backup_id, {})
 
     def GetBackupConfigurationByName(self, backup_name):
         """
         Retrieve the entire backup configuration for the agent given a backup id, data as reported by GetAgentConfiguration()
         """
-        backupconf = {}
-        for backupconfig in self.BackupConfigurations:
-            if backupconfig['Name'] == backup_name:
-                backupconf = backupconfig
-                break
-            else:
-                continue
-        return backupconf
+        return self._backups_by_name.get(backup_name, {})
+
+    def GetVolumeByUri(self, volume_uri):
+        """
+        Retrieve the volume with the given Uri, data as reported by GetAgentConfiguration()
+        Returns an empty dictionary if there is no such volume
+        """
+        return self._volumes_by_uri.get(volume_uri, {})
 
     def GetVaultDbContainer(self, backup_name=None):
         """
@@ -660,15 +800,10 @@ class AgentConfiguration(object):
         Retrieve the URI for the VaultDB, data as reported by GetAgentConfiguration()
         """
         try:
-            vaultvolume = {}
             if backup_name is not None:
                 backupconfig = self.GetBackupConfigurationByName(backup_name)
-                volumeuri = backupconfig['VolumeUri']
                 # As there may be numerous volumes we match it up against the backup configuration we are looking for
-                # Don't know if there is a better way or not...but this will work for now
-                for volume in self.Volumes:
-                    if volume['Uri'] == volumeuri:
-                        vaultvolume = volume
+                vaultvolume = self.GetVolumeByUri(backupconfig['VolumeUri'])
             else:
                 vaultvolume = self.Volumes[0]
 
@@ -687,13 +822,8 @@ class AgentConfiguration(object):
         """
         try:
             backupconfig = self.GetBackupConfigurationByName(backup_name)
-            volumeuri = backupconfig['VolumeUri']
-            vaultvolume = {}
             # As there may be numerous volumes we match it up against the backup configuration we are looking for
-            # Don't know if there is a better way or not...but this will work for now
-            for volume in self.Volumes:
-                if volume['Uri'] == volumeuri:
-                    vaultvolume = volume
+            vaultvolume = self.GetVolumeByUri(backupconfig['VolumeUri'])
             vaultdburi = 'BACKUPS/v2.0/' + vaultvolume['BackupVaultId'] + '/BUNDLES/' + '{0:010}'.format(bundle_id)
             self.log.debug('VaultDB Path: ' + vaultdburi)
             return vaultdburi
@@ -708,40 +838,47 @@ class Agents(Command):
     Presently supports the RAX v1.0 API
     """
 
-    def __init__(self, sslenabled, authenticator, apihost):
+    def __init__(self, sslenabled, authenticator, apihost, cache_ttl=300, cache_size=10000, selector=None, region=None):
         """
         Initialize the Agent access
           sslenabled - True if using HTTPS; otherwise False
           authenticator - instance of cloudbackup.client.auth.Authentication to use
           apihost - server to use for API calls
+          cache_ttl - number of seconds to keep agent details and configurations before retrieving them again
+          cache_size - maximum number of agent details (and agent configurations) to keep
+          selector - instance of cloudbackup.client.endpoints.EndpointSelector; if given the fastest reachable
+                     cloudBackup endpoint in 'region' replaces apihost, failing over when it cannot be
+                     reached, see cloudbackup.common.command.Command.SelectApiHost()
+          region - region (data center) to select the endpoint in; None for any region
         """
         super(self.__class__, self).__init__(sslenabled, apihost, '/')
         self.log = logging.getLogger(__name__)
         # save the ssl status for the various reinits done for each API call supported
         self.sslenabled = sslenabled
         self.authenticator = authenticator
+        self.region = region
+        if selector is not None:
+            self.SelectApiHost(selector, 'cloudBackup', region)
         # Some cached data needed, set to invalid values by default
-        self.agents = {}
-        self.configurations = {}
+        self.agents = TtlCache(ttl=cache_ttl, maxsize=cache_size)
+        self.configurations = TtlCache(ttl=cache_ttl, maxsize=cache_size)
         self.o = {}
         self.snapshot_id = -1
-        self.wake_agent_threads = []
-        self.loglevel = AgentLogLevel(sslenabled, authenticator, apihost)
+        self.wake_scheduler = None
+        self.wake_coordinator = None
+        self.inventory = AgentInventory(self.GetAgentList, ttl=cache_ttl)
+        self.loglevel = AgentLogLevel(sslenabled, authenticator, apihost, selector=selector, region=region)
 
     def __del__(self):
         del self.loglevel
 
-        # Loop through and tell all threads to terminate
-        # Do not wait for them to terminate here so that all get the
-        # message in a timely manner
-        for a_thread in self.wake_agent_threads:
-            self.log.debug('Telling RSE Wakeup Thread {0:} to terminate'.format(a_thread['id']))
-            a_thread['terminator'].set()
+        if self.wake_scheduler is not None:
+            self.log.debug('Stopping the Keep Awake Scheduler')
+            self.wake_scheduler.Stop()
 
-        # Now repeat and wait for them to terminate
-        for a_thread in self.wake_agent_threads:
-            self.log.debug('Waiting for RSE Wakeup Thread {0:} to rejoin'.format(a_thread['id']))
-            a_thread['thread'].join()
+        if self.wake_coordinator is not None:
+            self.log.debug('Stopping the Wake Coordinator')
+            self.wake_coordinator.Stop()
 
     def WakeAgents(self):
         """
@@ -753,10 +890,21 @@ class Agents(Command):
         self.headers['X-Auth-Token'] = self.authenticator.AuthToken
         self.headers['Content-Type'] = 'application/json; charset=utf-8'
         self.log.debug('headers: %s', self.Headers)
-        res = requests.post(self.Uri, headers=self.Headers)
+        res = self.session.post(self.Uri, headers=self.Headers)
         self.log.debug('Wake Agent: code = {0:}, reason = {1:}'.format(res.status_code, res.reason))
         return res.status_code
 
+    @property
+    def WakeCoordinator(self):
+        """
+        The cloudbackup.client.wake.WakeCoordinator shared by WakeSpecificAgent() and KeepAgentAwake()
+        """
+        if self.wake_coordinator is None:
+            # The coordinator runs on its own thread so give it its own Agents instance
+            coordinator_agents = Agents(self.sslenabled, self.authenticator, self.apihost, selector=self.selector, region=self.region)
+            self.wake_coordinator = WakeCoordinator(coordinator_agents)
+        return self.wake_coordinator
+
     def WakeSpecificAgent(self, machine_agent_id, rse, timeoutMilliseconds, keep_agent_awake=False, wake_period=None):
         """
         Using the API to move all agents to active poll mode and then check that a specific agent is polling.
@@ -764,175 +912,279 @@ class Agents(Command):
           rse - instance of the cloudbackup.client.rse.Rse class to use for listening to RSE
           timeoutMilliseconds - maximum time to check RSE for the data
           keep_agent_awake - whether or not to start a thread to keep posting the wake agent
-          wake_period - period between wake agent calls, should be less than the timeout interval for the current state of the agent
+          wake_period - seconds between wake agent calls, should be less than the timeout interval for the current state of the agent
             normally 70 seconds should be fine. If set to None, use the Real-Time Timeout as a basis and set appropriately defaulting to 70 if too small
-        """
-        # For up to timeoutMilliseconds try to wake all the agents on the account in use
-        start_time = int(round(time.time() * 1000))
-        finish_time = start_time + timeoutMilliseconds
-        wokeall = False
-        wakeup_status_code = 0
-        while ((int(round(time.time() * 1000))) < finish_time):
-            wakeup_status_code = self.WakeAgents()
-            if wakeup_status_code == 200:
-                wokeall = True
-                break
-        if wokeall:
-            # For up to timeoutMilleseconds look for the specified agent's heart beat
-            start_time = int(round(time.time() * 1000))
-            finish_time = start_time + timeoutMilliseconds
-            woke_agent = False
-            while ((int(round(time.time() * 1000))) < finish_time):
-                if rse.MonitorForHeartBeat(machine_agent_id):
-                    woke_agent = True
-                    break
-            if not woke_agent:
-                # Unable to find the agent's heart beat within the timeout period
-                self.log.error('Unable to locate agent id (' + str(machine_agent_id) + ') in RSE Heartbeats')
-            if woke_agent:
-                if keep_agent_awake:
-                    if wake_period is None:
-                        rse_heartbeat_config = self.GetRseHeartbeatConfig(machine_agent_id)
-                        self.log.debug('Rse config: {0:}'.format(rse_heartbeat_config))
-                        wake_period = rse_heartbeat_config['Timeout']['RealTime'] / 1000
-                        # create a buffer
-                        if wake_period > 6:
-                            wake_period = wake_period - 5
-                        elif wake_period > 2:
-                            wake_period = wake_period - 1
-                        else:
-                            # if it's too small then default to a reasonable time frame
-                            # UX uses approximately 70 seconds
-                            wake_period = 70
-
-                    self.KeepAgentAwake(machine_agent_id, rse, wake_period)
-            return woke_agent
-        else:
-            # Unable to use the API to wake the agents within the timeout period
-            self.log.error('Unable to wake all agents. Status Code = ' + str(wakeup_status_code))
-            return False
+
+        Note: Concurrent callers share the Wake Agents calls and RSE polling, see WakeCoordinator
+        """
+        woke_agent = self.WakeCoordinator.Wait(machine_agent_id, rse, timeoutMilliseconds / 1000.0)
+        if woke_agent and keep_agent_awake:
+            if wake_period is None:
+                rse_heartbeat_config = self.GetRseHeartbeatConfig(machine_agent_id)
+                self.log.debug('Rse config: {0:}'.format(rse_heartbeat_config))
+                wake_period = rse_heartbeat_config['Timeout']['RealTime'] / 1000
+                # create a buffer
+                if wake_period > 6:
+                    wake_period = wake_period - 5
+                elif wake_period > 2:
+                    wake_period = wake_period - 1
+                else:
+                    # if it's too small then default to a reasonable time frame
+                    # UX uses approximately 70 seconds
+                    wake_period = 70
+
+            self.KeepAgentAwake(machine_agent_id, rse, wake_period * 1000)
+        return woke_agent
 
     def KeepAgentAwake(self, machine_agent_id, rse, period):
         """
-        Start a thread that will periodically post Wake Agent and check that the agent is alive
+        Periodically post Wake Agent and check that the agent is alive
 
         Parameters:
             machine_agent_id - machine agent id of the agent to monitor for heart beats
             rse - RSE instance configured for the agent
-            period - period between posting wake agent messages
+            period - milliseconds between posting wake agent messages
 
         Note: period is starts after a successful find of the agent heartbeat
+        Note: All agents are kept awake by a single cloudbackup.client.wake.KeepAwakeScheduler thread
+              sharing this object's authentication
         """
-        wake_agent_thread = {}
-        wake_agent_thread['id'] = machine_agent_id
-        self.wake_agent_threads.append(wake_agent_thread)
-        for a_thread in self.wake_agent_threads:
-            if a_thread['id'] == machine_agent_id:
-                self.log.debug('Starting RSE Wakeup Thread for agent: {0:}'.format(machine_agent_id))
-                a_thread['terminator'] = threading.Event()
-                a_thread['thread'] = threading.Thread(target=_keep_agent_wake_thread_fn,
-                                                      kwargs={'user': self.authenticator.Username, 'apikey': self.authenticator.Apikey,
-                                                              'rse_app': rse.rsedata.app, 'rse_version': rse.rsedata.appVersion,
-                                                              'rse_agentkey': rse.agentkey, 'rse_log': rse.rselogfile,
-                                                              'rse_apihost': rse.apihost, 'rse_period': period,
-                                                              'apihost': self.apihost, 'agent_id': machine_agent_id,
-                                                              'my_notifier': wake_agent_thread['terminator']})
-                a_thread['thread'].start()
-                break
+        if self.wake_scheduler is None:
+            self.wake_scheduler = KeepAwakeScheduler(self.WakeCoordinator)
+
+        self.log.debug('Keeping agent awake: {0:}'.format(machine_agent_id))
+        self.wake_scheduler.Add(machine_agent_id, period / 1000.0, rse)
 
     def StopKeepAgentWake(self, machine_agent_id):
         """
-        Stop the thread that is posting the wake agents and monitoring for the given machine agent id
+        Stop posting the wake agents and monitoring for the given machine agent id
 
         Parameters:
             machine_agent_id - the machine agent identifier that is being monitored for
         """
-        for a_thread in self.wake_agent_threads:
-            if a_thread['id'] == machine_agent_id:
-                self.log.debug('Telling for RSE Wakeup Thread {0:} for agent {1:} to terminate'.format(a_thread['id'], machine_agent_id))
-                a_thread['terminator'].set()
-                self.log.debug('Waiting for RSE Wakeup Thread {0:} to rejoin'.format(a_thread['id']))
-                a_thread['thread'].join()
-                self.wake_agent_threads.remove(a_thread)
-                break
+        if self.wake_scheduler is not None:
+            self.log.debug('No longer keeping agent awake: {0:}'.format(machine_agent_id))
+            self.wake_scheduler.Remove(machine_agent_id)
+
+    #
+    # RSE Configuration
+    #
+    def GetRseHost(self, machine_agent_id):
+        """
+        Return the RSE host the agent is configured to use, see AgentConfiguration()
+        """
+        return self.AgentConfiguration(machine_agent_id).RseHost
+
+    def GetRseChannel(self, machine_agent_id):
+        """
+        Return the RSE channel the agent is configured to use, see AgentConfiguration()
+        """
+        return self.AgentConfiguration(machine_agent_id).RseChannel
+
+    def GetRseHeartbeatConfig(self, machine_agent_id):
+        """
+        Return the RSE heart beat configuration for the agent, see AgentConfiguration()
+        """
+        return self.AgentConfiguration(machine_agent_id).RseHeartbeatConfig
 
     #
     # Agent Details
     #
-    def GetAgentDetails(self, machine_agent_id):
+    def _api_headers(self):
         """
-        Retrieve all the information regarding the specified Agent ID
+        (Internal) Build the headers for an API call without modifying the object so it may be used from multiple threads
         """
-        self.agents = {}
-        self.ReInit(self.sslenabled, "/v1.0/agent/" + str(machine_agent_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'application/json; charset=utf-8'
-        res = requests.get(self.Uri, headers=self.Headers)
+        headers = {}
+        headers['X-Auth-Token'] = self.authenticator.AuthToken
+        headers['Content-Type'] = 'application/json; charset=utf-8'
+        return headers
+
+    def _get_agent_details(self, machine_agent_id):
+        """
+        (Internal) Retrieve the AgentDetails for the specified Agent ID
+
+        Note: Does not modify the object so it may be used from multiple threads
+        """
+        res = self.session.get(self.MakeUri(self.sslenabled, "/v1.0/agent/" + str(machine_agent_id)), headers=self._api_headers())
         if res.status_code == 200:
             self.log.debug('Agent Details(id: {0:}) - {1:}'.format(machine_agent_id, res.json()))
-            self.agents[machine_agent_id] = AgentDetails(details=res.json())
-            return True
+            return AgentDetails(details=res.json())
         else:
-            self.log.error('Unable to retrieve agent details for agent id ' + str(machine_agent_id) + ' system return code ' + str(res.status_code) + ' reason = ' + res.reason)
+            msg = 'Unable to retrieve agent details for agent id ' + str(machine_agent_id) + ' system return code ' + str(res.status_code) + ' reason = ' + res.reason
+            self.log.error(msg)
+            raise AgentDetailsNotAvailable(msg)
+
+    def GetAgentDetails(self, machine_agent_id):
+        """
+        Retrieve all the information regarding the specified Agent ID
+        """
+        try:
+            self.agents.Set(machine_agent_id, self._get_agent_details(machine_agent_id))
+            return True
+        except AgentDetailsNotAvailable:
             return False
 
+    def IterAgentDetails(self, machine_agent_ids, max_workers=10):
+        """
+        Retrieve the details for many agents concurrently
+          machine_agent_ids - iterable of agent ids to retrieve
+          max_workers - maximum number of requests to have outstanding at once
+
+        Yields a tuple of (machine_agent_id, AgentDetails, exception) as each agent completes, where
+        AgentDetails is None if the retrieval failed and exception is None if it succeeded.
+        Retrieved agents are also available via AgentDetails()
+        """
+        for machine_agent_id, details, ex in run_concurrently(self._get_agent_details, machine_agent_ids, max_workers=max_workers):
+            if ex is None:
+                self.agents.Set(machine_agent_id, details)
+            yield (machine_agent_id, details, ex)
+
+    def GetAgentDetailsBulk(self, machine_agent_ids, max_workers=10):
+        """
+        Retrieve the details for many agents concurrently, see IterAgentDetails()
+
+        Returns a tuple of two dictionaries:
+            machine_agent_id -> AgentDetails
+            machine_agent_id -> exception for each agent that could not be retrieved
+        """
+        return _collect_results(self.IterAgentDetails(machine_agent_ids, max_workers=max_workers))
+
     @property
     def GetAgentIds(self):
         """
-        Return a list of known agent ids for agents details retrieved by GetAgentDetails()
+        Return a list of agent ids whose details are cached, see GetAgentDetails()
         """
-        return self.agents.keys()
+        return self.agents.Keys()
 
     def AgentDetails(self, machine_agent_id):
         """
         The AgentDetails object describing the agent with the given machine_agent_id
+
+        If the agent is not cached, or its cache entry has expired, the details are retrieved from the API.
+        Raises AgentDetailsNotAvailable if they cannot be retrieved.
         """
-        try:
-            return self.agents[machine_agent_id]
-        except LookupError:
-            msg = 'Machine Agent Id ({0:}) not available. Did you call GetAgentDetails() for that agent?'.format(machine_agent_id)
-            self.log.error(msg)
-            raise AgentDetailsNotAvailable(msg)
+        return self.agents.GetOrLoad(machine_agent_id, self._get_agent_details)
 
     #
     # Agent Configurations
     #
+    def _get_agent_configuration(self, machine_agent_id):
+        """
+        (Internal) Retrieve the AgentConfiguration for the given agent
+
+        Note: Does not modify the object so it may be used from multiple threads
+        """
+        res = self.session.get(self.MakeUri(self.sslenabled, "/v1.0/agent/configuration/" + str(machine_agent_id)), headers=self._api_headers())
+        if res.status_code == 200:
+            return AgentConfiguration(configuration=res.json())
+        else:
+            msg = 'Unable to retrieve agent configuration for agent id ' + str(machine_agent_id) + '. Server returned ' + str(res.status_code) + ': ' + res.text + ' Reason: ' + res.reason
+            self.log.error(msg)
+            raise AgentConfigurationNotAvailable(msg)
+
     def GetAgentConfiguration(self, machine_agent_id):
         """
         Retrieve the Configuration for the given agent
         """
-        self.ReInit(self.sslenabled, "/v1.0/agent/configuration/" + str(machine_agent_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'application/json; charset=utf-8'
-        res = requests.get(self.Uri, headers=self.Headers)
-        if res.status_code == 200:
-            self.configurations[machine_agent_id] = AgentConfiguration(configuration=res.json())
+        try:
+            self.configurations.Set(machine_agent_id, self._get_agent_configuration(machine_agent_id))
             return True
-        else:
-            self.log.error('Unable to retrieve agent configuration for agent id ' + str(machine_agent_id) + '. Server returned ' + str(res.status_code) + ': ' + res.text + ' Reason: ' + res.reason)
+        except AgentConfigurationNotAvailable:
             return False
 
+    def IterAgentConfigurations(self, machine_agent_ids, max_workers=10):
+        """
+        Retrieve the configurations for many agents concurrently
+          machine_agent_ids - iterable of agent ids to retrieve
+          max_workers - maximum number of requests to have outstanding at once
+
+        Yields a tuple of (machine_agent_id, AgentConfiguration, exception) as each agent completes, where
+        AgentConfiguration is None if the retrieval failed and exception is None if it succeeded.
+        Retrieved configurations are also available via AgentConfiguration()
+        """
+        for machine_agent_id, configuration, ex in run_concurrently(self._get_agent_configuration, machine_agent_ids, max_workers=max_workers):
+            if ex is None:
+                self.configurations.Set(machine_agent_id, configuration)
+            yield (machine_agent_id, configuration, ex)
+
+    def GetAgentConfigurationsBulk(self, machine_agent_ids, max_workers=10):
+        """
+        Retrieve the configurations for many agents concurrently, see IterAgentConfigurations()
+
+        Returns a tuple of two dictionaries:
+            machine_agent_id -> AgentConfiguration
+            machine_agent_id -> exception for each agent that could not be retrieved
+        """
+        return _collect_results(self.IterAgentConfigurations(machine_agent_ids, max_workers=max_workers))
+
     @property
     def AgentConfigurationIds(self):
         """
-        Return a list of known agent ids for agent configurations retrieved by GetAgentConfiguration()
+        Return a list of agent ids whose configurations are cached, see GetAgentConfiguration()
         """
-        return self.configurations.keys()
+        return self.configurations.Keys()
 
     def AgentConfiguration(self, machine_agent_id):
         """
         Return the AgentConfiguration object containing the configuration for the agent with the given machine_agent_id
+
+        If the configuration is not cached, or its cache entry has expired, it is retrieved from the API.
+        Raises AgentConfigurationNotAvailable if it cannot be retrieved.
         """
-        try:
-            return self.configurations[machine_agent_id]
-        except LookupError:
-            msg = 'Machine Agent Id ({0:}) not available. Did you call GetAgentConfiguration() for that agent?'.format(machine_agent_id)
-            self.log.error(msg)
-            raise AgentConfigurationNotAvailable(msg)
+        return self.configurations.GetOrLoad(machine_agent_id, self._get_agent_configuration)
+
+    def InvalidateAgent(self, machine_agent_id):
+        """
+        Drop the cached details and configuration for the given agent so the next access retrieves them again
+        """
+        self.agents.Invalidate(machine_agent_id)
+        self.configurations.Invalidate(machine_agent_id)
+
+    def InvalidateAllAgents(self):
+        """
+        Drop all cached agent details and configurations
+        """
+        self.agents.Clear()
+        self.configurations.Clear()
 
     #
     # Agent Cleanup
     #
+    def GetAgentList(self):
+        """
+        Retrieve the list of all agents registered to the user (/v1.0/user/agents)
+
+        Returns a list of dictionaries, see GetAllAgentsForHost(). Raises AgentListNotAvailable on failure.
+
+        Note: Does not modify the object so it may be used from multiple threads
+        """
+        res = self.session.get(self.MakeUri(self.sslenabled, "/v1.0/user/agents"), headers=self._api_headers())
+        if res.status_code == 200:
+            try:
+                return list(res.json())
+            except ValueError:
+                self.log.error('Unable to retrieve all agents from the returned agent list')
+                self.log.error('system response: ' + res.text)
+                raise AgentListNotAvailable('Unable to parse the agent list')
+        else:
+            msg = 'Unable to retrieve the agent list. system return code ' + str(res.status_code) + ' reason = ' + res.reason
+            self.log.error(msg)
+            self.log.error('system response: ' + res.text)
+            raise AgentListNotAvailable(msg)
+
+    def GetCompactAgentList(self):
+        """
+        Retrieve the list of all agents registered to the user as CompactAgentDetails, see GetAgentList()
+        """
+        return [CompactAgentDetails(agent) for agent in self.GetAgentList()]
+
+    @property
+    def Inventory(self):
+        """
+        The cloudbackup.client.inventory.AgentInventory holding the indexed agent list
+        """
+        return self.inventory
+
     def GetAllAgentsForHost(self, cloud_server_name=None, cloud_server_id=None, cloud_server_ips=None):
         """
         Retrieve a list (set) of agent identifiers for a given cloud server
@@ -957,115 +1209,175 @@ class Agents(Command):
                 TimeOfLastSuccessfulBackup
                 UseServiceNet
                 HostServerId
+
+        Note: The agent list is shared through the Inventory and only retrieved again once it expires
         """
         if cloud_server_name is None and cloud_server_id is None and cloud_server_ips is None:
             raise ParameterError('Neither Cloud Server Name nor Cloud Server Id (HostServerId) nor Cloud Server IPs were specified. Unable to match a server.')
 
-        self.ReInit(self.sslenabled, "/v1.0/user/agents")
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'application/json; charset=utf-8'
-        res = requests.get(self.Uri, headers=self.Headers)
-        if res.status_code == 200:
-            agentlist = list()
-            try:
-                usersagentlist = res.json()
-                for agent in usersagentlist:
-                    self.log.debug('Agent: ' + str(agent))
-                    if cloud_server_id is not None and 'HostServerId' in agent:
-                        self.log.debug('Checking Id Match: {0:} == {1:}'.format(cloud_server_id, agent['HostServerId']))
-                        if agent['HostServerId'] == cloud_server_id:
-                            self.log.debug('Id Matched: Adding ' + str(agent))
-                            agentlist.append(agent)
-                            continue
-
-                    if cloud_server_name is not None and 'MachineName' in agent:
-                        self.log.debug('Checking Name Match: {0:} == {1:}'.format(cloud_server_name, agent['MachineName']))
-                        if agent['MachineName'] == cloud_server_name:
-                            self.log.debug('Name Matched: Adding ' + str(agent))
-                            agentlist.append(agent)
-                            continue
-
-                    if cloud_server_ips is not None and 'IPAddress' in agent:
-                        self.log.debug('Checking IP Match: {0:} in {1:}'.format(agent['IPAddress'], cloud_server_ips))
-                        if agent['IPAddress'] in cloud_server_ips:
-                            self.log.debug('IP Matched: Adding ' + str(agent))
-                            agentlist.append(agent)
-                            continue
-
-            except LookupError:
-                self.log.error('Unable to retrieve all agents from the returned agent list')
-                self.log.error('system response: ' + res.text)
-                self.log.error('system reason: ' + res.reason)
-
-            return agentlist
-        else:
+        try:
+            return self.inventory.MatchHost(cloud_server_name, cloud_server_id, cloud_server_ips)
+        except AgentListNotAvailable:
             if cloud_server_name is not None:
-                self.log.error('Unable to retrieve all agents for cloud server (name: ' + cloud_server_name + ') system return code ' + str(res.status_code))
+                self.log.error('Unable to retrieve all agents for cloud server (name: ' + cloud_server_name + ')')
             if cloud_server_id is not None:
-                self.log.error('Unable to retrieve all agents for cloud server (id: ' + cloud_server_id + ') system return code ' + str(res.status_code))
-            self.log.error('system response: ' + res.text)
-            self.log.error('system reason: ' + res.reason)
+                self.log.error('Unable to retrieve all agents for cloud server (id: ' + cloud_server_id + ')')
             return list()
 
-    def RemoveAgent(self, machine_agent_id):
+    def GetAllAgentsForHosts(self, hosts):
         """
-        De-register the agent from the Rackspace Cloud Backup API
+        Match many cloud servers against a single copy of the agent list
+            hosts - iterable of (cloud_server_name, cloud_server_id, cloud_server_ips) tuples; unknown values may be None
+
+            Returns a list containing the list of matching agents for each host, in the order given. See GetAllAgentsForHost()
         """
-        self.ReInit(self.sslenabled, "/v1.0/agent/delete")
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'application/json; charset=utf-8'
-        self.o = {}
-        self.o['MachineAgentId'] = machine_agent_id
-        self.body = json.dumps(self.o)
-        res = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+        hosts = list(hosts)
+        for cloud_server_name, cloud_server_id, cloud_server_ips in hosts:
+            if cloud_server_name is None and cloud_server_id is None and cloud_server_ips is None:
+                raise ParameterError('Neither Cloud Server Name nor Cloud Server Id (HostServerId) nor Cloud Server IPs were specified. Unable to match a server.')
+
+        try:
+            return self.inventory.MatchHosts(hosts)
+        except AgentListNotAvailable:
+            self.log.error('Unable to retrieve all agents for {0:} cloud servers'.format(len(hosts)))
+            return [list() for host in hosts]
+
+    def _remove_agent(self, machine_agent_id):
+        """
+        (Internal) Post the agent removal and return the response
+
+        Note: Does not modify the object so it may be used from multiple threads
+        """
+        body = json.dumps({'MachineAgentId': machine_agent_id})
+        res = self.session.post(self.MakeUri(self.sslenabled, "/v1.0/agent/delete"), headers=self._api_headers(), data=body)
         if res.status_code == 204:
+            self.InvalidateAgent(machine_agent_id)
+            self.inventory.Discard(machine_agent_id)
             self.log.info('Removed agent id ' + str(machine_agent_id))
+        else:
+            self.log.error('Unable to remove agent id ' + str(machine_agent_id) + ' system return code ' + str(res.status_code) + ' Reason: ' + res.reason)
+        return res
+
+    def RemoveAgent(self, machine_agent_id):
+        """
+        De-register the agent from the Rackspace Cloud Backup API
+        """
+        if self._remove_agent(machine_agent_id).status_code == 204:
             self.log.warn('Please restart the process to lookup this agent again as the agent id may have changed.')
             return True
         else:
-            self.log.error('Unable to remove agent id ' + str(machine_agent_id) + ' system return code ' + str(res.status_code) + ' Reason: ' + res.reason)
             return False
 
-    def RemoveAllAgentsForHost(self, agent_list):
+    def _bulk_operation(self, fn, machine_agent_ids, max_workers, rate_limiter, dry_run):
         """
-        Remove all agents in the system registered to the same user using the same host server id
-            host_server_id  - the host server id to remove agents from,
+        (Internal) Call fn(machine_agent_id) for each agent concurrently, yielding an AgentOperationResult as each completes
         """
-        agents_removed = []
-        for agent in agent_list:
-            if self.RemoveAgent(agent['MachineAgentId']):
-                agents_removed.append(agent['MachineAgentId'])
-        return agents_removed
+        if dry_run:
+            for machine_agent_id in machine_agent_ids:
+                yield AgentOperationResult(machine_agent_id, True, None, 0.0, True)
+            return
 
-    def EnableDisableAgent(self, machine_agent_id, enabled=True):
+        if rate_limiter is None:
+            rate_limiter = get_rate_limiter()
+
+        def __timed(machine_agent_id):
+            """
+            Call fn and measure how long it took
+            """
+            start = monotonic()
+            res = fn(machine_agent_id)
+            return (res.status_code, monotonic() - start)
+
+        for machine_agent_id, outcome, ex in run_concurrently(__timed, machine_agent_ids, max_workers=max_workers, rate_limiter=rate_limiter):
+            if ex is None:
+                yield AgentOperationResult(machine_agent_id, outcome[0] == 204, outcome[0], outcome[1], False)
+            else:
+                self.log.error('Agent operation failed for agent id {0:}: {1:}'.format(machine_agent_id, ex))
+                yield AgentOperationResult(machine_agent_id, False, None, None, False)
+
+    def IterRemoveAgents(self, machine_agent_ids, max_workers=10, rate_limiter=None, dry_run=False):
         """
-        Enable or Disable an agent
+        Remove many agents concurrently
+          machine_agent_ids - iterable of agent ids to remove
+          max_workers - maximum number of requests to have outstanding at once
+          rate_limiter - cloudbackup.common.workers.RateLimiter to pace the requests; defaults to the shared limiter
+          dry_run - if True nothing is removed; each agent is reported as it would be
+
+        Yields an AgentOperationResult as each agent completes
         """
-        self.ReInit(self.sslenabled, "/v1.0/agent/enable")
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'application/json; charset=utf-8'
+        return self._bulk_operation(self._remove_agent, machine_agent_ids, max_workers, rate_limiter, dry_run)
 
-        self.o = {}
-        self.o['MachineAgentId'] = machine_agent_id
-        self.o['Enable'] = enabled
-        self.body = json.dumps(self.o)
-        res = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+    def RemoveAgents(self, machine_agent_ids, max_workers=10, rate_limiter=None, dry_run=False):
+        """
+        Remove many agents concurrently, see IterRemoveAgents()
+
+        Returns a dictionary of machine_agent_id -> AgentOperationResult
+        """
+        return dict((result.machine_agent_id, result) for result in self.IterRemoveAgents(machine_agent_ids, max_workers=max_workers, rate_limiter=rate_limiter, dry_run=dry_run))
+
+    def RemoveAllAgentsForHost(self, agent_list, max_workers=10, dry_run=False):
+        """
+        Remove all agents in the system registered to the same user using the same host server id
+            agent_list - list of agent dictionaries to remove, see GetAllAgentsForHost()
+            max_workers - maximum number of removals to have outstanding at once
+            dry_run - if True nothing is removed
+
+            Returns the list of agent ids removed
+        """
+        machine_agent_ids = [agent['MachineAgentId'] for agent in agent_list]
+        results = self.RemoveAgents(machine_agent_ids, max_workers=max_workers, dry_run=dry_run)
+        return [machine_agent_id for machine_agent_id in machine_agent_ids if results[machine_agent_id].success]
+
+    def _enable_disable_agent(self, machine_agent_id, enabled):
+        """
+        (Internal) Post the agent status change and return the response
+
+        Note: Does not modify the object so it may be used from multiple threads
+        """
+        body = json.dumps({'MachineAgentId': machine_agent_id, 'Enable': enabled})
+        res = self.session.post(self.MakeUri(self.sslenabled, "/v1.0/agent/enable"), headers=self._api_headers(), data=body)
         if res.status_code == 204:
             # success
+            self.InvalidateAgent(machine_agent_id)
+            self.inventory.Update(machine_agent_id, {'IsDisabled': not enabled})
             self.log.info('Changed Agent Status - Machine Agent Id: {0:}, Enabled: {1:}'.format(machine_agent_id, enabled))
-            return True
 
         elif res.status_code == 401:
             # bad credentials
             self.log.warn('Invalid AuthToken')
-            return False
 
         elif res.status_code == 403:
             # no permissions
             self.log.warn('User does not have permission to enable/disable this system.')
-            return False
 
         else:
             # other issue - 400, 500, 503, or something else
             self.log.error('Error (code: {0:}): {1:}'.format(res.status_code, res.text))
-            return False
+        return res
+
+    def EnableDisableAgent(self, machine_agent_id, enabled=True):
+        """
+        Enable or Disable an agent
+        """
+        return self._enable_disable_agent(machine_agent_id, enabled).status_code == 204
+
+    def IterEnableDisableAgents(self, machine_agent_ids, enabled=True, max_workers=10, rate_limiter=None, dry_run=False):
+        """
+        Enable or Disable many agents concurrently
+          machine_agent_ids - iterable of agent ids to change
+          enabled - True to enable the agents; False to disable them
+          max_workers - maximum number of requests to have outstanding at once
+          rate_limiter - cloudbackup.common.workers.RateLimiter to pace the requests; defaults to the shared limiter
+          dry_run - if True nothing is changed; each agent is reported as it would be
+
+        Yields an AgentOperationResult as each agent completes
+        """
+        return self._bulk_operation(lambda machine_agent_id: self._enable_disable_agent(machine_agent_id, enabled), machine_agent_ids, max_workers, rate_limiter, dry_run)
+
+    def EnableDisableAgents(self, machine_agent_ids, enabled=True, max_workers=10, rate_limiter=None, dry_run=False):
+        """
+        Enable or Disable many agents concurrently, see IterEnableDisableAgents()
+
+        Returns a dictionary of machine_agent_id -> AgentOperationResult
+        """
+        return dict((result.machine_agent_id, result) for result in self.IterEnableDisableAgents(machine_agent_ids, enabled=enabled, max_workers=max_workers, rate_limiter=rate_limiter, dry_run=dry_run))
@@ -4,10 +4,13 @@ Rackspace Authentication API
 import datetime
 import json
 import logging
-import requests
 import time
 
+from cloudbackup.client.endpoints import EndpointSelector
+from cloudbackup.common import connections
+from cloudbackup.common.cache import TtlCache
 from cloudbackup.common.command import Command
+from cloudbackup.common.workers import run_concurrently
 
 
 class AuthenticationError(Exception):
@@ -49,7 +52,7 @@ class UserInformation(Command):
         self.log.debug('headers: %s', headers)
         self.log.debug('uri: %s', self.Uri)
 
-        response = requests.get(self.Uri, headers=headers)
+        response = self.session.get(self.Uri, headers=headers)
         if response.status_code in (200, 203):
             return response.json()
 
@@ -59,6 +62,72 @@ class UserInformation(Command):
             raise RuntimeError('Failed: {0:} - {1:}'.format(response.reason, response.text))
 
 
+class TenantInformation(Command):
+
+    def __init__(self, datacenter, tenantname):
+        apihost = get_identity_apihost(datacenter)
+        endpoint = '/v2.0/tenants?name={0:}'.format(tenantname)
+        super(self.__class__, self).__init__(True, apihost, endpoint)
+
+        self.log = logging.getLogger(__name__)
+
+    def get_information(self, auth_token):
+        headers = self.Headers
+        headers['X-Auth-Token'] = auth_token
+
+        self.log.debug('host: %s', self.apihost)
+        self.log.debug('body: %s', self.Body)
+        self.log.debug('headers: %s', headers)
+        self.log.debug('uri: %s', self.Uri)
+
+        response = self.session.get(self.Uri, headers=headers)
+        if response.status_code in (200, 203):
+            return response.json()
+
+        else:
+            self.log.error('reason: ' + response.reason)
+            self.log.error('failed to retrieve tenant: ' + response.text)
+            raise RuntimeError('Failed: {0:} - {1:}'.format(response.reason, response.text))
+
+
+# Identity lookups shared by all Authentication instances, keyed by (kind, datacenter, auth_token, name)
+# so that a token only ever sees what it retrieved itself
+IDENTITY_CACHE_TTL = 300
+_identity_cache = TtlCache(ttl=IDENTITY_CACHE_TTL, maxsize=100000)
+
+
+def _lookup_identity(lookup_class, kind, names, auth_token, datacenter, max_workers, use_cache):
+    """
+    (Internal) Resolve many user or tenant names concurrently through the identity cache
+
+    Returns a tuple of two dictionaries:
+        name -> identity data
+        name -> exception for the names that could not be resolved
+    """
+    results = {}
+    errors = {}
+    missing = []
+    for name in set(names):
+        data = None
+        if use_cache:
+            data = _identity_cache.Get((kind, datacenter, auth_token, name))
+        if data is None:
+            missing.append(name)
+        else:
+            results[name] = data
+
+    def __fetch(name):
+        return lookup_class(datacenter, name).get_information(auth_token)
+
+    for name, data, ex in run_concurrently(__fetch, missing, max_workers=max_workers):
+        if ex is None:
+            _identity_cache.Set((kind, datacenter, auth_token, name), data)
+            results[name] = data
+        else:
+            errors[name] = ex
+    return (results, errors)
+
+
 class Authentication(Command):
     """
     Username+ApiKey Authentication for an HTTP REST API
@@ -66,22 +135,60 @@ class Authentication(Command):
     """
 
     @staticmethod
-    def get_user_information(username, auth_token, datacenter='us'):
+    def get_user_information(username, auth_token, datacenter='us', use_cache=False):
         """
         Get the User information
+          use_cache - whether or not to accept a previously retrieved result, see get_users_information()
+        """
+        users, errors = Authentication.get_users_information([username], auth_token, datacenter=datacenter, use_cache=use_cache)
+        if username in errors:
+            raise errors[username]
+        return users[username]
+
+    @staticmethod
+    def get_users_information(usernames, auth_token, datacenter='us', max_workers=10, use_cache=True):
         """
-        user_info = UserInformation(datacenter, username)
-        user_data = user_info.get_information(auth_token)
-        return user_data
+        Get the User information for many users at once
+          usernames - iterable of usernames to look up
+          auth_token - token to authorize the lookups with
+          datacenter - data center whose identity service to query
+          max_workers - number of lookups to run concurrently
+          use_cache - whether or not to serve previously retrieved users from the cache; cached results
+                      may be up to IDENTITY_CACHE_TTL seconds old
+
+        Returns a tuple of two dictionaries:
+            username -> user information
+            username -> exception for each username that could not be retrieved
+        """
+        return _lookup_identity(UserInformation, 'user', usernames, auth_token, datacenter, max_workers, use_cache)
 
     @staticmethod
-    def get_tenant_information(username, auth_token, datacenter='us'):
+    def get_tenant_information(username, auth_token, datacenter='us', use_cache=False):
         """
         Get the Tenant information
+          username - name of the tenant to look up
+          use_cache - whether or not to accept a previously retrieved result, see get_users_information()
+        """
+        tenants, errors = Authentication.get_tenants_information([username], auth_token, datacenter=datacenter, use_cache=use_cache)
+        if username in errors:
+            raise errors[username]
+        return tenants[username]
+
+    @staticmethod
+    def get_tenants_information(tenantnames, auth_token, datacenter='us', max_workers=10, use_cache=True):
+        """
+        Get the Tenant information for many tenants at once
+
+        Parameters and return value are the same as get_users_information()
+        """
+        return _lookup_identity(TenantInformation, 'tenant', tenantnames, auth_token, datacenter, max_workers, use_cache)
+
+    @staticmethod
+    def clear_identity_cache():
+        """
+        Forget all cached user and tenant information
         """
-        raise NotImplementedError
-        # tenant_info = TenantInformation(datacenter, username)
-        # return tenant_info
+        _identity_cache.Clear()
 
     def __init__(self, userid, credentials, usertype='user', method='apikey', datacenter='us'):
         """
@@ -166,6 +273,7 @@ class Authentication(Command):
 
         self.body = json.dumps(self.o)
         self.auth_data = {}
+        self.endpoint_selector = None
 
     def GetToken(self, retry=5):
         """
@@ -177,7 +285,7 @@ class Authentication(Command):
         self.log.debug('body: %s', self.Body)
         self.log.debug('headers: %s', self.Headers)
         self.log.debug('uri: %s', self.Uri)
-        response = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+        response = self.session.post(self.Uri, headers=self.Headers, data=self.Body)
         if response.status_code is 200:
             self.auth_data = response.json()
             self.log.info('auth token: %s', self.auth_data['access']['token']['id'])
@@ -283,6 +391,15 @@ class Authentication(Command):
         except LookupError:
             raise AuthCredentialsErrors('Unable to retrieve authentication token')
 
+    @property
+    def Selector(self):
+        """
+        Retrieve the cloudbackup.client.endpoints.EndpointSelector shared by everything using this authentication
+        """
+        if self.endpoint_selector is None:
+            self.endpoint_selector = EndpointSelector(self)
+        return self.endpoint_selector
+
     @property
     def AuthExpirationTime(self):
         """
@@ -369,7 +486,7 @@ class Authentication(Command):
         self.log.debug('body: %s', self.Body)
         self.log.debug('headers: %s', headers)
         self.log.debug('uri: %s', self.Uri)
-        response = requests.get(self.Uri, headers=headers)
+        response = self.session.get(self.Uri, headers=headers)
 
         self.log.debug('Response ({0:}): {1:}'.format(response.status_code, response.text))
         if response.status_code in (200, 203):
@@ -461,3 +578,49 @@ class Authentication(Command):
             msg = 'Unable to retrieve DC URI for the currently authenticated user'
             self.log.error(msg)
             raise AuthenticationError(msg)
+
+    def SelectCloudBackupApiUri(self, dc=None):
+        """
+        Retrieve the fastest reachable CloudBackup API host, choosing between the public and ServiceNet
+        endpoints (and across DCs if dc is None) by probing each of them.
+
+        The result is suitable for the apihost parameter of the API clients (Agents, Backups, Restores).
+        A fixed host is not failed over; to have the clients fail over when the host cannot be reached
+        pass them the selector as well, f.e Agents(True, auth, auth.GetCloudBackupApiUri(dc), selector=auth.Selector, region=dc)
+        """
+        return self.Selector.GetBestApiHost('cloudBackup', region=dc, include_path=False)
+
+    def WarmUp(self, regions=None, agent_configurations=None, services=('cloudBackup', 'cloudFiles'), connections_per_host=1, max_workers=8, dns_ttl=None):
+        """
+        Pre-open pooled connections to the endpoints this session is going to use so the first
+        request against each does not pay the TLS handshake.
+
+          regions - list of regions (data centers) to warm up; None for every region in the service catalog
+          agent_configurations - iterable of cloudbackup.client.agents.AgentConfiguration whose RSE hosts should be warmed up
+          services - names of the services in the service catalog to warm up
+          connections_per_host - number of connections to open to each endpoint
+          max_workers - number of endpoints to warm up in parallel
+          dns_ttl - if given, also install the process-wide DNS Cache with this many seconds to live,
+                    see cloudbackup.common.connections.enable_dns_cache(); None leaves name resolution alone
+
+        Returns a dictionary mapping each URI to the seconds taken to warm it up, or the exception that prevented it.
+        See cloudbackup.common.connections.warm_up()
+        """
+        uris = set()
+        for service_name in services:
+            if regions is None:
+                uris.update(candidate['uri'] for candidate in self.Selector.GetCandidates(service_name))
+            else:
+                for region in regions:
+                    uris.update(candidate['uri'] for candidate in self.Selector.GetCandidates(service_name, region))
+
+        if agent_configurations is not None:
+            for agent_configuration in agent_configurations:
+                try:
+                    uris.add('https://{0:}/'.format(agent_configuration.RseHost))
+                except LookupError:
+                    self.log.debug('Agent configuration does not have an RSE host')
+
+        uris.add(self.Uri)
+        self.log.info('Warming up connections to {0:} endpoints'.format(len(uris)))
+        return connections.warm_up(uris, connections_per_host=connections_per_host, max_workers=max_workers, dns_ttl=dns_ttl)
@@ -5,15 +5,144 @@ from __future__ import print_function
 
 import json
 import logging
-import requests
 import time
 from time import sleep
 import types
 import uuid
 
+from cloudbackup.client.history import CompletedBackupHistory
+from cloudbackup.common.cache import monotonic, TtlCache
 from cloudbackup.common.command import Command
 from cloudbackup.utils import tz
 
+# Backup states after which a backup no longer changes
+BACKUP_FINAL_STATES = ('Completed', 'Skipped', 'Missed', 'Stopped', 'Failed', 'CompletedWithErrors')
+
+# Restore states by RestoreStateId
+RESTORE_STATES = {
+    0: 'Creating',
+    1: 'Queued',
+    2: 'InProgress',
+    3: 'Completed',
+    4: 'Stopped',
+    5: 'Failed',
+    6: 'StartRequested',
+    7: 'StopRequested',
+    8: 'Completed WithErrors',
+    9: 'Preparing'
+}
+
+# RestoreStateIds after which a restore no longer changes
+RESTORE_FINAL_STATES = (3, 4, 5, 7, 8)
+
+
+class _AvailableForRestoreError(RuntimeError):
+    """
+    (Internal) The list of backups available for restore could not be retrieved
+    """
+
+    def __init__(self, status_code, reason):
+        super(_AvailableForRestoreError, self).__init__('Received status code {0:}: {1:}'.format(status_code, reason))
+        self.status_code = status_code
+        self.reason = reason
+
+
+class _PathList(list):
+    """
+    (Internal) Inclusions or Exclusions list keeping the set of its (FileItemType, FilePath) entries
+
+    Paths added through AddPath() update the set in place. Any other change made through the list
+    itself, f.e by a caller editing BackupConfiguration.backup_config directly, drops the set so it
+    is rebuilt on the next lookup; checking it is O(1) otherwise.
+
+    Note: Changing the FileItemType or FilePath of an entry dictionary in place is not seen
+    """
+
+    def __init__(self, entries=()):
+        super(_PathList, self).__init__(entries)
+        self._paths = None
+
+    def Paths(self):
+        """
+        Return the set of (FileItemType, FilePath) of the entries
+        """
+        if self._paths is None:
+            self._paths = set((entry.get('FileItemType'), entry.get('FilePath')) for entry in self)
+        return self._paths
+
+    def AddPath(self, file_item_type, path):
+        """
+        Append an entry for the path unless it is already present
+
+        Returns True if the path was added, False if it was already present
+        """
+        paths = self.Paths()
+        if (file_item_type, path) in paths:
+            return False
+
+        entry = {}
+        entry['FilePath'] = path
+        entry['FileItemType'] = file_item_type
+        super(_PathList, self).append(entry)
+        paths.add((file_item_type, path))
+        return True
+
+    def _changed(self):
+        """
+        (Internal) Drop the set after the list was changed directly
+        """
+        self._paths = None
+
+    def append(self, entry):
+        self._changed()
+        super(_PathList, self).append(entry)
+
+    def extend(self, entries):
+        self._changed()
+        super(_PathList, self).extend(entries)
+
+    def insert(self, position, entry):
+        self._changed()
+        super(_PathList, self).insert(position, entry)
+
+    def remove(self, entry):
+        self._changed()
+        super(_PathList, self).remove(entry)
+
+    def pop(self, *args):
+        self._changed()
+        return super(_PathList, self).pop(*args)
+
+    def clear(self):
+        self._changed()
+        del self[:]
+
+    def __setitem__(self, position, value):
+        self._changed()
+        super(_PathList, self).__setitem__(position, value)
+
+    def __delitem__(self, position):
+        self._changed()
+        super(_PathList, self).__delitem__(position)
+
+    def __setslice__(self, start, end, values):
+        # Python2 only
+        self._changed()
+        super(_PathList, self).__setslice__(start, end, values)
+
+    def __delslice__(self, start, end):
+        # Python2 only
+        self._changed()
+        super(_PathList, self).__delslice__(start, end)
+
+    def __iadd__(self, entries):
+        self._changed()
+        return super(_PathList, self).__iadd__(entries)
+
+    def __imul__(self, count):
+        self._changed()
+        return super(_PathList, self).__imul__(count)
+
 
 class BackupConfiguration(object):
     """
@@ -53,8 +182,8 @@ class BackupConfiguration(object):
         backupconfig_template['NotifyRecipients'] = ''
         backupconfig_template['NotifySuccess'] = False
         backupconfig_template['NotifyFailure'] = False
-        backupconfig_template['Inclusions'] = []
-        backupconfig_template['Exclusions'] = []
+        backupconfig_template['Inclusions'] = _PathList()
+        backupconfig_template['Exclusions'] = _PathList()
         return backupconfig_template
 
     @staticmethod
@@ -167,6 +296,7 @@ class BackupConfiguration(object):
                                 ]
             for key in keys_to_copy:
                 rbc.backup_config[key] = rbc.from_dict[key]
+            rbc._own_path_lists()
 
         except LookupError as ex:
             raise TypeError('config does not contain the correct dictionary entries - {0:} : {1:}'.format(ex, config))
@@ -572,6 +702,33 @@ class BackupConfiguration(object):
         else:
             raise TypeError('notify it not a BooleanType')
 
+    def _own_path_lists(self):
+        """
+        (Internal) Replace the Inclusions and Exclusions with copies, f.e of the lists from a dictionary the caller still holds
+        """
+        for key in ('Inclusions', 'Exclusions'):
+            self.backup_config[key] = _PathList(dict(entry) for entry in self.backup_config[key])
+
+    def _path_list(self, key):
+        """
+        (Internal) Return the 'Inclusions' or 'Exclusions' list as a _PathList
+
+        A plain list put in the dictionary by the caller is replaced by a _PathList with the same entries
+        """
+        entries = self.backup_config[key]
+        if not isinstance(entries, _PathList):
+            entries = _PathList(entries)
+            self.backup_config[key] = entries
+        return entries
+
+    def _add_path(self, key, file_item_type, path):
+        """
+        (Internal) Add the path to the 'Inclusions' or 'Exclusions' list unless it is already there
+
+        Returns True if the path was added, False if it was already present
+        """
+        return self._path_list(key).AddPath(file_item_type, path)
+
     def AddFolders(self, paths, excluded=False):
         """
         Add a series of absolute paths to the backup configuration
@@ -587,21 +744,13 @@ class BackupConfiguration(object):
         """
         Return whether a given folder is already excluded
         """
-        for entry in self.backup_config['Exclusions']:
-            if entry['FileItemType'] == 'Folder' and entry['FilePath'] == absoluteFolderPath:
-                return True
-
-        return False
+        return ('Folder', absoluteFolderPath) in self._path_list('Exclusions').Paths()
 
     def IsFolderIncluded(self, absoluteFolderPath):
         """
         Return whether a given folder is already excluded
         """
-        for entry in self.backup_config['Inclusions']:
-            if entry['FileItemType'] == 'Folder' and entry['FilePath'] == absoluteFolderPath:
-                return True
-
-        return False
+        return ('Folder', absoluteFolderPath) in self._path_list('Inclusions').Paths()
 
     def AddFolder(self, absoluteFolderPath, excluded=False):
         """
@@ -610,18 +759,11 @@ class BackupConfiguration(object):
             if excluded is True then the paths are excluded from the backup
             if excluded is False then the paths are included in the backup (default)
         """
-        entry = {}
-        entry['FilePath'] = absoluteFolderPath
-        entry['FileItemType'] = 'Folder'
         if excluded:
-            if not self.IsFolderExcluded(absoluteFolderPath):
-                self.backup_config['Exclusions'].append(entry)
-            else:
+            if not self._add_path('Exclusions', 'Folder', absoluteFolderPath):
                 self.log.debug('Folder {0:} is already in the exclusions'.format(absoluteFolderPath))
         else:
-            if not self.IsFolderIncluded(absoluteFolderPath):
-                self.backup_config['Inclusions'].append(entry)
-            else:
+            if not self._add_path('Inclusions', 'Folder', absoluteFolderPath):
                 self.log.debug('Folder {0:} is already in the inclusions'.format(absoluteFolderPath))
 
     def AddFiles(self, files, excluded=False):
@@ -638,21 +780,13 @@ class BackupConfiguration(object):
         """
         Return whether a given file is already excluded
         """
-        for entry in self.backup_config['Exclusions']:
-            if entry['FileItemType'] == 'File' and entry['FilePath'] == absoluteFilePath:
-                return True
-
-        return False
+        return ('File', absoluteFilePath) in self._path_list('Exclusions').Paths()
 
     def IsFileIncluded(self, absoluteFilePath):
         """
         Return whether a given file is already excluded
         """
-        for entry in self.backup_config['Inclusions']:
-            if entry['FileItemType'] == 'File' and entry['FilePath'] == absoluteFilePath:
-                return True
-
-        return False
+        return ('File', absoluteFilePath) in self._path_list('Inclusions').Paths()
 
     def AddFile(self, absoluteFilePath, excluded=False):
         """
@@ -661,18 +795,11 @@ class BackupConfiguration(object):
             if excluded is True then the paths are excluded from the backup
             if excluded is False then the paths are included in the backup (default)
         """
-        entry = {}
-        entry['FilePath'] = absoluteFilePath
-        entry['FileItemType'] = 'File'
         if excluded:
-            if not self.IsFileExcluded(absoluteFilePath):
-                self.backup_config['Exclusions'].append(entry)
-            else:
+            if not self._add_path('Exclusions', 'File', absoluteFilePath):
                 self.log.debug('File: {0:} is already in the inclusions'.format(absoluteFilePath))
         else:
-            if not self.IsFileIncluded(absoluteFilePath):
-                self.backup_config['Inclusions'].append(entry)
-            else:
+            if not self._add_path('Inclusions', 'File', absoluteFilePath):
                 self.log.debug('File: {0:} is already in the inclusions'.format(absoluteFilePath))
 
 
@@ -681,21 +808,39 @@ class Backups(Command):
     Object to manage backup operations
     """
 
-    def __init__(self, sslenabled, authenticator, apihost):
+    def __init__(self, sslenabled, authenticator, apihost, selector=None, region=None):
         """
         Initialize the backups
           sslenabled - True if using HTTPS; otherwise False
           authenticator - instance of cloudbackup.client.auth.Authentication to use
           apihost - server to use for API calls
+          selector - instance of cloudbackup.client.endpoints.EndpointSelector; if given the fastest reachable
+                     cloudBackup endpoint in 'region' replaces apihost, failing over when it cannot be
+                     reached, see cloudbackup.common.command.Command.SelectApiHost()
+          region - region (data center) to select the endpoint in; None for any region
         """
         super(self.__class__, self).__init__(sslenabled, apihost, '/')
         self.log = logging.getLogger(__name__)
         # save the ssl status for the various reinits done for each API call supported
         self.sslenabled = sslenabled
         self.authenticator = authenticator
+        if selector is not None:
+            self.SelectApiHost(selector, 'cloudBackup', region)
         # Some cached data needed, set to invalid values by default
         self.agents = {}
         self.snapshot_id = None
+        self.history = CompletedBackupHistory(self._get_completed_backups)
+        # Indexed /v1.0/backup/availableforrestore list, see GetBackupsForRestore()
+        self.available_for_restore = TtlCache(ttl=30)
+
+    def _api_headers(self):
+        """
+        (Internal) Build the headers for an API call without modifying the object so it may be used from multiple threads
+        """
+        headers = {}
+        headers['X-Auth-Token'] = self.authenticator.AuthToken
+        headers['Content-Type'] = 'application/json'
+        return headers
 
     def CreateBackupConfiguration(self, backupinfo):
         """
@@ -707,7 +852,7 @@ class Backups(Command):
             self.headers['X-Auth-Token'] = self.authenticator.AuthToken
             self.headers['Content-Type'] = 'application/json'
             self.body = json.dumps(backupinfo.Configuration)
-            res = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+            res = self.session.post(self.Uri, headers=self.Headers, data=self.Body)
             if res.status_code is 200:
                 ret = res.json()
                 backupinfo.ConfigurationId = ret['BackupConfigurationId']
@@ -723,11 +868,11 @@ class Backups(Command):
     def RetrieveBackupConfiguration(self, backup_config_id):
         """
         Retrieve the specific backup configuration from the API
+
+        Note: Does not modify the object so it may be used from multiple threads
         """
-        self.ReInit(self.sslenabled, '/v1.0/backup-configuration/{0:}'.format(backup_config_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.get(self.Uri, headers=self.Headers)
-        if res.status_code is 200:
+        res = self.session.get(self.MakeUri(self.sslenabled, '/v1.0/backup-configuration/{0:}'.format(backup_config_id)), headers=self._api_headers())
+        if res.status_code == 200:
             return BackupConfiguration.from_dict(res.json(), source='backup-configuration')
         else:
             self.log.error('status code: %d', res.status_code)
@@ -745,7 +890,7 @@ class Backups(Command):
             self.headers['X-Auth-Token'] = self.authenticator.AuthToken
             self.headers['Content-Type'] = 'application/json'
             self.body = json.dumps(backupinfo.to_update_dict)
-            res = requests.put(self.Uri, headers=self.Headers, data=self.Body)
+            res = self.session.put(self.Uri, headers=self.Headers, data=self.Body)
             if res.status_code is 200:
                 return True
             else:
@@ -762,7 +907,7 @@ class Backups(Command):
         """
         self.ReInit(self.sslenabled, "/v1.0/backup-configuration/" + str(backup_config_id))
         self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.delete(self.Uri, headers=self.Headers)
+        res = self.session.delete(self.Uri, headers=self.Headers)
         if res.status_code is 200:
             return True
         else:
@@ -774,16 +919,16 @@ class Backups(Command):
     def StartBackup(self, backup_config_id, retry=20):
         """
         Start a backup with the given backup configuration id
+
+        Returns the snapshot id of the backup; it is also kept in 'snapshot_id'
+
+        Note: Apart from 'snapshot_id' does not modify the object so it may be used from multiple threads
         """
-        self.ReInit(self.sslenabled, "/v1.0/backup/action-requested")
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'application/json'
         o = {}
         o['Action'] = 'StartManual'
         o['Id'] = backup_config_id
-        self.body = json.dumps(o)
         self.log.info('start manual backup request body: %s', json.dumps(o, sort_keys=False, indent=2))
-        res = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+        res = self.session.post(self.MakeUri(self.sslenabled, "/v1.0/backup/action-requested"), headers=self._api_headers(), data=json.dumps(o))
         self.log.info('start backup return code %s', res.status_code)
         self.log.info('start backup text reply %s', res.text)
 
@@ -799,30 +944,48 @@ class Backups(Command):
             self.log.error('reason: ' + res.reason)
             raise RuntimeError('Start Backup Failed - error code ({0:}) - {1:} - {2:}'.format(res.status_code, res.reason, res.text))
 
-        self.snapshot_id = res.text
-        self.log.info('snapshot ID: %s', self.snapshot_id)
-        return self.snapshot_id
+        snapshot_id = res.text
+        self.snapshot_id = snapshot_id
+        self.log.info('snapshot ID: %s', snapshot_id)
+        return snapshot_id
+
+    def GetBackupDetails(self, snapshot_id):
+        """
+        Retrieve the status of the backup for the given snapshot id
+
+        Returns a dictionary with details about the backup, including its CurrentState; an empty dictionary on failure
+
+        Note: Does not modify the object so it may be used from multiple threads
+        """
+        res = self.session.get(self.MakeUri(self.sslenabled, "/v1.0/backup/" + str(snapshot_id)), headers=self._api_headers())
+        if res.status_code == 200:
+            return res.json()
+        else:
+            self.log.warn('status code: %d', res.status_code)
+            self.log.error('reason: ' + res.reason)
+            return dict()
 
     def MonitorBackupProgress(self, snapshot_id, timeoutMilliseconds, pausePeriod=5.0):
         """
         Monitor the progress of the backup for the given snapshot id
         Timeout after timeoutMillseconds
+
+        Returns the last status retrieved (see GetBackupDetails()), or None if none was retrieved;
+        check its CurrentState to know whether or not the backup finished within the timeout
+
+        Note: See cloudbackup.client.jobs.JobWatcher to monitor many backups from a single thread
         """
-        self.ReInit(self.sslenabled, "/v1.0/backup/" + str(snapshot_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        stoplist = ['Completed', 'Skipped', 'Missed', 'Stopped', 'Failed', 'CompletedWithErrors']
-        start_time = int(round(time.time() * 1000))
+        stoplist = BACKUP_FINAL_STATES
+        status_data = None
         # poll for n-minutes
-        finish_time = start_time + timeoutMilliseconds
-        while ((int(round(time.time() * 1000))) < finish_time):
+        finish_time = monotonic() + (timeoutMilliseconds / 1000.0)
+        while monotonic() < finish_time:
             # pause for so we don't hit the API/Agent too hard
             sleep(pausePeriod)
-            res = requests.get(self.Uri, headers=self.Headers)
-            if (res.status_code != 200):
-                self.log.warn('status code: %d', res.status_code)
-                self.log.error('reason: ' + res.reason)
+            details = self.GetBackupDetails(snapshot_id)
+            if not len(details):
                 continue
-            status_data = res.json()
+            status_data = details
             self.log.info('Backup ID: %s', status_data['BackupId'])
             self.log.info('  Current state: %s', status_data['CurrentState'])
             self.log.info('  Backup configuration ID: %s', status_data['BackupConfigurationId'])
@@ -839,43 +1002,56 @@ class Backups(Command):
             self.log.info('Current State: ' + current_state)
             if (current_state in stoplist):
                 break
+        return status_data
 
-    def GetCompletedBackups(self, backup_config_id):
+    def _get_completed_backups(self, backup_config_id):
         '''
-        Retrieves all the backups completed for a Backup Configuration
+        (Internal) Retrieve all the backups completed for a Backup Configuration, raising RuntimeError on failure
+
+        Note: Does not modify the object so it may be used from multiple threads
         '''
-        self.ReInit(self.sslenabled, "/v1.0/backup/completed/" + str(backup_config_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.get(self.Uri, headers=self.Headers)
-        if res.status_code is 200:
-            snapshots = res.json()
+        res = self.session.get(self.MakeUri(self.sslenabled, "/v1.0/backup/completed/" + str(backup_config_id)), headers=self._api_headers())
+        if res.status_code == 200:
+            return res.json()
         else:
-            snapshots = list()
             self.log.error('status code: %d', res.status_code)
             self.log.error('reason: ' + res.reason)
             self.log.error('error info: %s', res.text)
-        return snapshots
+            raise RuntimeError('Unable to retrieve completed backups for backup configuration id ({0:}): {1:} - {2:}'.format(backup_config_id, res.status_code, res.reason))
+
+    def GetCompletedBackups(self, backup_config_id):
+        '''
+        Retrieves all the backups completed for a Backup Configuration
+        '''
+        try:
+            return self._get_completed_backups(backup_config_id)
+        except RuntimeError:
+            return list()
 
     def GetCompletedBackup(self, backup_config_id, snapshot_id):
         """
         Retrieve the information about a completed backup
           backup_config_id - backup configuration to retrieve snapshot data for
           snapshot_id - specific snapshot to get completion information for
+
+        Completed backups are served from 'history' (see CompletedBackupHistory)
         """
-        snapshots = self.GetCompletedBackups(backup_config_id)
-        if len(snapshots) > 0:
+        try:
+            snapshot = self.history.Get(backup_config_id, snapshot_id)
+        except (RuntimeError, LookupError, ValueError) as ex:
+            self.log.error('Unable to retrieve backup completion information for backup configuration id {0:}: {1:}'.format(backup_config_id, ex))
+            return False
+        if snapshot is not None:
             try:
-                for snapshot in snapshots:
-                    if str(snapshot['BackupId']) == snapshot_id:
-                        self.log.info('Backup ID: %s', str(snapshot['BackupId']))
-                        self.log.info('  Configuration Id: %s', str(snapshot['BackupConfigurationId']))
-                        self.log.info('  Configuration Name: %s', snapshot['BackupConfigurationName'])
-                        self.log.info('  Machine Agent Id: %s', str(snapshot['MachineAgentId']))
-                        self.log.info('  Machine Name: %s', snapshot['MachineName'])
-                        self.log.info('  Completed Time: %s', snapshot['CompletedTime'])
-                        self.log.info('  Bytes Searched: %s', snapshot['BytesSearched'])
-                        self.log.info('  Number of Errors: %s', snapshot['NumErrors'])
-                        return True
+                self.log.info('Backup ID: %s', str(snapshot['BackupId']))
+                self.log.info('  Configuration Id: %s', str(snapshot['BackupConfigurationId']))
+                self.log.info('  Configuration Name: %s', snapshot['BackupConfigurationName'])
+                self.log.info('  Machine Agent Id: %s', str(snapshot['MachineAgentId']))
+                self.log.info('  Machine Name: %s', snapshot['MachineName'])
+                self.log.info('  Completed Time: %s', snapshot['CompletedTime'])
+                self.log.info('  Bytes Searched: %s', snapshot['BytesSearched'])
+                self.log.info('  Number of Errors: %s', snapshot['NumErrors'])
+                return True
             except LookupError:
                 self.log.error('Unable to retrieve backup completion information for backup configuration id ' + str(backup_config_id))
         return False
@@ -907,11 +1083,10 @@ class Backups(Command):
             u'NumErrors': 0,
             u'BackupDatacenter': u'DFW'
             }
+
+        Note: Does not modify the object so it may be used from multiple threads
         """
-        self.ReInit(self.sslenabled, "/v1.0/backup/report/" + str(backup_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'application/json'
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.MakeUri(self.sslenabled, "/v1.0/backup/report/" + str(backup_id)), headers=self._api_headers())
         if res.status_code == 200:
             return res.json()
         else:
@@ -935,11 +1110,26 @@ class Backups(Command):
             'backup_report' - the Backup Report
             'status' - True/False for success
         """
+        return self.RunBackup(parameters['backupid'], parameters['retry_attempts'],
+                              lambda snapshot_id: self.MonitorBackupProgress(snapshot_id, parameters['backup_timeout'], parameters['monitor_period']))
+
+    def RunBackup(self, backup_config_id, retry_attempts, monitor):
+        """
+        Start, monitor and report on a backup, retrying to overcome a race condition in the agent
+          backup_config_id - the ID of the backup configuration
+          retry_attempts - number of times to try
+          monitor - callable(snapshot_id) returning once the backup has finished, f.e MonitorBackupProgress()
+                    or JobWatcher.WatchBackup(snapshot_id).Result; an exception it raises is propagated without retrying
+
+        Returns the same dictionary as StartBackupRetry(); raises RuntimeError if every attempt failed
+
+        Note: Does not modify the object (apart from 'snapshot_id') so it may be used from multiple threads
+        """
         output = {}
         # Assume failure
         output['status'] = False
-        for retry in range(parameters['retry_attempts']):
-            output['api_snapshotid'] = self.StartBackup(parameters['backupid'])
+        for retry in range(retry_attempts):
+            output['api_snapshotid'] = self.StartBackup(backup_config_id)
             self.log.info('Snapshot ID: {0:}'.format(output['api_snapshotid']))
             if output['api_snapshotid'] == -1:
                 msg = 'Received an invalid snapshot id'
@@ -948,7 +1138,7 @@ class Backups(Command):
                 continue
 
             # Monitor the backup
-            self.MonitorBackupProgress(output['api_snapshotid'], parameters['backup_timeout'], parameters['monitor_period'])
+            monitor(output['api_snapshotid'])
 
             # Retrieve the backup report
             output['backup_report'] = self.GetBackupReport(output['api_snapshotid'])
@@ -962,10 +1152,12 @@ class Backups(Command):
 
             # If we got here, then terminate the loop as we succeeded
             output['status'] = True
+            # The new backup changes what is available for restore
+            self.InvalidateBackupsForRestore()
             break
 
         if not output['status']:
-            raise RuntimeError('Failed to start the backup over {0:} attempts.'.format(parameters['retry_attempts']))
+            raise RuntimeError('Failed to start the backup over {0:} attempts.'.format(retry_attempts))
 
         return output
 
@@ -993,27 +1185,59 @@ class Backups(Command):
                    "Flavor": "RaxCloudServer",
                    "LastSuccessfulBackupTime": "\/Date(1360701971000)\/"
                 }
+
+        The list is cached for a short time and indexed so that many calls make a single API call,
+        see InvalidateBackupsForRestore()
         """
-        self.ReInit(self.sslenabled, "/v1.0/backup/availableforrestore")
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.get(self.Uri, headers=self.Headers)
         availForRestore = dict()
         availForRestore['backups'] = list()
-        availForRestore['code'] = res.status_code
-        if res.status_code != 200:
-            self.log.error('Received status code {0} when requesting available backups for restore for agent {1}'.format(res.status_code, machine_agent_id))
-            self.log.error('reason: ' + res.reason)
+        try:
+            by_config, by_agent = self.available_for_restore.GetOrLoad('account', self._load_available_for_restore)
+        except _AvailableForRestoreError as ex:
+            availForRestore['code'] = ex.status_code
+            self.log.error('Received status code {0} when requesting available backups for restore for agent {1}'.format(ex.status_code, machine_agent_id))
+            self.log.error('reason: ' + ex.reason)
             return availForRestore
-        machine_config = res.json()
-        for bkp in machine_config:
-            if (backup_config_id == bkp['BackupConfigurationId']):
-                availForRestore['backups'].append(bkp)
-            else:
-                continue
+        availForRestore['code'] = 200
+        availForRestore['backups'] = list(by_config.get(backup_config_id, ()))
         if len(availForRestore['backups']) == 0:
             self.log.error('Unable to find any backups to restore for agent {0}'.format(machine_agent_id))
         return availForRestore
 
+    def _load_available_for_restore(self, key):
+        """
+        (Internal) Retrieve the backups available for restore and index them by BackupConfigurationId and MachineAgentId
+
+        Note: Does not modify the object so it may be used from multiple threads
+        """
+        res = self.session.get(self.MakeUri(self.sslenabled, "/v1.0/backup/availableforrestore"), headers=self._api_headers())
+        if res.status_code != 200:
+            raise _AvailableForRestoreError(res.status_code, res.reason)
+        by_config = {}
+        by_agent = {}
+        for bkp in res.json():
+            by_config.setdefault(bkp['BackupConfigurationId'], []).append(bkp)
+            by_agent.setdefault(bkp['MachineAgentId'], []).append(bkp)
+        return (by_config, by_agent)
+
+    def GetBackupsForRestoreByAgent(self, machine_agent_id):
+        """
+        Retrieve the backup configurations of the agent that are available for restore, see GetBackupsForRestore()
+
+        Returns a list of dictionaries; raises RuntimeError if the list could not be retrieved
+        """
+        try:
+            by_config, by_agent = self.available_for_restore.GetOrLoad('account', self._load_available_for_restore)
+        except _AvailableForRestoreError as ex:
+            raise RuntimeError('Unable to retrieve the backups available for restore: {0:} - {1:}'.format(ex.status_code, ex.reason))
+        return list(by_agent.get(machine_agent_id, ()))
+
+    def InvalidateBackupsForRestore(self):
+        """
+        Forget the cached list of backups available for restore, f.e after a backup completes
+        """
+        self.available_for_restore.Clear()
+
 
 class RestoreConfiguration(object):
     '''
@@ -1123,12 +1347,32 @@ class Restores(Command):
     '''
     Object to manage restore operations
     '''
-    def __init__(self, sslenabled, authenticator, apihost):
+    def __init__(self, sslenabled, authenticator, apihost, selector=None, region=None):
+        '''
+        Initialize the restores
+          sslenabled - True if using HTTPS; otherwise False
+          authenticator - instance of cloudbackup.client.auth.Authentication to use
+          apihost - server to use for API calls
+          selector - instance of cloudbackup.client.endpoints.EndpointSelector; if given the fastest reachable
+                     cloudBackup endpoint in 'region' replaces apihost, failing over when it cannot be
+                     reached, see cloudbackup.common.command.Command.SelectApiHost()
+          region - region (data center) to select the endpoint in; None for any region
+        '''
         super(self.__class__, self).__init__(sslenabled, apihost, '/')
         self.log = logging.getLogger(__name__)
         # save the ssl status for the various reinits done for each API call supported
         self.sslenabled = sslenabled
         self.authenticator = authenticator
+        if selector is not None:
+            self.SelectApiHost(selector, 'cloudBackup', region)
+
+    def _api_headers(self):
+        """
+        (Internal) Build the headers for an API call without modifying the object so it may be used from multiple threads
+        """
+        headers = {}
+        headers['X-Auth-Token'] = self.authenticator.AuthToken
+        return headers
 
     def CreateRestoreConfiguration(self, restoreinfo):
         ''' Create a restore configuration
@@ -1141,7 +1385,7 @@ class Restores(Command):
             self.log.info(self.body)
             self.log.info(self.authenticator.AuthToken)
             self.log.info(self.uri)
-            res = requests.put(self.Uri, headers=self.Headers, data=self.Body)
+            res = self.session.put(self.Uri, headers=self.Headers, data=self.Body)
             if res.status_code is 200:
                 return res.json()
             else:
@@ -1164,7 +1408,7 @@ class Restores(Command):
     def DeleteRestoreConfiguration(self, restore_file_id):
         self.ReInit(self.sslenabled, '/v1.0/restore/files/{0}'.format(restore_file_id))
         self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.delete(self.Uri, headers=self.Headers)
+        res = self.session.delete(self.Uri, headers=self.Headers)
         if res.status_code is 200:
             return True
         else:
@@ -1179,7 +1423,7 @@ class Restores(Command):
         self.headers['X-Auth-Token'] = self.authenticator.AuthToken
         self.headers['Content-Type'] = 'application/json'
         self.body = json.dumps(req)
-        res = requests.put(self.Uri, headers=self.Headers, data=self.Body)
+        res = self.session.put(self.Uri, headers=self.Headers, data=self.Body)
         if (res.status_code != 200):
             self.log.error('status code: %d', res.status_code)
             self.log.error('reason: ' + res.reason)
@@ -1227,7 +1471,7 @@ class Restores(Command):
     def ListIncExcFiles(self, restore_config_id):
         self.ReInit(self.sslenabled, '/v1.0/restore/files/{0}'.format(restore_config_id))
         self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.Uri, headers=self.Headers)
         if res.status_code is 200:
             return res.json()
         else:
@@ -1241,7 +1485,7 @@ class Restores(Command):
         self.headers['X-Auth-Token'] = self.authenticator.AuthToken
         self.headers['Content-Type'] = 'application/json'
         self.body = json.dumps(req)
-        res = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+        res = self.session.post(self.Uri, headers=self.Headers, data=self.Body)
         if res.status_code == 403:
             if retry <= 0:
                 self.log.error('Failed due to access forbidden')
@@ -1352,11 +1596,11 @@ class Restores(Command):
             RestoreStateId
             Inclusions
             Exclusions
+
+        Note: Does not modify the object so it may be used from multiple threads
         '''
-        self.ReInit(self.sslenabled, '/v1.0/restore/{0}'.format(restoreId))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.get(self.Uri, headers=self.Headers)
-        if res.status_code is 200:
+        res = self.session.get(self.MakeUri(self.sslenabled, '/v1.0/restore/{0}'.format(restoreId)), headers=self._api_headers())
+        if res.status_code == 200:
             return res.json()
         else:
             self.log.error('status code: %d', res.status_code)
@@ -1371,34 +1615,31 @@ class Restores(Command):
         restoreId
         timeoutMilliseconds -- maximum amount of time (ms) the operation will last
         pausePediod
+
+        Returns the last restore details retrieved (see GetRestoreDetails()), or None if none were
+        retrieved; check its RestoreStateId to know whether or not the restore finished within the timeout
+
+        Note: See cloudbackup.client.jobs.JobWatcher to monitor many restores from a single thread
         '''
-        status = dict()
-        status[0] = 'Creating'
-        status[1] = 'Queued'
-        status[2] = 'InProgress'
-        status[3] = 'Completed'
-        status[4] = 'Stopped'
-        status[5] = 'Failed'
-        status[6] = 'StartRequested'
-        status[7] = 'StopRequested'
-        status[8] = 'Completed WithErrors'
-        status[9] = 'Preparing'
-
-        stoplist = (3, 4, 5, 7, 8)
-        start_time = int(round(time.time() * 1000))
+        status = RESTORE_STATES
+
+        stoplist = RESTORE_FINAL_STATES
+        respbody = None
         # poll for n-minutes
-        finish_time = start_time + timeoutMilliseconds
-        while ((int(round(time.time() * 1000))) < finish_time):
+        finish_time = monotonic() + (timeoutMilliseconds / 1000.0)
+        while monotonic() < finish_time:
             # pause for so we don't hit the API/Agent too hard
             sleep(pausePeriod)
-            respbody = self.GetRestoreDetails(restoreId)
-            if len(respbody.keys()) == 0:
+            details = self.GetRestoreDetails(restoreId)
+            if len(details.keys()) == 0:
                 self.log.warn('Did not successful response')
                 continue
+            respbody = details
             current_state = respbody['RestoreStateId']
             self.log.info('Current State: {0}'.format(status[current_state]))
             if (current_state in stoplist):
                 break
+        return respbody
 
     def GetRestoreReport(self, restoreId):
         ''' Returns a report about a specific Restore operation
@@ -1421,11 +1662,11 @@ class Restores(Command):
             Reason
             Diagnostics
             ErrorList
+
+        Note: Does not modify the object so it may be used from multiple threads
         '''
-        self.ReInit(self.sslenabled, '/v1.0/restore/report/{0}'.format(restoreId))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.get(self.Uri, headers=self.Headers)
-        if res.status_code is 200:
+        res = self.session.get(self.MakeUri(self.sslenabled, '/v1.0/restore/report/{0}'.format(restoreId)), headers=self._api_headers())
+        if res.status_code == 200:
             return res.json()
         else:
             self.log.error('status code: %d', res.status_code)
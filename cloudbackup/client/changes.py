@@ -0,0 +1,190 @@
+"""
+Rackspace Cloud Backup Agent Change Feed
+"""
+import collections
+import itertools
+import logging
+import threading
+
+from cloudbackup.common.digest import digest
+
+AGENT_ADDED = 'added'
+AGENT_REMOVED = 'removed'
+AGENT_MODIFIED = 'modified'
+
+# A single change to the agent list
+#   kind - AGENT_ADDED, AGENT_REMOVED or AGENT_MODIFIED
+#   machine_agent_id - agent that changed
+#   agent - current agent list entry (None when removed)
+#   previous - prior agent list entry (None when added)
+#   changed - dictionary of field -> (old value, new value) for modified agents; empty otherwise
+AgentChange = collections.namedtuple('AgentChange', ['kind', 'machine_agent_id', 'agent', 'previous', 'changed'])
+
+
+class AgentChangeFeed(object):
+    """
+    Poll the agent list and tell subscribers what changed
+
+    Each agent list entry is hashed so an unchanged agent costs a single comparison; only
+    agents whose hash changed are compared field by field. A poll is O(n) in the number of
+    agents.
+    """
+
+    # Fields subscribers most commonly filter on, see Subscribe()
+    WATCHED_FIELDS = ('Status', 'IsDisabled', 'AgentVersion', 'TimeOfLastSuccessfulBackup')
+
+    def __init__(self, loader, interval=60.0, emit_initial=False):
+        """
+        Initialize the Agent Change Feed
+          loader - callable returning the list of agent dictionaries, f.e cloudbackup.client.agents.Agents.GetAgentList
+          interval - number of seconds between polls when running in the background, see Start()
+          emit_initial - whether or not the first poll reports every agent as added
+        """
+        self.log = logging.getLogger(__name__)
+        self.loader = loader
+        self.interval = interval
+        self.emit_initial = emit_initial
+        self.primed = False
+        self._agents = {}
+        self._digests = {}
+        self._subscribers = {}
+        self._subscriber_ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def Subscribe(self, callback, kinds=None, fields=None):
+        """
+        Register callback(AgentChange) to receive changes
+          kinds - iterable of the kinds of change to receive; None for all
+          fields - only receive AGENT_MODIFIED changes that touch one of these fields (f.e WATCHED_FIELDS); None for all
+
+        Returns a token for Unsubscribe()
+        """
+        with self._lock:
+            token = next(self._subscriber_ids)
+            self._subscribers[token] = (callback, None if kinds is None else frozenset(kinds), None if fields is None else frozenset(fields))
+            return token
+
+    def Unsubscribe(self, token):
+        """
+        Stop sending changes to the subscriber
+        """
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    @staticmethod
+    def _diff(previous, agent):
+        """
+        (Internal) Return the dictionary of field -> (old value, new value) for the fields that differ
+        """
+        changed = {}
+        for key in set(previous.keys()) | set(agent.keys()):
+            if previous.get(key) != agent.get(key):
+                changed[key] = (previous.get(key), agent.get(key))
+        return changed
+
+    def _compare(self, agentlist):
+        """
+        (Internal) Update the stored agent list, returning the list of AgentChanges
+        """
+        changes = []
+        remaining = set(self._digests.keys())
+        for agent in agentlist:
+            machine_agent_id = agent['MachineAgentId']
+            agent_digest = digest(agent)
+            previous_digest = self._digests.get(machine_agent_id)
+            remaining.discard(machine_agent_id)
+            if previous_digest == agent_digest:
+                continue
+
+            if previous_digest is None:
+                changes.append(AgentChange(AGENT_ADDED, machine_agent_id, agent, None, {}))
+            else:
+                previous = self._agents[machine_agent_id]
+                changes.append(AgentChange(AGENT_MODIFIED, machine_agent_id, agent, previous, self._diff(previous, agent)))
+            self._digests[machine_agent_id] = agent_digest
+            self._agents[machine_agent_id] = agent
+
+        for machine_agent_id in remaining:
+            changes.append(AgentChange(AGENT_REMOVED, machine_agent_id, None, self._agents.pop(machine_agent_id), {}))
+            del self._digests[machine_agent_id]
+        return changes
+
+    def _publish(self, changes):
+        """
+        (Internal) Deliver the changes to the interested subscribers
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+
+        for change in changes:
+            for callback, kinds, fields in subscribers:
+                if kinds is not None and change.kind not in kinds:
+                    continue
+                if fields is not None and change.kind == AGENT_MODIFIED and not fields.intersection(change.changed):
+                    continue
+                try:
+                    callback(change)
+                except Exception as ex:
+                    self.log.error('Agent change subscriber failed for agent id {0:}: {1:}'.format(change.machine_agent_id, ex))
+
+    def Poll(self):
+        """
+        Retrieve the agent list once and deliver the changes since the last poll
+
+        Returns the list of AgentChanges
+        """
+        agentlist = self.loader()
+        with self._lock:
+            changes = self._compare(agentlist)
+            if not self.primed:
+                self.primed = True
+                if not self.emit_initial:
+                    changes = []
+        self.log.debug('Agent Change Feed: {0:} agents, {1:} changes'.format(len(agentlist), len(changes)))
+        self._publish(changes)
+        return changes
+
+    @property
+    def Agents(self):
+        """
+        Dictionary of machine_agent_id -> agent list entry as of the last poll
+        """
+        with self._lock:
+            return dict(self._agents)
+
+    def Start(self):
+        """
+        Poll in the background every 'interval' seconds
+        """
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def Stop(self):
+        """
+        Stop polling in the background and wait for the poller to terminate
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        self._stop.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self):
+        """
+        (Internal) Background poller
+        """
+        while not self._stop.is_set():
+            try:
+                self.Poll()
+            except Exception as ex:
+                self.log.error('Unable to poll the agent list: {0:}'.format(ex))
+            self._stop.wait(self.interval)
+
+        self.log.debug('Agent Change Feed terminating')
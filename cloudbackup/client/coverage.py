@@ -0,0 +1,151 @@
+"""
+Rackspace Cloud Backup Configuration Coverage
+
+Note: Evaluate() returns a numpy array when numpy is installed (pip install numpy)
+"""
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from cloudbackup.utils import normpath
+
+INCLUDE = 1
+EXCLUDE = 2
+
+# Positions within a trie node
+_CHILDREN = 0
+_FOLDER = 1
+_FILE = 2
+
+
+def _stronger(current, rule):
+    """
+    (Internal) Combine two rules at the same depth; an exclusion wins over an inclusion
+    """
+    if current is None:
+        return rule
+    return max(current, rule)
+
+
+class CoverageTrie(object):
+    """
+    Answer "will this path be backed up?" for a backup configuration's Inclusions and Exclusions
+
+    The folder and file rules are compiled into a trie keyed by path component. A path is
+    evaluated with a single walk from the root:
+        - a Folder rule applies to the folder and everything below it
+        - a File rule applies to that exact path only
+        - the deepest matching rule wins; at the same depth an exclusion wins over an inclusion
+        - a path matched by no rule is not backed up
+    """
+
+    def __init__(self, inclusions=(), exclusions=(), platform='linux'):
+        """
+        Initialize the Coverage Trie
+          inclusions - list of {'FilePath': ..., 'FileItemType': 'Folder' or 'File'} as in BackupConfiguration
+          exclusions - same as inclusions for the excluded paths
+          platform - platform of the agent the configuration belongs to, see cloudbackup.utils.normpath();
+                     paths are compared case insensitively on Windows
+        """
+        self.log = logging.getLogger(__name__)
+        self.platform = platform.lower()
+        self.windows = self.platform.find('windows') > -1
+        self.separator = '\\' if self.windows else '/'
+        self._root = [{}, None, None]
+        self.rules = 0
+        for entries, rule in ((inclusions, INCLUDE), (exclusions, EXCLUDE)):
+            for entry in entries:
+                self.AddRule(entry['FilePath'], rule, entry.get('FileItemType', 'Folder') == 'File')
+
+    @classmethod
+    def FromBackupConfiguration(cls, backup_configuration, platform='linux'):
+        """
+        Build the trie from a cloudbackup.client.backup.BackupConfiguration (or its Configuration dictionary)
+        """
+        config = backup_configuration if isinstance(backup_configuration, dict) else backup_configuration.Configuration
+        return cls(config.get('Inclusions', ()), config.get('Exclusions', ()), platform=platform)
+
+    def _normalize(self, path):
+        """
+        (Internal) Normalize the separators (and case on Windows) of a path
+        """
+        path = normpath(self.platform, path)
+        if self.windows:
+            path = path.lower()
+        return path
+
+    def _split(self, path):
+        """
+        (Internal) Break a normalized path into its components
+        """
+        return [component for component in path.split(self.separator) if len(component)]
+
+    def AddRule(self, path, rule, is_file=False):
+        """
+        Add an inclusion or exclusion
+          rule - INCLUDE or EXCLUDE
+          is_file - True for a File rule, False for a Folder rule
+        """
+        node = self._root
+        for component in self._split(self._normalize(path)):
+            node = node[_CHILDREN].setdefault(component, [{}, None, None])
+        position = _FILE if is_file else _FOLDER
+        node[position] = _stronger(node[position], rule)
+        self.rules += 1
+
+    def _walk(self, components, node, decision):
+        """
+        (Internal) Walk the components from 'node', returning the node reached (None once off the trie) and the decision
+        """
+        for component in components:
+            if node is None:
+                break
+            node = node[_CHILDREN].get(component)
+            if node is not None and node[_FOLDER] is not None:
+                decision = node[_FOLDER]
+        return (node, decision)
+
+    def _evaluate(self, path, parents):
+        """
+        (Internal) Evaluate a single path, reusing the walk of its parent folder via 'parents'
+        """
+        parent, _, name = self._normalize(path).rstrip(self.separator).rpartition(self.separator)
+        if not len(name):
+            return self._root[_FOLDER] == INCLUDE
+
+        walked = parents.get(parent)
+        if walked is None:
+            walked = self._walk(self._split(parent), self._root, self._root[_FOLDER])
+            parents[parent] = walked
+
+        node, decision = self._walk((name,), walked[0], walked[1])
+        if node is not None and node[_FILE] is not None:
+            if node[_FOLDER] is not None:
+                decision = _stronger(node[_FOLDER], node[_FILE])
+            else:
+                decision = node[_FILE]
+        return decision == INCLUDE
+
+    def IsCovered(self, path):
+        """
+        Return whether or not the path will be backed up
+        """
+        return self._evaluate(path, {})
+
+    def Evaluate(self, paths):
+        """
+        Evaluate a batch of paths
+
+        Each folder is walked once per batch; the paths within it only take one more step.
+
+        Returns a numpy boolean array when numpy is available, otherwise a list of booleans, in
+        the order given
+        """
+        parents = {}
+        if numpy is not None:
+            paths = list(paths)
+            return numpy.fromiter((self._evaluate(path, parents) for path in paths), dtype=bool, count=len(paths))
+        return [self._evaluate(path, parents) for path in paths]
@@ -4,7 +4,6 @@ Rackspace Deuce API
 from __future__ import print_function
 
 import logging
-import requests
 
 from cloudbackup.common.command import Command
 
@@ -33,12 +32,15 @@ class DeuceClient(Command):
     Object defining HTTP REST API calls for interacting with Deuce.
     """
 
-    def __init__(self, sslenabled, authenticator, apihost, primary_dc):
+    def __init__(self, sslenabled, authenticator, apihost, primary_dc, selector=None):
         """
         Initialize the Deuce Client access
             sslenabled - True if using HTTPS; otherwise false
             authenticator - instance of cloudbackup.clientl.auth.Authentication to use
             apihost - server to use for API calls
+            primary_dc - data center whose Cloud Files storage backs the vaults
+            selector - instance of cloudbackup.client.endpoints.EndpointSelector used to pick the fastest
+                       Cloud Files storage URL; if None the ServiceNet storage URL is always used
         """
         super(self.__class__, self).__init__(sslenabled, apihost, '/')
         self.log = logging.getLogger(__name__)
@@ -46,6 +48,7 @@ class DeuceClient(Command):
         self.sslenabled = sslenabled
         self.authenticator = authenticator
         self.primary_dc = primary_dc
+        self.selector = selector
 
     def __update_headers(self):
         """
@@ -53,9 +56,12 @@ class DeuceClient(Command):
         """
         self.headers['X-Auth-Token'] = self.authenticator.AuthToken
         self.headers['X-Project-ID'] = self.ProjectId
-        for uri in self.authenticator.GetCloudFilesUri(self.primary_dc):
-            if uri['name'] == 'snet':
-                self.headers['X-Storage-URL'] = uri['uri']
+        if self.selector is not None:
+            self.headers['X-Storage-URL'] = self.selector.GetBestUri('cloudFiles', self.primary_dc)
+        else:
+            for uri in self.authenticator.GetCloudFilesUri(self.primary_dc):
+                if uri['name'] == 'snet':
+                    self.headers['X-Storage-URL'] = uri['uri']
 
     def __log_request_data(self):
         """
@@ -82,7 +88,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, '/v1.0/{0:}'.format(vaultname))
         self.__update_headers()
         self.__log_request_data()
-        res = requests.put(self.Uri, headers=self.Headers)
+        res = self.session.put(self.Uri, headers=self.Headers)
 
         if res.status_code == 201:
             return True
@@ -97,7 +103,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, '/v1.0/{0:}'.format(vaultname))
         self.__update_headers()
         self.__log_request_data()
-        res = requests.delete(self.Uri, headers=self.Headers)
+        res = self.session.delete(self.Uri, headers=self.Headers)
 
         if res.status_code == 204:
             return True
@@ -112,7 +118,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, '/v1.0/{0:}'.format(vaultname))
         self.__update_headers()
         self.__log_request_data()
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.Uri, headers=self.Headers)
 
         if res.status_code == 204:
             return True
@@ -129,7 +135,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, '/v1.0/{0:}'.format(vaultname))
         self.__update_headers()
         self.__log_request_data()
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.Uri, headers=self.Headers)
 
         if res.status_code == 200:
             return res.json()
@@ -159,7 +165,7 @@ class DeuceClient(Command):
         self.ReInit(self.sslenabled, url)
         self.__update_headers()
         self.__log_request_data()
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.Uri, headers=self.Headers)
 
         if res.status_code == 200:
             return res.json()
@@ -0,0 +1,160 @@
+"""
+Rackspace Cloud Backup Configuration Drift Detection
+"""
+import collections
+import logging
+
+from cloudbackup.client.agents import AgentConfiguration
+from cloudbackup.common.digest import canonicalize, digest
+
+# Sections of the agent configuration compared by default
+DEFAULT_SECTIONS = ('SystemPreferences', 'UserPreferences', 'Rse', 'BackupConfigurations')
+
+# Keys that are expected to differ between agents with the same configuration
+DEFAULT_IGNORED_KEYS = frozenset(('Id', 'MachineAgentId', 'BackupConfigurationId', 'VolumeUri', 'VolumeFailoverUri', 'Channel', 'HostName', 'InitialScheduledTime', 'Password', 'BackupVaultId'))
+
+# One group of agents sharing a configuration
+#   digest - hash of the canonical configuration
+#   agents - list of machine agent ids in the group
+#   is_baseline - whether or not the group is the baseline the others are compared to
+#   differences - dictionary of key path -> (baseline value, group value)
+DriftGroup = collections.namedtuple('DriftGroup', ['digest', 'agents', 'is_baseline', 'differences'])
+
+
+def _raw(configuration):
+    """
+    (Internal) Return the configuration dictionary for an AgentConfiguration or dictionary
+    """
+    if isinstance(configuration, AgentConfiguration):
+        return configuration.Configuration
+    return configuration
+
+
+def canonical_configuration(configuration, sections=DEFAULT_SECTIONS, ignore_keys=DEFAULT_IGNORED_KEYS):
+    """
+    Return the canonical form of the selected sections of an agent configuration
+      configuration - AgentConfiguration or agent configuration dictionary
+    """
+    raw = _raw(configuration)
+    return canonicalize(dict((section, raw.get(section)) for section in sections), ignore_keys=ignore_keys)
+
+
+def configuration_digest(configuration, sections=DEFAULT_SECTIONS, ignore_keys=DEFAULT_IGNORED_KEYS):
+    """
+    Return the content hash of an agent configuration, see canonical_configuration()
+    """
+    return digest(canonical_configuration(configuration, sections=sections, ignore_keys=ignore_keys))
+
+
+def backup_configuration_digest(backupconfig, ignore_keys=DEFAULT_IGNORED_KEYS):
+    """
+    Return the content hash of a backup configuration (agent configuration form)
+    """
+    return digest(canonicalize(backupconfig, ignore_keys=ignore_keys))
+
+
+def flatten(value, prefix=''):
+    """
+    Flatten a canonical configuration into a dictionary of key path -> value
+
+    Lists of named entries (f.e BackupConfigurations) are keyed by name; other lists are kept whole.
+    """
+    flat = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flat.update(flatten(item, '{0:}.{1:}'.format(prefix, key) if len(prefix) else key))
+    elif isinstance(value, list) and len(value) and all(isinstance(item, dict) and 'Name' in item for item in value):
+        for item in value:
+            flat.update(flatten(item, '{0:}[{1:}]'.format(prefix, item['Name'])))
+    else:
+        flat[prefix] = value
+    return flat
+
+
+def _differences(baseline, other):
+    """
+    (Internal) Return the key path -> (baseline value, other value) for the paths that differ
+    """
+    differences = {}
+    for key in set(baseline.keys()) | set(other.keys()):
+        if baseline.get(key) != other.get(key):
+            differences[key] = (baseline.get(key), other.get(key))
+    return differences
+
+
+class ConfigurationDrift(object):
+    """
+    Group agents by the content hash of their configuration and report how each group differs from a baseline
+
+    Each configuration is canonicalized and hashed once; only one configuration per group is
+    flattened and compared, so building the report is linear in the number of agents.
+    """
+
+    def __init__(self, sections=DEFAULT_SECTIONS, ignore_keys=DEFAULT_IGNORED_KEYS):
+        """
+        Initialize the drift detection
+          sections - agent configuration sections to compare
+          ignore_keys - keys to leave out of the comparison at any depth
+        """
+        self.log = logging.getLogger(__name__)
+        self.sections = sections
+        self.ignore_keys = ignore_keys
+        self.groups = collections.OrderedDict()
+        self.representatives = {}
+
+    def Add(self, machine_agent_id, configuration):
+        """
+        Add an agent's configuration (AgentConfiguration or dictionary), returning its hash
+        """
+        canonical = canonical_configuration(configuration, sections=self.sections, ignore_keys=self.ignore_keys)
+        configuration_hash = digest(canonical)
+        if configuration_hash not in self.groups:
+            self.groups[configuration_hash] = []
+            self.representatives[configuration_hash] = canonical
+        self.groups[configuration_hash].append(machine_agent_id)
+        return configuration_hash
+
+    def AddAll(self, configurations):
+        """
+        Add many configurations
+          configurations - dictionary of machine_agent_id -> configuration, f.e the first result of Agents.GetAgentConfigurationsBulk()
+        """
+        for machine_agent_id, configuration in configurations.items():
+            self.Add(machine_agent_id, configuration)
+
+    def Report(self, baseline=None):
+        """
+        Build the drift report
+          baseline - configuration (AgentConfiguration or dictionary) the agents should have; defaults to the most common configuration
+
+        Returns a list of DriftGroups, the largest group first
+        """
+        if baseline is None:
+            if not len(self.groups):
+                return []
+            baseline_hash = max(self.groups, key=lambda configuration_hash: len(self.groups[configuration_hash]))
+            baseline_flat = flatten(self.representatives[baseline_hash])
+        else:
+            canonical = canonical_configuration(baseline, sections=self.sections, ignore_keys=self.ignore_keys)
+            baseline_hash = digest(canonical)
+            baseline_flat = flatten(canonical)
+
+        report = []
+        for configuration_hash, agents in self.groups.items():
+            if configuration_hash == baseline_hash:
+                differences = {}
+            else:
+                differences = _differences(baseline_flat, flatten(self.representatives[configuration_hash]))
+            report.append(DriftGroup(configuration_hash, list(agents), configuration_hash == baseline_hash, differences))
+        report.sort(key=lambda group: len(group.agents), reverse=True)
+        return report
+
+    def DriftedAgents(self, baseline=None):
+        """
+        Return the list of agent ids whose configuration differs from the baseline, see Report()
+        """
+        drifted = []
+        for group in self.Report(baseline=baseline):
+            if not group.is_baseline:
+                drifted.extend(group.agents)
+        return drifted
@@ -0,0 +1,209 @@
+"""
+Rackspace Service Catalog Endpoint Selection
+"""
+import logging
+import socket
+
+import requests
+
+try:
+    # Python3
+    from urllib.parse import urlparse
+except ImportError:
+    # Python2
+    from urlparse import urlparse
+
+from cloudbackup.common.cache import monotonic, TtlCache
+from cloudbackup.common.connections import get_session
+
+
+class EndpointSelectionError(Exception):
+    """
+    No usable endpoint could be located
+    """
+    pass
+
+
+def uri_to_apihost(uri, include_path=True):
+    """
+    Convert a full URI (https://host/path) into the apihost form used by cloudbackup.common.command.Command
+      include_path - whether or not to keep the path portion of the URI, f.e the Cloud Files account path
+    """
+    parsed = urlparse(uri)
+    if include_path:
+        return parsed.netloc + parsed.path.rstrip('/')
+    else:
+        return parsed.netloc
+
+
+class EndpointSelector(object):
+    """
+    Probe the endpoints listed in the service catalog and rank them by latency
+
+    Each candidate is probed with a TCP connect followed by a small HEAD request. The ranking
+    is cached for 'ttl' seconds. Endpoints that did not respond to the probe, or that callers
+    reported through MarkFailed(), are skipped for 'ttl' seconds so callers automatically fail
+    over to the next fastest endpoint.
+    """
+
+    def __init__(self, authenticator, ttl=300, probe_timeout=2.0):
+        """
+        Initialize the Endpoint Selector
+          authenticator - instance of cloudbackup.client.auth.Authentication to use
+          ttl - number of seconds to keep a ranking before probing again
+          probe_timeout - number of seconds to wait on each step of the probe
+        """
+        self.log = logging.getLogger(__name__)
+        self.authenticator = authenticator
+        self.probe_timeout = probe_timeout
+        self.rankings = TtlCache(ttl=ttl)
+        self.failed = TtlCache(ttl=ttl)
+
+    @staticmethod
+    def _endpoint_candidates(endpoint):
+        """
+        (Internal) Return the candidates ('public' and 'snet') listed by one service catalog endpoint
+        """
+        return [{'name': name, 'region': endpoint.get('region'), 'uri': endpoint[key]}
+                for name, key in (('public', 'publicURL'), ('snet', 'internalURL'))
+                if key in endpoint]
+
+    def GetCandidates(self, service_name, region=None):
+        """
+        Retrieve the candidate endpoints for a service from the service catalog
+          service_name - name of the service in the catalog, f.e 'cloudFiles' or 'cloudBackup'
+          region - region (data center) to limit the candidates to; None for all regions
+
+        Returns a list of dictionaries containing 'name' ('public' or 'snet'), 'region' and 'uri'
+        """
+        # We need the auth data so we must have an Auth Token
+        token = self.authenticator.AuthToken  # noqa
+        candidates = []
+        try:
+            for service in self.authenticator.auth_data['access']['serviceCatalog']:
+                if service['name'] != service_name:
+                    continue
+                for endpoint in service['endpoints']:
+                    if region is None or endpoint.get('region', '').lower() == region.lower():
+                        candidates.extend(self._endpoint_candidates(endpoint))
+        except LookupError:
+            self.log.error('Unable to read the service catalog. Did you authenticate?')
+            raise EndpointSelectionError('Unable to read the service catalog for {0:}'.format(service_name))
+        return candidates
+
+    def ProbeEndpoint(self, uri):
+        """
+        Measure the latency of an endpoint
+
+        Returns the number of seconds taken to connect and complete a HEAD request, or None if the
+        endpoint is not reachable
+        """
+        parsed = urlparse(uri)
+        port = parsed.port
+        if port is None:
+            port = 443 if parsed.scheme == 'https' else 80
+
+        start = monotonic()
+        try:
+            connection = socket.create_connection((parsed.hostname, port), timeout=self.probe_timeout)
+            connection.close()
+            res = get_session().head(uri, timeout=self.probe_timeout)
+        except (socket.error, requests.exceptions.RequestException) as ex:
+            self.log.debug('Endpoint {0:} is not reachable: {1:}'.format(uri, ex))
+            return None
+
+        latency = monotonic() - start
+        if res.status_code >= 500:
+            self.log.debug('Endpoint {0:} returned {1:}'.format(uri, res.status_code))
+            return None
+
+        self.log.debug('Endpoint {0:} latency: {1:.3f}s'.format(uri, latency))
+        return latency
+
+    def RankUris(self, uris, refresh=False):
+        """
+        Rank a list of URIs by probed latency, fastest first
+
+        Unreachable URIs are placed at the end in their original order so that callers
+        always have something to try.
+        """
+        key = tuple(uris)
+        ranking = None
+        if not refresh:
+            ranking = self.rankings.Get(key)
+
+        if ranking is None:
+            reachable = []
+            unreachable = []
+            for uri in uris:
+                latency = self.ProbeEndpoint(uri)
+                if latency is None:
+                    unreachable.append(uri)
+                else:
+                    reachable.append((latency, uri))
+            reachable.sort(key=lambda entry: entry[0])
+            ranking = [uri for latency, uri in reachable] + unreachable
+            self.rankings.Set(key, ranking)
+            for uri in unreachable:
+                self.failed.Set(uri, True)
+
+        return ranking
+
+    def SelectUri(self, uris):
+        """
+        Return the fastest URI from the list that responded to its probe and was not marked as failed, see MarkFailed()
+
+        If every URI has failed, the URIs are probed again before giving up.
+
+        Note: Threads selecting from the same URIs at the same time may each probe them
+        """
+        if not len(uris):
+            raise EndpointSelectionError('No endpoints to select from')
+
+        for refresh in (False, True):
+            for uri in self.RankUris(uris, refresh=refresh):
+                if uri not in self.failed:
+                    return uri
+            # Everything failed; forget the failures and probe again
+            for uri in uris:
+                self.failed.Invalidate(uri)
+
+        self.log.warning('No endpoint responded to probing; defaulting to {0:}'.format(uris[0]))
+        return uris[0]
+
+    def GetBestUri(self, service_name, region=None):
+        """
+        Return the fastest reachable URI for a service in the service catalog
+        """
+        uris = [candidate['uri'] for candidate in self.GetCandidates(service_name, region)]
+        if not len(uris):
+            msg = 'Unable to find any {0:} endpoints (region: {1:})'.format(service_name, region)
+            self.log.error(msg)
+            raise EndpointSelectionError(msg)
+        return self.SelectUri(uris)
+
+    def GetBestApiHost(self, service_name, region=None, include_path=True):
+        """
+        Return the fastest reachable endpoint in the apihost form used by cloudbackup.common.command.Command
+        """
+        return uri_to_apihost(self.GetBestUri(service_name, region), include_path=include_path)
+
+    def MarkFailed(self, uri):
+        """
+        Report that an endpoint failed, f.e a call could not connect to it
+
+        The endpoint is skipped for 'ttl' seconds and the rankings containing it are dropped, so the
+        next selection probes again and fails over to the next fastest endpoint
+        """
+        self.log.warning('Marking endpoint {0:} as failed'.format(uri))
+        self.failed.Set(uri, True)
+        for key in self.rankings.Keys():
+            if uri in key:
+                self.rankings.Invalidate(key)
+
+    def Invalidate(self):
+        """
+        Forget all rankings and failures so the next selection probes again
+        """
+        self.rankings.Clear()
+        self.failed.Clear()
@@ -0,0 +1,179 @@
+"""
+Rackspace Cloud Backup Fleet Analytics
+
+Note: Requires numpy (pip install numpy)
+"""
+import logging
+import re
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from cloudbackup.client.agents import CompactAgentDetails
+
+# Value stored in FleetSnapshot.last_backup for agents that have never completed a backup
+NEVER = -1
+
+_version_expression = re.compile(r'\d+')
+
+
+def _parse_version(version, width):
+    """
+    (Internal) Convert a version string (f.e '1.10.005123') into a tuple of 'width' integers, padding with zeros
+    """
+    parts = [int(part) for part in _version_expression.findall(version or '')][:width]
+    return tuple(parts + [0] * (width - len(parts)))
+
+
+class FleetSnapshot(object):
+    """
+    Columnar copy of an account's agents held in numpy arrays for vectorized queries
+
+    Each column is a numpy array with one entry per agent, in the same order:
+        agent_ids - MachineAgentId (int64)
+        last_backup - last successful backup in milliseconds since the Unix Epoch, NEVER if none (int64)
+        vault_bytes - size of the backup vault in bytes (int64)
+        status_codes - index into 'statuses' (int16)
+        datacenter_codes - index into 'datacenters' (int16)
+        versions - agent version as a row of integers (int32, shape (n, version_width))
+        disabled - whether or not the agent is disabled (bool)
+        encrypted - whether or not the agent's backups are encrypted (bool)
+
+    Machine names and host server ids are kept as plain lists.
+    """
+
+    def __init__(self, agents, version_width=4):
+        """
+        Build the snapshot
+          agents - iterable of CompactAgentDetails, AgentDetails or agent list dictionaries (see Agents.GetAgentList())
+          version_width - number of version components to keep
+        """
+        if numpy is None:
+            raise ImportError('FleetSnapshot requires numpy. Install it with: pip install numpy')
+
+        self.log = logging.getLogger(__name__)
+        agents = [self._compact(agent) for agent in agents]
+        count = len(agents)
+
+        self.statuses = sorted(set(agent.Status for agent in agents))
+        self.datacenters = sorted(set(agent.Datacenter for agent in agents))
+        status_index = dict((status, index) for index, status in enumerate(self.statuses))
+        datacenter_index = dict((datacenter, index) for index, datacenter in enumerate(self.datacenters))
+
+        self.agent_ids = numpy.fromiter((agent.agent_id for agent in agents), dtype=numpy.int64, count=count)
+        self.last_backup = numpy.fromiter((NEVER if agent.LastSuccessfulBackupEpoch is None else agent.LastSuccessfulBackupEpoch for agent in agents), dtype=numpy.int64, count=count)
+        self.vault_bytes = numpy.fromiter((agent.BackupVaultBytes or 0 for agent in agents), dtype=numpy.int64, count=count)
+        self.status_codes = numpy.fromiter((status_index[agent.Status] for agent in agents), dtype=numpy.int16, count=count)
+        self.datacenter_codes = numpy.fromiter((datacenter_index[agent.Datacenter] for agent in agents), dtype=numpy.int16, count=count)
+        self.versions = numpy.array([_parse_version(agent.AgentVersion, version_width) for agent in agents], dtype=numpy.int32).reshape(count, version_width)
+        self.disabled = numpy.fromiter((bool(agent.IsDisabled) for agent in agents), dtype=bool, count=count)
+        self.encrypted = numpy.fromiter((bool(agent.IsEncrypted) for agent in agents), dtype=bool, count=count)
+        self.machine_names = [agent.MachineName for agent in agents]
+        self.host_server_ids = [agent.HostServerId for agent in agents]
+        self.log.debug('Fleet Snapshot built for {0:} agents'.format(count))
+
+    def __len__(self):
+        return len(self.agent_ids)
+
+    @staticmethod
+    def _compact(agent):
+        """
+        (Internal) Convert an agent into a CompactAgentDetails
+        """
+        if isinstance(agent, CompactAgentDetails):
+            return agent
+        if isinstance(agent, dict):
+            return CompactAgentDetails(agent)
+        return agent.Compact()
+
+    def StatusMask(self, status):
+        """
+        Boolean mask of the agents with the given Status
+        """
+        if status not in self.statuses:
+            return numpy.zeros(len(self), dtype=bool)
+        return self.status_codes == self.statuses.index(status)
+
+    def DatacenterMask(self, datacenter):
+        """
+        Boolean mask of the agents in the given Datacenter
+        """
+        if datacenter not in self.datacenters:
+            return numpy.zeros(len(self), dtype=bool)
+        return self.datacenter_codes == self.datacenters.index(datacenter)
+
+    def StaleSince(self, epoch_ms, include_never=True, include_disabled=False):
+        """
+        Return the agent ids whose last successful backup is older than epoch_ms
+          epoch_ms - cut off in milliseconds since the Unix Epoch
+          include_never - whether or not to include agents that have never completed a backup
+          include_disabled - whether or not to include disabled agents
+        """
+        mask = (self.last_backup < epoch_ms) & (self.last_backup != NEVER)
+        if include_never:
+            mask |= (self.last_backup == NEVER)
+        if not include_disabled:
+            mask &= ~self.disabled
+        return self.agent_ids[mask]
+
+    def StaleFor(self, seconds, now=None, include_never=True, include_disabled=False):
+        """
+        Return the agent ids that have not completed a backup within the last 'seconds', see StaleSince()
+          now - current time in seconds since the Unix Epoch; defaults to time.time()
+        """
+        if now is None:
+            now = time.time()
+        return self.StaleSince(int((now - seconds) * 1000), include_never=include_never, include_disabled=include_disabled)
+
+    def TopKVaultSize(self, k):
+        """
+        Return the agent ids and vault sizes (in bytes) of the k agents with the largest vaults, largest first
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return (self.agent_ids[:0], self.vault_bytes[:0])
+        candidates = numpy.argpartition(self.vault_bytes, len(self) - k)[len(self) - k:]
+        order = candidates[numpy.argsort(self.vault_bytes[candidates])[::-1]]
+        return (self.agent_ids[order], self.vault_bytes[order])
+
+    def OlderThanVersion(self, version):
+        """
+        Return the agent ids whose agent version is older than 'version' (a string or tuple of integers)
+        """
+        width = self.versions.shape[1]
+        if not isinstance(version, tuple):
+            version = _parse_version(version, width)
+        target = numpy.array((tuple(version) + (0,) * width)[:width], dtype=numpy.int32)
+
+        older = numpy.zeros(len(self), dtype=bool)
+        undecided = numpy.ones(len(self), dtype=bool)
+        for column in range(width):
+            older |= undecided & (self.versions[:, column] < target[column])
+            undecided &= (self.versions[:, column] == target[column])
+        return self.agent_ids[older]
+
+    def GroupByDatacenter(self):
+        """
+        Summarize the fleet per Datacenter
+
+        Returns a dictionary of Datacenter -> dictionary containing:
+            Agents - number of agents
+            Disabled - number of disabled agents
+            VaultBytes - total size of the backup vaults in bytes
+        """
+        buckets = len(self.datacenters)
+        agents = numpy.bincount(self.datacenter_codes, minlength=buckets)
+        disabled = numpy.bincount(self.datacenter_codes, weights=self.disabled, minlength=buckets)
+        vault_bytes = numpy.bincount(self.datacenter_codes, weights=self.vault_bytes, minlength=buckets)
+
+        summary = {}
+        for index, datacenter in enumerate(self.datacenters):
+            summary[datacenter] = {
+                'Agents': int(agents[index]),
+                'Disabled': int(disabled[index]),
+                'VaultBytes': int(vault_bytes[index])
+            }
+        return summary
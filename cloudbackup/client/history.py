@@ -0,0 +1,198 @@
+"""
+Rackspace Cloud Backup Completed Backup History
+"""
+import bisect
+import logging
+import threading
+
+from cloudbackup.common.cache import monotonic
+from cloudbackup.common.convert import date_to_epoch_ms
+
+
+def is_successful(snapshot, allow_errors=False):
+    """
+    Return whether or not a completed backup entry (see Backups.GetCompletedBackups()) succeeded
+      allow_errors - whether or not a backup that completed with errors counts as successful
+    """
+    state = snapshot.get('State', snapshot.get('CurrentState'))
+    if state is not None:
+        return state == 'Completed' or (allow_errors and state == 'CompletedWithErrors')
+    return allow_errors or not snapshot.get('NumErrors')
+
+
+class _ConfigurationHistory(object):
+    """
+    (Internal) Completed backups of one backup configuration indexed by BackupId and completion time
+    """
+
+    def __init__(self):
+        self.by_id = {}
+        # (completed time in ms since the Unix Epoch, BackupId) in completion order
+        self.timeline = []
+        self.loaded = None
+        # BackupId -> time of the refresh that did not find it, see CompletedBackupHistory.Get()
+        self.misses = {}
+
+    def Merge(self, snapshots):
+        """
+        Add the entries not seen before, returning how many were added
+        """
+        added = 0
+        for snapshot in snapshots:
+            backup_id = str(snapshot['BackupId'])
+            if backup_id in self.by_id:
+                continue
+            # parse first so an entry whose time fails to parse is not left half indexed
+            completed = date_to_epoch_ms(snapshot.get('CompletedTime'))
+            self.by_id[backup_id] = snapshot
+            self.misses.pop(backup_id, None)
+            bisect.insort(self.timeline, (-1 if completed is None else completed, backup_id))
+            added += 1
+        return added
+
+
+class CompletedBackupHistory(object):
+    """
+    Cache of the completed backups of each backup configuration (/v1.0/backup/completed/{id})
+
+    Entries are indexed by BackupId and by completion time so that lookups, time ranges and
+    "latest successful" queries are answered locally. A configuration's list is retrieved
+    again once it is older than 'ttl' seconds, or when a lookup misses; the entries already
+    known are kept and only the new ones are indexed. A BackupId still unknown after a
+    retrieval is not retrieved for again until 'miss_ttl' seconds have passed, or until a
+    retrieval made for another reason finds it.
+
+    Note: The API always returns a configuration's whole list so a refresh still transfers it;
+          the savings are in not calling the API for every query and not re-indexing known entries
+    """
+
+    def __init__(self, loader, ttl=60, miss_ttl=5):
+        """
+        Initialize the Completed Backup History
+          loader - callable(backup_config_id) returning the list of completed backups, raising on failure,
+                   f.e cloudbackup.client.backup.Backups._get_completed_backups
+          ttl - number of seconds before a configuration's list is retrieved again; None to only refresh on a miss
+          miss_ttl - number of seconds an unknown BackupId is remembered as missing, kept short so a backup that
+                     has just completed is found soon; None to retrieve the list on every miss
+        """
+        self.log = logging.getLogger(__name__)
+        self.loader = loader
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._histories = {}
+        self._lock = threading.RLock()
+
+    def _history(self, backup_config_id):
+        """
+        (Internal) Return the history of the configuration; the caller must hold the lock
+        """
+        history = self._histories.get(backup_config_id)
+        if history is None:
+            history = _ConfigurationHistory()
+            self._histories[backup_config_id] = history
+        return history
+
+    def Refresh(self, backup_config_id):
+        """
+        Retrieve the configuration's completed backups and index the new ones
+
+        Returns the number of new entries
+        """
+        snapshots = self.loader(backup_config_id)
+        with self._lock:
+            history = self._history(backup_config_id)
+            added = history.Merge(snapshots)
+            history.loaded = monotonic()
+        self.log.debug('Completed Backup History for backup configuration id {0:}: {1:} new of {2:}'.format(backup_config_id, added, len(snapshots)))
+        return added
+
+    def _ensure_fresh(self, backup_config_id):
+        """
+        (Internal) Refresh the configuration if it has never been retrieved or has expired
+
+        Returns whether or not it was retrieved
+        """
+        with self._lock:
+            loaded = self._history(backup_config_id).loaded
+        if loaded is None or (self.ttl is not None and (monotonic() - loaded) >= self.ttl):
+            self.Refresh(backup_config_id)
+            return True
+        return False
+
+    def Invalidate(self, backup_config_id=None):
+        """
+        Make the configuration (or all configurations when None) be retrieved again on the next query
+
+        The entries already known are kept since completed backups do not change
+        """
+        with self._lock:
+            histories = self._histories.values() if backup_config_id is None else [self._history(backup_config_id)]
+            for history in histories:
+                history.loaded = None
+                history.misses = {}
+
+    def Get(self, backup_config_id, backup_id, refresh_on_miss=True):
+        """
+        Return the completed backup entry for the BackupId; None if it is not known
+          refresh_on_miss - whether or not to retrieve the list again when the BackupId is not known,
+                            f.e for a backup that has only just completed; a BackupId that is still
+                            not known is remembered as missing until the miss_ttl passes
+        """
+        backup_id = str(backup_id)
+        fetched = self._ensure_fresh(backup_config_id)
+        with self._lock:
+            history = self._history(backup_config_id)
+            snapshot = history.by_id.get(backup_id)
+            if snapshot is not None or not refresh_on_miss:
+                return snapshot
+            if fetched:
+                # the list was just retrieved so retrieving it again would not find more
+                history.misses[backup_id] = monotonic()
+                return None
+            if self._recently_missed(history, backup_id):
+                return None
+        self.Refresh(backup_config_id)
+        with self._lock:
+            history = self._history(backup_config_id)
+            snapshot = history.by_id.get(backup_id)
+            if snapshot is None:
+                history.misses[backup_id] = monotonic()
+        return snapshot
+
+    def _recently_missed(self, history, backup_id):
+        """
+        (Internal) Return whether the BackupId was missing from a retrieval within the miss_ttl; the caller must hold the lock
+        """
+        missed = history.misses.get(backup_id)
+        if missed is None or self.miss_ttl is None:
+            return False
+        if (monotonic() - missed) >= self.miss_ttl:
+            del history.misses[backup_id]
+            return False
+        return True
+
+    def Completed(self, backup_config_id, since=None, until=None):
+        """
+        Return the completed backup entries in completion order
+          since - only entries completed at or after this time (milliseconds since the Unix Epoch)
+          until - only entries completed before this time (milliseconds since the Unix Epoch)
+        """
+        self._ensure_fresh(backup_config_id)
+        with self._lock:
+            history = self._history(backup_config_id)
+            start = 0 if since is None else bisect.bisect_left(history.timeline, (since, ''))
+            end = len(history.timeline) if until is None else bisect.bisect_left(history.timeline, (until, ''))
+            return [history.by_id[backup_id] for _, backup_id in history.timeline[start:end]]
+
+    def LatestSuccessful(self, backup_config_id, allow_errors=False):
+        """
+        Return the most recently completed successful backup entry; None if there is none
+          allow_errors - see is_successful()
+        """
+        self._ensure_fresh(backup_config_id)
+        with self._lock:
+            history = self._history(backup_config_id)
+            for _, backup_id in reversed(history.timeline):
+                if is_successful(history.by_id[backup_id], allow_errors=allow_errors):
+                    return history.by_id[backup_id]
+        return None
@@ -0,0 +1,184 @@
+"""
+Rackspace Cloud Backup Agent Inventory
+"""
+import logging
+import threading
+
+from cloudbackup.common.cache import monotonic
+
+# agent fields indexed by value; MachineAgentId is indexed by its string form
+_INDEXED_FIELDS = ('HostServerId', 'MachineName', 'IPAddress', 'MachineAgentId')
+
+
+def _index_key(field, agent):
+    """
+    (Internal) Return the value the agent is indexed by for the field; None if it has none
+    """
+    value = agent.get(field)
+    if value is not None and field == 'MachineAgentId':
+        return str(value)
+    return value
+
+
+class AgentInventory(object):
+    """
+    Indexed copy of the account's agent list (/v1.0/user/agents)
+
+    The list is retrieved once and indexed by HostServerId, MachineName, IPAddress and
+    MachineAgentId so that matching a host is a few dictionary lookups instead of a scan of
+    every agent. The list is retrieved again once it is older than 'ttl' seconds.
+    """
+
+    def __init__(self, loader, ttl=300):
+        """
+        Initialize the Agent Inventory
+          loader - callable returning the list of agent dictionaries, f.e cloudbackup.client.agents.Agents.GetAgentList
+          ttl - number of seconds to keep the agent list before retrieving it again; None to never expire
+        """
+        self.log = logging.getLogger(__name__)
+        self.loader = loader
+        self.ttl = ttl
+        self.loaded = None
+        self._agents = []
+        # field -> value -> list of positions in _agents
+        self._indexes = dict((field, {}) for field in _INDEXED_FIELDS)
+        self._lock = threading.RLock()
+        # serializes the retrievals so that expiry only causes one
+        self._load_lock = threading.Lock()
+
+    def __len__(self):
+        self._ensure_loaded()
+        with self._lock:
+            return len([agent for agent in self._agents if agent is not None])
+
+    def _expired(self):
+        """
+        (Internal) Return whether the agent list has not been retrieved or has expired
+        """
+        loaded = self.loaded
+        return loaded is None or (self.ttl is not None and (monotonic() - loaded) >= self.ttl)
+
+    def _ensure_loaded(self):
+        """
+        (Internal) Retrieve the agent list if it has not been retrieved or has expired
+
+        The caller must not hold the lock so that queries are not blocked by the retrieval
+        """
+        if self._expired():
+            with self._load_lock:
+                # another thread may have retrieved it while this one waited
+                if self._expired():
+                    self.Refresh()
+
+    @staticmethod
+    def _index(indexes, position, agent, remove=False):
+        """
+        (Internal) Add (or remove) the agent's position in the indexes
+        """
+        for field in _INDEXED_FIELDS:
+            key = _index_key(field, agent)
+            if key is None:
+                continue
+            if not remove:
+                indexes[field].setdefault(key, []).append(position)
+                continue
+            positions = indexes[field].get(key, [])
+            if position in positions:
+                positions.remove(position)
+            if not positions:
+                indexes[field].pop(key, None)
+
+    def Refresh(self):
+        """
+        Retrieve the agent list and rebuild the indexes
+        """
+        agentlist = list(self.loader())
+        indexes = dict((field, {}) for field in _INDEXED_FIELDS)
+        for position, agent in enumerate(agentlist):
+            self._index(indexes, position, agent)
+
+        with self._lock:
+            self._agents = agentlist
+            self._indexes = indexes
+            self.loaded = monotonic()
+        self.log.debug('Agent Inventory loaded {0:} agents'.format(len(agentlist)))
+
+    def Invalidate(self):
+        """
+        Forget the agent list so the next access retrieves it again
+        """
+        with self._lock:
+            self.loaded = None
+
+    def Discard(self, machine_agent_id):
+        """
+        Remove an agent from the inventory, f.e after it has been removed via the API
+        """
+        with self._lock:
+            for position in list(self._indexes['MachineAgentId'].get(str(machine_agent_id), ())):
+                self._index(self._indexes, position, self._agents[position], remove=True)
+                # Keep the positions stable for the indexes
+                self._agents[position] = None
+
+    def Update(self, machine_agent_id, values):
+        """
+        Update the fields of an agent in the inventory, f.e after it has been changed via the API
+          values - dictionary of the fields to change
+        """
+        with self._lock:
+            for position in list(self._indexes['MachineAgentId'].get(str(machine_agent_id), ())):
+                agent = self._agents[position]
+                # re-index in case an indexed field changes
+                self._index(self._indexes, position, agent, remove=True)
+                agent.update(values)
+                self._index(self._indexes, position, agent)
+
+    @property
+    def Agents(self):
+        """
+        List of all the agent dictionaries in the inventory
+        """
+        self._ensure_loaded()
+        with self._lock:
+            return [agent for agent in self._agents if agent is not None]
+
+    def _match_positions(self, cloud_server_name, cloud_server_id, cloud_server_ips):
+        """
+        (Internal) Return the set of agent list positions matching the host; the caller must hold the lock
+        """
+        positions = set()
+        if cloud_server_id is not None:
+            positions.update(self._indexes['HostServerId'].get(cloud_server_id, ()))
+        if cloud_server_name is not None:
+            positions.update(self._indexes['MachineName'].get(cloud_server_name, ()))
+        if cloud_server_ips is not None:
+            # a single address is not a list of one-character addresses
+            if isinstance(cloud_server_ips, (str, type(u''))):
+                cloud_server_ips = [cloud_server_ips]
+            for ip in set(cloud_server_ips):
+                positions.update(self._indexes['IPAddress'].get(ip, ()))
+        return positions
+
+    def MatchHost(self, cloud_server_name=None, cloud_server_id=None, cloud_server_ips=None):
+        """
+        Return the list of agent dictionaries matching any of the cloud server's name, id (HostServerId) or IP addresses
+          cloud_server_ips - list of IP addresses, or a single IP address
+
+        Agents are returned in the order of the agent list and each agent is returned at most once
+        """
+        return self.MatchHosts([(cloud_server_name, cloud_server_id, cloud_server_ips)])[0]
+
+    def MatchHosts(self, hosts):
+        """
+        Match a batch of hosts against a single copy of the agent list
+          hosts - iterable of (cloud_server_name, cloud_server_id, cloud_server_ips) tuples; unknown values may be None
+
+        Returns a list containing the list of matching agent dictionaries for each host, in the order given
+        """
+        results = []
+        self._ensure_loaded()
+        with self._lock:
+            for cloud_server_name, cloud_server_id, cloud_server_ips in hosts:
+                positions = self._match_positions(cloud_server_name, cloud_server_id, cloud_server_ips)
+                results.append([self._agents[position] for position in sorted(positions) if self._agents[position] is not None])
+        return results
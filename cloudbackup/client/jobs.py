@@ -0,0 +1,505 @@
+"""
+Rackspace Cloud Backup Job Watcher
+"""
+import heapq
+import itertools
+import logging
+import threading
+
+from cloudbackup.client.backup import BACKUP_FINAL_STATES, RESTORE_FINAL_STATES, RESTORE_STATES
+from cloudbackup.common.cache import monotonic, TtlCache
+from cloudbackup.common.digest import digest
+from cloudbackup.common.workers import run_concurrently
+
+JOB_BACKUP = 'backup'
+JOB_RESTORE = 'restore'
+
+# States in which a job is waiting on something else and is not expected to change soon
+BACKUP_WAITING_STATES = ('Queued', 'StartRequested', 'StartScheduled', 'Preparing', 'Creating')
+RESTORE_WAITING_STATES = (0, 1, 6, 9)
+
+
+class JobFuture(object):
+    """
+    The eventual outcome of a backup or restore, see JobWatcher.WatchBackup() and JobWatcher.WatchRestore()
+    """
+
+    def __init__(self, kind, job_id, deadline, poll_interval=None):
+        self.kind = kind
+        self.job_id = job_id
+        self.deadline = deadline
+        # Fixed number of seconds between polls; None for the watcher's adaptive interval
+        self.poll_interval = poll_interval
+        # Last status retrieved, see Backups.GetBackupDetails() and Restores.GetRestoreDetails()
+        self.status = None
+        self.state = None
+        self.timed_out = False
+        self.polls = 0
+        self.interval = None
+        self._entry = None
+        self._polling = False
+        self._poked = False
+        self._callbacks = []
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    def Done(self):
+        """
+        Return whether or not the job has finished or the watch has timed out
+        """
+        return self._event.is_set()
+
+    def Result(self, timeout=None):
+        """
+        Wait for the job to finish
+          timeout - number of seconds to wait; None to wait until the watch resolves
+
+        Returns the final status dictionary; the last status retrieved if the watch timed out
+        (check 'timed_out'); None if still pending
+        """
+        self._event.wait(timeout)
+        return self.status
+
+    def AddDoneCallback(self, callback):
+        """
+        Call callback(JobFuture) once the watch resolves; immediately if it already has
+
+        Note: Callbacks are called from the watcher thread so they should return quickly
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _resolve(self, timed_out):
+        """
+        (Internal) Mark the watch as resolved and call the callbacks
+        """
+        with self._lock:
+            self.timed_out = timed_out
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as ex:
+                logging.getLogger(__name__).error('Job callback failed for {0:} {1:}: {2:}'.format(self.kind, self.job_id, ex))
+
+
+class JobWatcher(object):
+    """
+    Watch any number of backups and restores from a single thread
+
+    Jobs are kept in a heap ordered by when they are next due to be polled; all the jobs that
+    come due together are polled concurrently over the shared connection pool. Each job has its
+    own poll interval:
+        - 'queued_interval' while the job is waiting to start
+        - 'min_interval' right after its state changes, doubling up to 'max_interval' while it
+          stays the same
+    so jobs that are moving are polled quickly and jobs that are idle cost little.
+    """
+
+    def __init__(self, backups=None, restores=None, min_interval=2.0, max_interval=30.0, queued_interval=15.0, max_workers=10):
+        """
+        Initialize the Job Watcher
+          backups - instance of cloudbackup.client.backup.Backups used to poll backups
+          restores - instance of cloudbackup.client.backup.Restores used to poll restores
+          min_interval - shortest number of seconds between polls of a job
+          max_interval - longest number of seconds between polls of a running job
+          queued_interval - number of seconds between polls of a job waiting to start
+          max_workers - maximum number of polls to have outstanding at once
+        """
+        self.log = logging.getLogger(__name__)
+        self.backups = backups
+        self.restores = restores
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.queued_interval = queued_interval
+        self.max_workers = max_workers
+        self._heap = []
+        self._futures = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    def __len__(self):
+        with self._condition:
+            return len(self._futures)
+
+    def _schedule(self, future, due):
+        """
+        (Internal) Schedule the next poll of the job; the caller must hold the condition
+
+        Note: Any earlier heap entry for the job becomes stale and is skipped when it reaches the top of the heap
+        """
+        future._entry = next(self._counter)
+        heapq.heappush(self._heap, (due, future._entry, future))
+        self._condition.notify()
+
+    def _watch(self, kind, job_id, timeout, poll_interval):
+        """
+        (Internal) Start watching a job, returning its JobFuture; a job already being watched returns the same JobFuture
+        """
+        with self._condition:
+            future = self._futures.get((kind, job_id))
+            if future is None:
+                now = monotonic()
+                future = JobFuture(kind, job_id, None if timeout is None else now + timeout, poll_interval=poll_interval)
+                self._futures[(kind, job_id)] = future
+                self._schedule(future, now)
+            if self._thread is None:
+                self._stop = False
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            return future
+
+    def WatchBackup(self, snapshot_id, timeout=None, poll_interval=None):
+        """
+        Watch a backup
+          snapshot_id - snapshot id of the backup, see Backups.StartBackup()
+          timeout - number of seconds to watch for; None to watch until the backup finishes
+          poll_interval - fixed number of seconds between polls, f.e when changes are signalled
+                          through Poke(); None for the adaptive interval
+
+        Returns a JobFuture resolving with the final status, see Backups.GetBackupDetails()
+        """
+        if self.backups is None:
+            raise ValueError('JobWatcher requires a Backups instance to watch backups')
+        return self._watch(JOB_BACKUP, snapshot_id, timeout, poll_interval)
+
+    def WatchRestore(self, restore_id, timeout=None, poll_interval=None):
+        """
+        Watch a restore
+          restore_id - id of the restore, see Restores.StartRestore()
+          timeout - number of seconds to watch for; None to watch until the restore finishes
+          poll_interval - see WatchBackup()
+
+        Returns a JobFuture resolving with the final restore details, see Restores.GetRestoreDetails()
+        """
+        if self.restores is None:
+            raise ValueError('JobWatcher requires a Restores instance to watch restores')
+        return self._watch(JOB_RESTORE, restore_id, timeout, poll_interval)
+
+    def Poke(self, kind, job_id):
+        """
+        Poll a watched job as soon as possible, f.e when told that it changed
+          kind - JOB_BACKUP or JOB_RESTORE
+
+        Returns True if the job is being watched; otherwise False
+        """
+        with self._condition:
+            future = self._futures.get((kind, job_id))
+            if future is None:
+                return False
+            if future._polling:
+                # Poll again once the poll in progress completes as it may have missed the change
+                future._poked = True
+            else:
+                self._schedule(future, monotonic())
+            return True
+
+    def Stop(self):
+        """
+        Stop the watcher thread, resolving all outstanding jobs as timed out
+        """
+        with self._condition:
+            thread = self._thread
+            self._stop = True
+            self._condition.notify()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        with self._condition:
+            self._thread = None
+            futures = list(self._futures.values())
+            self._futures = {}
+            self._heap = []
+        for future in futures:
+            future._resolve(True)
+
+    def _fetch(self, future):
+        """
+        (Internal) Retrieve the status of a job, raising RuntimeError on failure
+        """
+        if future.kind == JOB_BACKUP:
+            status = self.backups.GetBackupDetails(future.job_id)
+        else:
+            status = self.restores.GetRestoreDetails(future.job_id)
+        if not len(status):
+            raise RuntimeError('Unable to retrieve the status of {0:} {1:}'.format(future.kind, future.job_id))
+        return status
+
+    @staticmethod
+    def _state(future, status):
+        """
+        (Internal) Return the state of the job from its status and whether or not it is final
+        """
+        if future.kind == JOB_BACKUP:
+            state = status.get('CurrentState')
+            return (state, state in BACKUP_FINAL_STATES)
+        state = status.get('RestoreStateId')
+        return (state, state in RESTORE_FINAL_STATES)
+
+    def _next_interval(self, future, state, changed):
+        """
+        (Internal) Number of seconds until the job should be polled again
+        """
+        if future.poll_interval is not None:
+            return future.poll_interval
+        if state in (BACKUP_WAITING_STATES if future.kind == JOB_BACKUP else RESTORE_WAITING_STATES):
+            return self.queued_interval
+        if changed or future.interval is None:
+            return self.min_interval
+        return min(future.interval * 2, self.max_interval)
+
+    def _next_due(self):
+        """
+        (Internal) Wait for jobs to come due and return them; returns None when the watcher is stopping
+        """
+        with self._condition:
+            while not self._stop:
+                while len(self._heap) and self._heap[0][1] != self._heap[0][2]._entry:
+                    heapq.heappop(self._heap)
+
+                now = monotonic()
+                if len(self._heap) and self._heap[0][0] <= now:
+                    due = []
+                    while len(self._heap) and self._heap[0][0] <= now:
+                        _, entry, future = heapq.heappop(self._heap)
+                        if entry == future._entry:
+                            future._polling = True
+                            due.append(future)
+                    return due
+
+                self._condition.wait(self._heap[0][0] - now if len(self._heap) else None)
+            return None
+
+    def _update(self, future, status, ex):
+        """
+        (Internal) Record the result of polling the job, resolving or rescheduling it
+        """
+        now = monotonic()
+        future.polls += 1
+        final = False
+        if ex is not None:
+            self.log.warning('Unable to poll {0:} {1:}: {2:}'.format(future.kind, future.job_id, ex))
+            future.interval = min((future.interval or self.min_interval) * 2, self.max_interval)
+        else:
+            state, final = self._state(future, status)
+            changed = (state != future.state)
+            if changed:
+                self.log.info('{0:} {1:} is now {2:}'.format(future.kind.capitalize(), future.job_id, RESTORE_STATES.get(state, state) if future.kind == JOB_RESTORE else state))
+            future.status = status
+            future.state = state
+            future.interval = self._next_interval(future, state, changed)
+
+        timed_out = not final and future.deadline is not None and future.deadline <= now
+        if final or timed_out:
+            with self._condition:
+                self._futures.pop((future.kind, future.job_id), None)
+            future._resolve(timed_out)
+            return
+
+        due = now + future.interval
+        if future.deadline is not None:
+            due = min(due, future.deadline)
+        with self._condition:
+            future._polling = False
+            if future._poked:
+                future._poked = False
+                due = now
+            self._schedule(future, due)
+
+    def _run(self):
+        """
+        (Internal) Watcher thread
+        """
+        while True:
+            due = self._next_due()
+            if due is None:
+                break
+            for future, status, ex in run_concurrently(self._fetch, due, max_workers=self.max_workers):
+                self._update(future, status, ex)
+
+        self.log.debug('Job Watcher terminating')
+
+
+class RseJobNotifier(object):
+    """
+    Poll watched backups and restores when their agents report on RSE instead of on a timer
+
+    The RSE channels of the agents running the watched jobs are read from a single thread. An
+    event naming a watched BackupId or RestoreId, or any other non heart beat event from the
+    agent, makes the JobWatcher poll the affected jobs right away. Between events the jobs are
+    only polled every 'fallback_interval' seconds in case an event is missed.
+    """
+
+    # Event names that never signal a change in a job
+    IGNORED_EVENTS = ('Heartbeat',)
+
+    # Number of seconds an event without an id is placed within by its posting time, see _event_key()
+    POSTED_BUCKET = 10
+
+    def __init__(self, watcher, rse, agents, poll_period=2.0, fallback_interval=120.0):
+        """
+        Initialize the RSE Job Notifier
+          watcher - JobWatcher used to poll the jobs
+          rse - cloudbackup.client.rse.Rse instance; it is cloned so RSE may be read from the notifier thread
+          agents - instance of cloudbackup.client.agents.Agents dedicated to the notifier
+          poll_period - number of seconds between reads of the RSE channels
+          fallback_interval - number of seconds between polls of a job when no event is received
+        """
+        self.log = logging.getLogger(__name__)
+        self.watcher = watcher
+        self.rse = rse.Clone(agents)
+        self.poll_period = poll_period
+        self.fallback_interval = fallback_interval
+        self.events_seen = 0
+        self.jobs_poked = 0
+        # Each RSE read returns the recent events again so remember those already handled
+        self._handled = TtlCache(ttl=600)
+        self._jobs = {}
+        self._condition = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    def _watch(self, kind, job_id, machine_agent_id, future):
+        """
+        (Internal) Listen for the agent's events on behalf of the job
+        """
+        with self._condition:
+            self._jobs.setdefault(machine_agent_id, {})[(kind, job_id)] = future
+            if self._thread is None:
+                self._stop = False
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+        future.AddDoneCallback(lambda done: self._forget(machine_agent_id, (kind, job_id)))
+        return future
+
+    def _forget(self, machine_agent_id, key):
+        """
+        (Internal) Stop listening on behalf of a job once it resolves
+        """
+        with self._condition:
+            jobs = self._jobs.get(machine_agent_id, {})
+            jobs.pop(key, None)
+            if not len(jobs):
+                self._jobs.pop(machine_agent_id, None)
+
+    def WatchBackup(self, snapshot_id, machine_agent_id, timeout=None):
+        """
+        Watch a backup, see JobWatcher.WatchBackup()
+          machine_agent_id - agent running the backup
+
+        Returns a JobFuture
+        """
+        future = self.watcher.WatchBackup(snapshot_id, timeout=timeout, poll_interval=self.fallback_interval)
+        return self._watch(JOB_BACKUP, snapshot_id, machine_agent_id, future)
+
+    def WatchRestore(self, restore_id, machine_agent_id, timeout=None):
+        """
+        Watch a restore, see JobWatcher.WatchRestore()
+          machine_agent_id - agent performing the restore (the destination machine)
+
+        Returns a JobFuture
+        """
+        future = self.watcher.WatchRestore(restore_id, timeout=timeout, poll_interval=self.fallback_interval)
+        return self._watch(JOB_RESTORE, restore_id, machine_agent_id, future)
+
+    def Stop(self):
+        """
+        Stop the notifier thread; the watched jobs are left to the JobWatcher
+        """
+        with self._condition:
+            thread = self._thread
+            self._stop = True
+            self._condition.notify()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        with self._condition:
+            self._thread = None
+
+    @staticmethod
+    def _affected(machine_agent_id, event, jobs):
+        """
+        (Internal) Return the keys of the agent's jobs an event applies to
+
+        Note: Channels read via the API carry the events of other agents too
+        """
+        data = event.get('data', {})
+        if data.get('Event') in RseJobNotifier.IGNORED_EVENTS or str(data.get('MachineAgentId', machine_agent_id)) != str(machine_agent_id):
+            return []
+        named = [(JOB_BACKUP, data.get('BackupId')), (JOB_RESTORE, data.get('RestoreId'))]
+        named = [key for key in named if key[1] is not None]
+        if len(named):
+            return [key for key in named if key in jobs]
+        # An agent event that does not name a job may be about any of them
+        return list(jobs.keys())
+
+    def _event_key(self, event):
+        """
+        (Internal) Return the key an event is recognised as already handled by
+
+        An event without an id is keyed by a digest of its data and the bucket of its posting time
+        (now less its age) so that each read of the channel does not handle it again while an
+        identical event posted later still is. Bucket boundaries may cause a repeated poke, which
+        only costs a poll.
+        """
+        event_id = event.get('id')
+        if event_id is not None:
+            return ('id', event_id)
+        age = event.get('age')
+        posted = None if age is None else int((monotonic() - age) // self.POSTED_BUCKET)
+        return ('data', digest(event.get('data')), posted)
+
+    def _dispatch(self, machine_agent_id, events, jobs):
+        """
+        (Internal) Poke the jobs affected by the agent's new events
+        """
+        poke = set()
+        for event in events:
+            event_key = self._event_key(event)
+            if event_key in self._handled:
+                continue
+            self._handled.Set(event_key, True)
+            self.events_seen += 1
+            poke.update(self._affected(machine_agent_id, event, jobs))
+        for kind, job_id in poke:
+            if self.watcher.Poke(kind, job_id):
+                self.jobs_poked += 1
+                self.log.debug('RSE event from agent id {0:} for {1:} {2:}'.format(machine_agent_id, kind, job_id))
+
+    def _next_agents(self):
+        """
+        (Internal) Wait for jobs to be watched and return them by agent; returns None when the notifier is stopping
+        """
+        with self._condition:
+            while not self._stop and not len(self._jobs):
+                self._condition.wait()
+            if self._stop:
+                return None
+            return dict((machine_agent_id, dict(jobs)) for machine_agent_id, jobs in self._jobs.items())
+
+    def _run(self):
+        """
+        (Internal) Notifier thread
+        """
+        while True:
+            watched = self._next_agents()
+            if watched is None:
+                break
+            for machine_agent_id, jobs in watched.items():
+                try:
+                    self._dispatch(machine_agent_id, self.rse.GetEvents(machine_agent_id), jobs)
+                except Exception as ex:
+                    self.log.error('Unable to read RSE for agent id {0:}: {1:}'.format(machine_agent_id, ex))
+            with self._condition:
+                if not self._stop:
+                    self._condition.wait(self.poll_period)
+
+        self.log.debug('RSE Job Notifier terminating')
@@ -0,0 +1,250 @@
+"""
+Rackspace Cloud Backup Backup Orchestration
+"""
+import collections
+import logging
+import threading
+
+from cloudbackup.client.backup import BackupConfiguration
+from cloudbackup.client.jobs import JobWatcher
+from cloudbackup.common.cache import monotonic
+
+try:
+    # Python3
+    import queue
+except ImportError:
+    # Python2
+    import Queue as queue
+
+# Outcome of running one backup configuration
+#   backup_config_id - the backup configuration that was run (None for a job that could not be read)
+#   machine_agent_id - the agent that ran it (None for a job that could not be read)
+#   output - dictionary returned by Backups.RunBackup() (None on failure)
+#   exception - the exception raised if the backup failed; None on success
+#   duration - number of seconds from the first start request to the end of the job
+BackupRunResult = collections.namedtuple('BackupRunResult', ['backup_config_id', 'machine_agent_id', 'output', 'exception', 'duration'])
+
+
+class BackupTimeoutError(RuntimeError):
+    """
+    The backup did not finish within the orchestrator's backup_timeout; it may still be running
+    """
+
+    def __init__(self, snapshot_id, timeout):
+        super(BackupTimeoutError, self).__init__('Backup snapshot id {0:} did not finish within {1:} seconds'.format(snapshot_id, timeout))
+        self.snapshot_id = snapshot_id
+
+
+class BackupSkippedError(RuntimeError):
+    """
+    The backup was not started because an earlier backup of the same agent timed out and may still be running
+    """
+    pass
+
+
+class BackupOrchestrator(object):
+    """
+    Run manual backups for many backup configurations concurrently
+
+    At most 'max_concurrent' backups run at once across the account and each agent only runs one
+    backup at a time; the backups of an agent are run in the order given. A backup that does not
+    finish within 'backup_timeout' may still be running, so the agent's remaining backups are
+    not started and are reported as failed with BackupSkippedError. Each backup follows
+    the start, monitor and report steps of Backups.StartBackupRetry() with its retries, while the
+    monitoring of all the running backups is shared by a single JobWatcher.
+    """
+
+    def __init__(self, backups, watcher=None, max_concurrent=20, retry_attempts=3, backup_timeout=None):
+        """
+        Initialize the Backup Orchestrator
+          backups - instance of cloudbackup.client.backup.Backups
+          watcher - JobWatcher used to monitor the backups; one is created if None
+          max_concurrent - maximum number of backups to run at once
+          retry_attempts - number of times to try each backup, see Backups.StartBackupRetry()
+          backup_timeout - number of seconds to wait for each backup; None to wait until it finishes
+        """
+        self.log = logging.getLogger(__name__)
+        self.backups = backups
+        self.watcher = watcher if watcher is not None else JobWatcher(backups=backups)
+        self.max_concurrent = max_concurrent
+        self.retry_attempts = retry_attempts
+        self.backup_timeout = backup_timeout
+        self._condition = threading.Condition()
+        self._pending = collections.OrderedDict()
+        self._busy = set()
+        # agents whose backup timed out, see _stall()
+        self._stalled = set()
+        self._feeding = False
+
+    @staticmethod
+    def _split_job(job):
+        """
+        (Internal) Return the (backup_config_id, machine_agent_id) for a job
+        """
+        if isinstance(job, BackupConfiguration):
+            return (job.ConfigurationId, job.MachineAgentId)
+        if isinstance(job, dict):
+            return (job['BackupConfigurationId'], job['MachineAgentId'])
+        return (job[0], job[1])
+
+    def _monitor(self, snapshot_id):
+        """
+        (Internal) Wait for the backup to finish, raising BackupTimeoutError if it does not within the backup_timeout
+        """
+        future = self.watcher.WatchBackup(snapshot_id, timeout=self.backup_timeout)
+        status = future.Result()
+        if future.timed_out:
+            raise BackupTimeoutError(snapshot_id, self.backup_timeout)
+        return status
+
+    def _run_one(self, backup_config_id, machine_agent_id):
+        """
+        (Internal) Run a single backup, returning its BackupRunResult
+        """
+        started = monotonic()
+        try:
+            output = self.backups.RunBackup(backup_config_id, self.retry_attempts, self._monitor)
+            return BackupRunResult(backup_config_id, machine_agent_id, output, None, monotonic() - started)
+        except Exception as ex:
+            self.log.error('Backup configuration {0:} on agent id {1:} failed: {2:}'.format(backup_config_id, machine_agent_id, ex))
+            return BackupRunResult(backup_config_id, machine_agent_id, None, ex, monotonic() - started)
+
+    def _queue_job(self, job, results):
+        """
+        (Internal) Queue a job for its agent; a job that cannot be read is reported as failed
+        """
+        try:
+            backup_config_id, machine_agent_id = self._split_job(job)
+        except Exception as ex:
+            self.log.error('Unable to read backup job {0:}: {1:}'.format(job, ex))
+            results.put(BackupRunResult(None, None, None, ex, 0))
+            return
+        with self._condition:
+            if machine_agent_id in self._stalled:
+                results.put(self._skipped(backup_config_id, machine_agent_id))
+                return
+            self._pending.setdefault(machine_agent_id, collections.deque()).append(backup_config_id)
+            self._condition.notify()
+
+    @staticmethod
+    def _skipped(backup_config_id, machine_agent_id):
+        """
+        (Internal) Return the BackupRunResult of a backup not started because the agent stalled
+        """
+        ex = BackupSkippedError('Backup configuration {0:} was not started as a backup on agent id {1:} timed out'.format(backup_config_id, machine_agent_id))
+        return BackupRunResult(backup_config_id, machine_agent_id, None, ex, 0)
+
+    def _stall(self, machine_agent_id, results):
+        """
+        (Internal) Stop the agent's queue after a backup timed out, reporting its remaining backups as skipped; the caller must hold the condition
+        """
+        self.log.error('Agent id {0:} may still be running a backup that timed out; skipping its remaining backups'.format(machine_agent_id))
+        self._stalled.add(machine_agent_id)
+        for backup_config_id in self._pending.pop(machine_agent_id, ()):
+            results.put(self._skipped(backup_config_id, machine_agent_id))
+
+    def _feed(self, jobs, results):
+        """
+        (Internal) Queue the jobs by agent; an error reading the jobs is reported as a failed result
+        """
+        try:
+            for job in jobs:
+                self._queue_job(job, results)
+        except Exception as ex:
+            self.log.error('Unable to read the backup jobs: {0:}'.format(ex))
+            results.put(BackupRunResult(None, None, None, ex, 0))
+        finally:
+            with self._condition:
+                self._feeding = False
+                self._condition.notify_all()
+
+    def _next_job(self):
+        """
+        (Internal) Wait for a job whose agent is idle and claim the agent; returns None once there is no more work
+        """
+        with self._condition:
+            while True:
+                for machine_agent_id, backup_config_ids in self._pending.items():
+                    if machine_agent_id not in self._busy:
+                        backup_config_id = backup_config_ids.popleft()
+                        if not len(backup_config_ids):
+                            del self._pending[machine_agent_id]
+                        self._busy.add(machine_agent_id)
+                        return (backup_config_id, machine_agent_id)
+                if not self._feeding and not len(self._pending):
+                    return None
+                self._condition.wait()
+
+    def _worker(self, results):
+        """
+        (Internal) Run jobs until there are none left
+        """
+        try:
+            while True:
+                job = self._next_job()
+                if job is None:
+                    break
+                result = None
+                try:
+                    result = self._run_one(*job)
+                    results.put(result)
+                finally:
+                    with self._condition:
+                        if result is not None and isinstance(result.exception, BackupTimeoutError):
+                            self._stall(job[1], results)
+                        self._busy.discard(job[1])
+                        self._condition.notify_all()
+        finally:
+            results.put(None)
+
+    def Run(self, jobs):
+        """
+        Run the backups
+          jobs - iterable of (backup_config_id, machine_agent_id) tuples, BackupConfiguration instances or
+                 backup configuration dictionaries
+
+        Yields a BackupRunResult for each backup as it completes. A job that cannot be read, or an
+        error raised while iterating the jobs, is yielded as a failed BackupRunResult whose
+        backup_config_id and machine_agent_id are None; the remaining jobs are still run. A backup
+        that does not finish within the backup_timeout fails with BackupTimeoutError and the
+        remaining backups of its agent fail with BackupSkippedError without being started.
+
+        Note: The generator must be consumed for all the backups to be run; only one Run() may be active at a time
+        """
+        with self._condition:
+            self._feeding = True
+            self._stalled = set()
+        results = queue.Queue()
+        threads = [threading.Thread(target=self._feed, args=(jobs, results))]
+        threads.extend(threading.Thread(target=self._worker, args=(results,)) for _ in range(max(1, self.max_concurrent)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        remaining = len(threads) - 1
+        while remaining:
+            result = results.get()
+            if result is None:
+                remaining -= 1
+            else:
+                yield result
+
+        for thread in threads:
+            thread.join()
+
+    def RunAll(self, jobs):
+        """
+        Run the backups, see Run()
+
+        Returns a tuple of two lists of BackupRunResult in completion order:
+            the backups that succeeded
+            the backups that failed, including the jobs that could not be read, see Run()
+        """
+        succeeded = []
+        failed = []
+        for result in self.Run(jobs):
+            if result.exception is None:
+                succeeded.append(result)
+            else:
+                failed.append(result)
+        return (succeeded, failed)
@@ -3,7 +3,6 @@ Rackspace Cloud Backup RSE API
 """
 import logging
 import pprint
-import requests
 import time
 import uuid
 
@@ -91,6 +90,16 @@ class Rse(Command):
         self.agentkey = agentkey
         self.rselogfile = logfile
         self.apihost = apihost
+        # RseInitDirect() replaces apihost so remember which mode was requested
+        self.direct = apihost is None
+
+    def Clone(self, agent):
+        """
+        Create a new Rse instance with the same configuration that uses the given agent instance
+        Useful for polling RSE from another thread
+        """
+        apihost = None if self.direct else self.apihost
+        return Rse(self.rsedata.App, self.rsedata.AppVersion, self.authenticator, agent, self.agentkey, logfile=self.rselogfile, apihost=apihost)
 
     def RseInitDirect(self, machine_agent_id):
         """
@@ -123,7 +132,7 @@ class Rse(Command):
         If apihost is set, then indirectly access RSE - all events are received on the channel for all systems talking on the channel
         If apihost is not set, then directly access RSE - only events to the desired agent are received on the channel
         """
-        if self.apihost is None:
+        if self.direct:
             self.RseInitDirect(machine_agent_id)
         else:
             self.RseInitIndirect(machine_agent_id)
@@ -132,7 +141,7 @@ class Rse(Command):
         """
         Retrieves one record set from the RSE Channel
         """
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.session.get(self.Uri, headers=self.Headers)
         self.log.debug('RSE Query: Code (%s)', res.status_code)
         if self.rselogfile is not None:
             with open(self.rselogfile, 'a') as out:
@@ -193,3 +202,63 @@ class Rse(Command):
         except LookupError:
             self.log.error('error while parsing RSE data')
             return False
+
+    def _log_event(self, source, event):
+        """
+        (Internal) Record an RSE event to the RSE log file if one is configured
+        """
+        if self.rselogfile is not None:
+            with open(self.rselogfile, 'a') as out:
+                out.write('({0:}) Message: '.format(source))
+                out.write(str(event))
+                out.write('\n+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n')
+
+    def GetEvents(self, machine_agent_id):
+        """
+        Retrieve one record set of events from the RSE Channel for the agent
+
+        Returns a list of events regardless of whether RSE is accessed directly or via the API
+        """
+        self.RseInit(machine_agent_id)
+        return self._query_events()
+
+    def _query_events(self):
+        """
+        (Internal) Retrieve one record set of events from the RSE Channel already initialized by RseInit()
+        """
+        rsemsg = self.Query()
+        if 'events' in rsemsg:
+            source = 'RSE'
+            events = rsemsg['events']
+        else:
+            source = 'API'
+            events = rsemsg
+        for event in events:
+            self._log_event(source, event)
+        return list(events)
+
+    def MonitorForHeartBeats(self, machine_agent_ids):
+        """
+        Check the RSE Channel Data for Heart Beat messages from any of the given agents
+
+        Agents that share an RSE channel are served by a single query. Agent ids are compared
+        by their string form as events may carry them as either numbers or strings.
+        Returns the set of agent ids, as given, whose heart beats were found
+        """
+        wanted = dict((str(machine_agent_id), machine_agent_id) for machine_agent_id in machine_agent_ids)
+        found = set()
+        queried = set()
+        for key, machine_agent_id in wanted.items():
+            if key in found:
+                continue
+            try:
+                self.RseInit(machine_agent_id)
+                if self.Uri in queried:
+                    continue
+                queried.add(self.Uri)
+                for event in self._query_events():
+                    if event['data']['Event'] == 'Heartbeat' and event['age'] < 26:
+                        found.add(str(event['data']['MachineAgentId']))
+            except LookupError:
+                self.log.error('error while parsing RSE data')
+        return set(wanted[key] for key in found if key in wanted)
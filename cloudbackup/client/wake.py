@@ -0,0 +1,387 @@
+"""
+Rackspace Cloud Backup Agent Wake Management
+"""
+import heapq
+import itertools
+import logging
+import threading
+
+from cloudbackup.common.cache import monotonic
+
+
+class WakeWaiter(object):
+    """
+    A pending request for an agent to wake, see WakeCoordinator.Register()
+    """
+
+    def __init__(self, machine_agent_id, agentkey, deadline, wake_interval=None):
+        self.machine_agent_id = machine_agent_id
+        self.agentkey = agentkey
+        self.deadline = deadline
+        self.wake_interval = wake_interval
+        self.event = threading.Event()
+        self.result = None
+
+    def Resolve(self, result):
+        """
+        Record whether or not the agent woke and release anything waiting on it
+        """
+        self.result = result
+        self.event.set()
+
+    def Wait(self, timeout=None):
+        """
+        Wait for the agent to wake
+
+        Returns True if the agent's heart beat was seen; False if it timed out; None if still pending
+        """
+        self.event.wait(timeout)
+        return self.result
+
+
+class WakeCoordinator(object):
+    """
+    Share the account-wide Wake Agents call between everything waiting on agents to wake
+
+    At most one Wake Agents call is made per 'wake_interval' no matter how many agents are
+    waiting; waiters registered with a shorter interval of their own shorten it while they
+    wait. RSE is polled with an adaptive backoff - quickly while heart beats are arriving
+    or new agents are waiting, slowing down to 'max_poll' otherwise - and each waiter is
+    resolved as soon as its agent's heart beat is seen.
+    """
+
+    def __init__(self, agents, wake_interval=30.0, min_poll=0.5, max_poll=5.0):
+        """
+        Initialize the Wake Coordinator
+          agents - instance of cloudbackup.client.agents.Agents dedicated to the coordinator
+          wake_interval - minimum number of seconds between Wake Agents calls, see Register()
+          min_poll - shortest number of seconds between RSE polls
+          max_poll - longest number of seconds between RSE polls
+        """
+        self.log = logging.getLogger(__name__)
+        self.agents = agents
+        self.wake_interval = wake_interval
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.pollers = {}
+        self.last_wake = None
+        self.last_wake_status = None
+        self._poll_period = min_poll
+        self._current_interval = wake_interval
+        self._waiters = {}
+        self._condition = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    def Register(self, machine_agent_id, rse, timeout, wake_interval=None):
+        """
+        Ask for the agent to be woken
+          machine_agent_id - machine agent id of the agent to wake
+          rse - cloudbackup.client.rse.Rse instance configured for the agent; one poller is kept per agent key
+          timeout - number of seconds to wait for the agent's heart beat
+          wake_interval - number of seconds after which the agent needs Wake Agents posted again, f.e its
+                          keep awake period; while waiting Wake Agents is posted at least this often
+
+        Returns a WakeWaiter
+        """
+        waiter = WakeWaiter(machine_agent_id, rse.agentkey, monotonic() + timeout, wake_interval)
+        with self._condition:
+            if rse.agentkey not in self.pollers:
+                self.pollers[rse.agentkey] = rse.Clone(self.agents)
+            self._waiters.setdefault(machine_agent_id, []).append(waiter)
+            # Something new to look for, so look quickly
+            self._poll_period = self.min_poll
+            if self._thread is None:
+                self._stop = False
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+        return waiter
+
+    def Wait(self, machine_agent_id, rse, timeout):
+        """
+        Wake the agent and wait for its heart beat, see Register()
+
+        Returns True if the agent's heart beat was seen within the timeout; otherwise False
+        """
+        return bool(self.Register(machine_agent_id, rse, timeout).Wait())
+
+    def Stop(self):
+        """
+        Stop the coordinator thread, failing all outstanding waiters
+        """
+        with self._condition:
+            thread = self._thread
+            self._stop = True
+            self._condition.notify()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        with self._condition:
+            self._thread = None
+            for waiters in self._waiters.values():
+                for waiter in waiters:
+                    waiter.Resolve(False)
+            self._waiters = {}
+
+    def _expire(self, now):
+        """
+        (Internal) Fail the waiters whose timeout has passed; the caller must hold the condition
+        """
+        for machine_agent_id in list(self._waiters.keys()):
+            pending = []
+            for waiter in self._waiters[machine_agent_id]:
+                if waiter.deadline <= now:
+                    self.log.error('Unable to locate agent id ({0:}) in RSE Heartbeats'.format(machine_agent_id))
+                    waiter.Resolve(False)
+                else:
+                    pending.append(waiter)
+            if len(pending):
+                self._waiters[machine_agent_id] = pending
+            else:
+                del self._waiters[machine_agent_id]
+
+    def _update_interval(self):
+        """
+        (Internal) Use the shortest wake interval of the coordinator and the waiters; the caller must hold the condition
+        """
+        intervals = [waiter.wake_interval for waiters in self._waiters.values() for waiter in waiters if waiter.wake_interval is not None]
+        self._current_interval = min([self.wake_interval] + intervals)
+
+    def _next_deadline(self):
+        """
+        (Internal) Return the earliest waiter deadline; None if nothing is waiting. The caller must hold the condition
+        """
+        deadlines = [waiter.deadline for waiters in self._waiters.values() for waiter in waiters]
+        return min(deadlines) if len(deadlines) else None
+
+    def _wake(self, now):
+        """
+        (Internal) Post Wake Agents if it has not been done within the wake interval
+        """
+        if self.last_wake is not None and (now - self.last_wake) < self._current_interval:
+            return
+        self.last_wake_status = self.agents.WakeAgents()
+        if self.last_wake_status == 200:
+            self.last_wake = now
+        else:
+            self.log.error('Unable to wake all agents. Status Code = {0:}'.format(self.last_wake_status))
+
+    def _poll(self, waiting):
+        """
+        (Internal) Look for the heart beats of the waiting agents, returns the set of agents found
+        """
+        found = set()
+        for agentkey, machine_agent_ids in waiting.items():
+            try:
+                found.update(self.pollers[agentkey].MonitorForHeartBeats(machine_agent_ids))
+            except Exception as ex:
+                self.log.error('Error while polling RSE: {0:}'.format(ex))
+        return found
+
+    def _next_waiting(self):
+        """
+        (Internal) Wait for agents to be waiting and return them grouped by agent key; returns None when the coordinator is stopping
+        """
+        with self._condition:
+            self._expire(monotonic())
+            while not self._stop and not len(self._waiters):
+                self._condition.wait()
+            if self._stop:
+                return None
+            self._update_interval()
+            waiting = {}
+            for machine_agent_id, waiters in self._waiters.items():
+                for waiter in waiters:
+                    waiting.setdefault(waiter.agentkey, set()).add(machine_agent_id)
+            return waiting
+
+    def _resolve(self, found):
+        """
+        (Internal) Release the waiters for the agents found and wait for the next poll, waiter timeout or Wake Agents call
+        """
+        with self._condition:
+            for machine_agent_id in found:
+                for waiter in self._waiters.pop(machine_agent_id, []):
+                    waiter.Resolve(True)
+            if len(found):
+                self._poll_period = self.min_poll
+            else:
+                self._poll_period = min(self._poll_period * 2, self.max_poll)
+            now = monotonic()
+            self._expire(now)
+            deadline = self._next_deadline()
+            if deadline is not None:
+                if self.last_wake is not None:
+                    deadline = min(deadline, self.last_wake + self._current_interval)
+                self._condition.wait(max(0, min(self._poll_period, deadline - now)))
+
+    def _run(self):
+        """
+        (Internal) Coordinator thread
+        """
+        while True:
+            waiting = self._next_waiting()
+            if waiting is None:
+                break
+
+            self._wake(monotonic())
+            found = set()
+            if self.last_wake is not None:
+                found = self._poll(waiting)
+            self._resolve(found)
+
+        self.log.debug('Wake Coordinator terminating')
+
+
+class KeepAwakeScheduler(object):
+    """
+    Keep any number of agents awake from a single thread
+
+    Agents are kept in a heap ordered by when they next need to be woken. When agents come due
+    they are handed to a WakeCoordinator which shares a single Wake Agents call and one RSE
+    poller per agent key between all of them. Adding and removing agents is O(log n).
+    """
+
+    def __init__(self, coordinator, rse_timeout=10.0, retry_period=5.0):
+        """
+        Initialize the Keep Awake Scheduler
+          coordinator - WakeCoordinator used to wake the agents
+          rse_timeout - number of seconds to look for the heart beats of the agents that came due
+          retry_period - number of seconds to wait before trying again for agents that did not respond
+        """
+        self.log = logging.getLogger(__name__)
+        self.coordinator = coordinator
+        self.rse_timeout = rse_timeout
+        self.retry_period = retry_period
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    def __len__(self):
+        with self._condition:
+            return len(self._entries)
+
+    def __contains__(self, machine_agent_id):
+        with self._condition:
+            return machine_agent_id in self._entries
+
+    def _push(self, machine_agent_id, due, period, rse):
+        """
+        (Internal) Schedule the agent; the caller must hold the condition
+        """
+        entry = [due, next(self._counter), machine_agent_id, period, rse, True]
+        self._entries[machine_agent_id] = entry
+        heapq.heappush(self._heap, entry)
+
+    def Add(self, machine_agent_id, period, rse):
+        """
+        Keep the agent awake
+          machine_agent_id - machine agent id of the agent to keep awake
+          period - seconds between wake agent calls once the agent has been seen
+          rse - cloudbackup.client.rse.Rse instance configured for the agent
+        """
+        with self._condition:
+            self.Remove(machine_agent_id)
+            self._push(machine_agent_id, monotonic(), period, rse)
+            self._condition.notify()
+        self.Start()
+
+    def Remove(self, machine_agent_id):
+        """
+        Stop keeping the agent awake
+
+        Note: The heap entry is only marked as removed and is discarded when it reaches the top of the heap
+        """
+        with self._condition:
+            entry = self._entries.pop(machine_agent_id, None)
+            if entry is not None:
+                entry[5] = False
+
+    def Start(self):
+        """
+        Start the scheduler thread if it is not already running
+        """
+        with self._condition:
+            if self._thread is None:
+                self._stop = False
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def Stop(self):
+        """
+        Stop the scheduler thread and wait for it to terminate
+        """
+        with self._condition:
+            thread = self._thread
+            self._stop = True
+            self._condition.notify()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        with self._condition:
+            self._thread = None
+
+    def _next_due(self):
+        """
+        (Internal) Wait for agents to come due and return them; returns None when the scheduler is stopping
+        """
+        with self._condition:
+            while not self._stop:
+                while len(self._heap) and not self._heap[0][5]:
+                    heapq.heappop(self._heap)
+
+                now = monotonic()
+                if len(self._heap) and self._heap[0][0] <= now:
+                    due = []
+                    while len(self._heap) and self._heap[0][0] <= now:
+                        entry = heapq.heappop(self._heap)
+                        if entry[5]:
+                            due.append(entry)
+                    return due
+
+                if len(self._heap):
+                    self._condition.wait(self._heap[0][0] - now)
+                else:
+                    self._condition.wait()
+            return None
+
+    def _wake(self, due):
+        """
+        (Internal) Wake the agents that came due and return the set of those whose heart beats were seen
+        """
+        self.log.debug('Waking {0:} agents'.format(len(due)))
+        waiters = [self.coordinator.Register(entry[2], entry[4], self.rse_timeout, wake_interval=entry[3]) for entry in due]
+        return set(waiter.machine_agent_id for waiter in waiters if waiter.Wait())
+
+    def _run(self):
+        """
+        (Internal) Scheduler thread
+        """
+        while True:
+            due = self._next_due()
+            if due is None:
+                break
+
+            try:
+                awake = self._wake(due)
+            except Exception as ex:
+                self.log.error('Error while waking agents: {0:}'.format(ex))
+                awake = set()
+
+            with self._condition:
+                now = monotonic()
+                for entry in due:
+                    # Skip agents removed while they were being woken
+                    if self._entries.get(entry[2]) is not entry:
+                        continue
+                    if entry[2] in awake:
+                        self._push(entry[2], now + entry[3], entry[3], entry[4])
+                    else:
+                        self.log.debug('Failed to wake agent - {0:}'.format(entry[2]))
+                        self._push(entry[2], now + min(entry[3], self.retry_period), entry[3], entry[4])
+
+        self.log.debug('Keep Awake Scheduler terminating')
@@ -16,16 +16,20 @@ class CloudFiles(Command):
     Primary Cloud Files API Class
     """
 
-    def __init__(self, sslenabled, authenticator, publicnet=False):
+    def __init__(self, sslenabled, authenticator, publicnet=False, selector=None):
         """
         Setup the CloudFiles API Class in the same manner as cloudbackup.common.Command
+          publicnet - force the use of the publicnet instead of servicenet
+          selector - instance of cloudbackup.client.endpoints.EndpointSelector used to pick the
+                     fastest of publicnet and servicenet; overrides publicnet when provided
         """
-        super(self.__class__, self).__init__(self, sslenabled, 'localhost', '/')
+        super(self.__class__, self).__init__(sslenabled, 'localhost', '/')
         # save the ssl status for the various reinits done for each API call supported
         self.sslenabled = sslenabled
         self.authenticator = authenticator
         self.auth = authenticator
         self.usepublicnet = publicnet
+        self.selector = selector
         self.log = logging.getLogger(__name__)
 
     def _get_container(self, container):
@@ -34,11 +38,38 @@ class CloudFiles(Command):
 
         Note: servicenet container names start with 'snet-'.
         """
+        if self.selector is not None:
+            return self._select_container(container)
         if self.usepublicnet:
             if container.startswith('snet-'):
                 return container[5:]
         return container
 
+    def _select_container(self, storage_host):
+        """
+        Return whichever of the publicnet or servicenet storage hosts is fastest to reach
+          storage_host - Cloud Files storage host and account path, with or without the 'snet-' prefix
+        """
+        if storage_host.startswith('snet-'):
+            publicnet = storage_host[5:]
+        else:
+            publicnet = storage_host
+        scheme = 'https://' if self.sslenabled else 'http://'
+        candidates = [scheme + publicnet, scheme + 'snet-' + publicnet]
+        selected = self.selector.SelectUri(candidates)
+        return selected[len(scheme):]
+
+    def ReportFailure(self, uri):
+        """
+        Report that a call to the URI could not connect so the following calls fail over to the
+        other network, see cloudbackup.common.command.Command.ReportFailure()
+        """
+        if self.selector is None:
+            return
+        storage_uri = ('https://' if self.sslenabled else 'http://') + self.apihost
+        if uri.startswith(storage_uri):
+            self.selector.MarkFailed(storage_uri)
+
     def GetContainers(self, uri, limit=-1, marker=''):
         """
         List all containers for the current account
@@ -55,10 +86,10 @@ class CloudFiles(Command):
         self.log.debug('uri: %s', self.Uri)
         self.log.debug('headers: %s', self.Headers)
         try:
-            res = requests.get(self.Uri, headers=self.Headers)
+            res = self.session.get(self.Uri, headers=self.Headers)
         except requests.exceptions.SSLError as ex:
             self.log.error('Requests SSLError: {0}'.format(str(ex)))
-            res = requests.get(self.Uri, headers=self.Headers, verify=False)
+            res = self.session.get(self.Uri, headers=self.Headers, verify=False)
         if res.status_code == 200:
             # We have a list in JSON format
             return res.json()
@@ -86,10 +117,10 @@ class CloudFiles(Command):
         self.log.debug('uri: %s', self.Uri)
         self.log.debug('headers: %s', self.Headers)
         try:
-            res = requests.get(self.Uri, headers=self.Headers)
+            res = self.session.get(self.Uri, headers=self.Headers)
         except requests.exceptions.SSLError as ex:
             self.log.error('Requests SSLError: {0}'.format(str(ex)))
-            res = requests.get(self.Uri, headers=self.Headers, verify=False)
+            res = self.session.get(self.Uri, headers=self.Headers, verify=False)
         if res.status_code == 200:
             # We have a list in JSON format
             return res.json()
@@ -126,10 +157,10 @@ class CloudFiles(Command):
         self.log.debug('uri: %s', self.Uri)
         self.log.debug('headers: %s', self.Headers)
         try:
-            res = requests.get(self.Uri, headers=self.Headers)
+            res = self.session.get(self.Uri, headers=self.Headers)
         except requests.exceptions.SSLError as ex:
             self.log.error('Requests SSLError: {0}'.format(str(ex)))
-            res = requests.get(self.Uri, headers=self.Headers, verify=False)
+            res = self.session.get(self.Uri, headers=self.Headers, verify=False)
         if res.status_code == 200:
             self.log.debug('Received data from CloudFiles...looking for VaultDB with Snapshot ID ' + str(snapshot))
             cf_data = res.json()
@@ -198,10 +229,10 @@ class CloudFiles(Command):
         self.log.debug('uri: %s', self.Uri)
         self.log.debug('headers: %s', self.Headers)
         try:
-            res = requests.get(self.Uri, headers=self.Headers)
+            res = self.session.get(self.Uri, headers=self.Headers)
         except requests.exceptions.SSLError as ex:
             self.log.error('Requests SSLError: {0}'.format(str(ex)))
-            res = requests.get(self.Uri, headers=self.Headers, verify=False)
+            res = self.session.get(self.Uri, headers=self.Headers, verify=False)
         if res.status_code == 200:
             cf_data = res.json()
             try:
@@ -414,10 +445,10 @@ class CloudFiles(Command):
             self.log.debug('uri: %s', self.Uri)
             self.log.debug('headers: %s', self.Headers)
             try:
-                res = requests.get(self.Uri, headers=self.Headers, stream=True)
+                res = self.session.get(self.Uri, headers=self.Headers, stream=True)
             except requests.exceptions.SSLError as ex:
                 self.log.error('Requests SSLError: {0}'.format(str(ex)))
-                res = requests.get(self.Uri, headers=self.Headers, verify=False, stream=True)
+                res = self.session.get(self.Uri, headers=self.Headers, verify=False, stream=True)
             if res.status_code == 404:
                 raise UserWarning('Server failed to find the specified database')
             elif res.status_code >= 300:
@@ -604,7 +635,7 @@ class CloudFiles(Command):
 
             # Attempt the upload
             with open(gzip_file, 'rb') as upload_data:
-                res = requests.put(self.Uri, headers=self.Headers, data=upload_data)
+                res = self.session.put(self.Uri, headers=self.Headers, data=upload_data)
 
             # Chek the result
             if res.status_code in (200, 201):
@@ -639,10 +670,10 @@ class CloudFiles(Command):
             self.log.debug('uri: %s', self.Uri)
             self.log.debug('headers: %s', self.Headers)
             try:
-                res = requests.head(self.Uri, headers=self.Headers)
+                res = self.session.head(self.Uri, headers=self.Headers)
             except requests.exceptions.SSLError as ex:
                 self.log.error('Requests SSLError: {0}'.format(str(ex)))
-                res = requests.head(self.Uri, headers=self.Headers, verify=False)
+                res = self.session.head(self.Uri, headers=self.Headers, verify=False)
             if res.status_code == 404:
                 raise UserWarning('Server failed to find the specified bundle')
             elif res.status_code >= 300:
@@ -673,10 +704,10 @@ class CloudFiles(Command):
             self.log.debug('uri: %s', self.Uri)
             self.log.debug('headers: %s', self.Headers)
             try:
-                res = requests.get(self.Uri, headers=self.Headers)
+                res = self.session.get(self.Uri, headers=self.Headers)
             except requests.exceptions.SSLError as ex:
                 self.log.error('Requests SSLError: {0}'.format(str(ex)))
-                res = requests.get(self.Uri, headers=self.Headers, verify=False)
+                res = self.session.get(self.Uri, headers=self.Headers, verify=False)
             if res.status_code == 404:
                 raise UserWarning('Server failed to find the specified bundle')
             elif res.status_code >= 300:
@@ -727,10 +758,10 @@ class CloudFiles(Command):
         self.headers['X-Auth-Token'] = self.authenticator.AuthToken
         self.log.debug('headers: %s', self.Headers)
         try:
-            res = requests.get(self.Uri, headers=self.Headers)
+            res = self.session.get(self.Uri, headers=self.Headers)
         except requests.exceptions.SSLError as ex:
             self.log.error('Requests SSLError: {0}'.format(str(ex)))
-            res = requests.get(self.Uri, headers=self.Headers, verify=False)
+            res = self.session.get(self.Uri, headers=self.Headers, verify=False)
         return res.status_code
 
     # TODO: Test
@@ -747,10 +778,10 @@ class CloudFiles(Command):
         self.log.debug('uri: %s', self.Uri)
         self.log.debug('headers: %s', self.Headers)
         try:
-            res = requests.get(self.Uri, headers=self.Headers)
+            res = self.session.get(self.Uri, headers=self.Headers)
         except requests.exceptions.SSLError as ex:
             self.log.error('Requests SSLError: {0}'.format(str(ex)))
-            res = requests.get(self.Uri, headers=self.Headers, verify=False)
+            res = self.session.get(self.Uri, headers=self.Headers, verify=False)
         if res.status_code == 200:
             self.log.debug('Content is available')
             return True
@@ -0,0 +1,172 @@
+"""
+Rackspace Cloud Backup VaultDB Retrieval Pipeline
+"""
+import collections
+import logging
+import os.path
+
+from cloudbackup.cloud.files import CloudFiles
+from cloudbackup.common.workers import run_pipeline
+
+# Outcome of retrieving one agent's VaultDB
+#   machine_agent_id - agent the VaultDB belongs to
+#   backup_name - backup configuration name used to locate the vault (None for the agent's first volume)
+#   container - CloudFiles container holding the VaultDB (None if not reached)
+#   vaultdb_data - VaultDB data, see CloudFiles.GetActiveDB() and CloudFiles.DownloadVaultDb() (None if not reached)
+#   localpath - local path the VaultDB was downloaded to (None if not reached)
+#   failed_stage - STAGE_CONFIGURATION, STAGE_LISTING or STAGE_DOWNLOAD; None on success
+#   exception - the exception raised by the failed stage; None on success
+VaultDbResult = collections.namedtuple('VaultDbResult', ['machine_agent_id', 'backup_name', 'container', 'vaultdb_data', 'localpath', 'failed_stage', 'exception'])
+
+STAGE_CONFIGURATION = 'configuration'
+STAGE_LISTING = 'listing'
+STAGE_DOWNLOAD = 'download'
+
+
+class VaultDbPipeline(object):
+    """
+    Retrieve the VaultDBs of many agents with the stages overlapped
+
+    Each agent goes through three stages, each with its own pool of threads:
+        configuration - retrieve the agent configuration from the API and locate the vault
+        listing - find the active VaultDB in CloudFiles (CloudFiles.GetActiveDB())
+        download - download the VaultDB (CloudFiles.DownloadVaultDb())
+    The stages are joined by bounded queues so the slowest stage sets the pace instead of
+    the faster stages piling up work in memory.
+
+    Note: CloudFiles modifies itself on each call so every listing and download thread has its own instance
+    """
+
+    def __init__(self, sslenabled, authenticator, agents, localpath, publicnet=False, selector=None,
+                 api_workers=8, listing_workers=8, download_workers=4, queue_size=16, decompress=True):
+        """
+        Initialize the VaultDB Pipeline
+          sslenabled, authenticator, publicnet, selector - see cloudbackup.cloud.files.CloudFiles
+          agents - instance of cloudbackup.client.agents.Agents used to retrieve the agent configurations
+          localpath - directory to download the VaultDBs into, or a callable(machine_agent_id, backup_name)
+                      returning the local path for the agent's VaultDB
+          api_workers - maximum number of agent configuration requests to have outstanding at once
+          listing_workers - maximum number of CloudFiles listings to have outstanding at once
+          download_workers - maximum number of VaultDB downloads to have outstanding at once
+          queue_size - maximum number of agents waiting between two stages
+          decompress - see CloudFiles.DownloadVaultDb()
+        """
+        self.log = logging.getLogger(__name__)
+        self.sslenabled = sslenabled
+        self.authenticator = authenticator
+        self.agents = agents
+        self.localpath = localpath
+        self.publicnet = publicnet
+        self.selector = selector
+        self.api_workers = api_workers
+        self.listing_workers = listing_workers
+        self.download_workers = download_workers
+        self.queue_size = queue_size
+        self.decompress = decompress
+
+    def _new_cloudfiles(self):
+        """
+        (Internal) Create a CloudFiles instance for a single worker thread
+        """
+        return CloudFiles(self.sslenabled, self.authenticator, publicnet=self.publicnet, selector=self.selector)
+
+    def _get_localpath(self, machine_agent_id, backup_name):
+        """
+        (Internal) Local path to download the agent's VaultDB to
+        """
+        if callable(self.localpath):
+            return self.localpath(machine_agent_id, backup_name)
+        if backup_name is None:
+            filename = '{0:}.db'.format(machine_agent_id)
+        else:
+            filename = '{0:}-{1:}.db'.format(machine_agent_id, backup_name)
+        return os.path.join(self.localpath, filename)
+
+    @staticmethod
+    def _split_job(job):
+        """
+        (Internal) Return the (machine_agent_id, backup_name) for a job
+        """
+        if isinstance(job, (tuple, list)):
+            return (job[0], job[1])
+        return (job, None)
+
+    def _configuration_stage(self):
+        """
+        (Internal) Return the function locating the vault of a job: job -> (job, container, uripath)
+        """
+        def __locate(job):
+            machine_agent_id, backup_name = self._split_job(job)
+            configuration = self.agents.AgentConfiguration(machine_agent_id)
+            uripath = configuration.GetVaultDbPath(backup_name)
+            if not len(uripath):
+                raise UserWarning('Unable to locate the vault for agent id {0:}'.format(machine_agent_id))
+            return (job, configuration.GetVaultDbContainer(backup_name), uripath)
+        return __locate
+
+    def _listing_stage(self):
+        """
+        (Internal) Return the function finding the active VaultDB: (job, container, uripath) -> (job, container, vaultdb_data)
+        """
+        cloudfiles = self._new_cloudfiles()
+
+        def __list(located):
+            job, container, uripath = located
+            return (job, container, cloudfiles.GetActiveDB(container, uripath))
+        return __list
+
+    def _download_stage(self):
+        """
+        (Internal) Return the function downloading the VaultDB: (job, container, vaultdb_data) -> (container, vaultdb_data, localpath)
+        """
+        cloudfiles = self._new_cloudfiles()
+
+        def __download(listed):
+            job, container, vaultdb_data = listed
+            localpath = self._get_localpath(*self._split_job(job))
+            if not cloudfiles.DownloadVaultDb(container, vaultdb_data, localpath, decompress=self.decompress):
+                raise UserWarning('Unable to download the VaultDB {0:}'.format(vaultdb_data.get('name')))
+            return (container, vaultdb_data, localpath)
+        return __download
+
+    def Run(self, jobs):
+        """
+        Retrieve the VaultDBs
+          jobs - iterable of machine agent ids, or of (machine_agent_id, backup_name) tuples to pick
+                 the vault of a specific backup configuration
+
+        Yields a VaultDbResult for each job as it completes; results are not in the order given.
+
+        Note: The generator must be consumed for all the VaultDBs to be retrieved
+        """
+        stages = [
+            (STAGE_CONFIGURATION, self._configuration_stage, self.api_workers),
+            (STAGE_LISTING, self._listing_stage, self.listing_workers),
+            (STAGE_DOWNLOAD, self._download_stage, self.download_workers)
+        ]
+        for job, result, failed_stage, ex in run_pipeline(jobs, stages, queue_size=self.queue_size):
+            machine_agent_id, backup_name = self._split_job(job)
+            if failed_stage is not None:
+                self.log.error('Unable to retrieve the VaultDB for agent id {0:} during {1:}: {2:}'.format(machine_agent_id, failed_stage, ex))
+                yield VaultDbResult(machine_agent_id, backup_name, None, None, None, failed_stage, ex)
+            else:
+                container, vaultdb_data, localpath = result
+                yield VaultDbResult(machine_agent_id, backup_name, container, vaultdb_data, localpath, None, None)
+
+    def RunAll(self, jobs):
+        """
+        Retrieve the VaultDBs, see Run()
+
+        Returns a tuple of two dictionaries:
+            (machine_agent_id, backup_name) -> VaultDbResult for each VaultDB retrieved
+            (machine_agent_id, backup_name) -> VaultDbResult for each VaultDB that could not be retrieved
+        where backup_name is None for jobs given as a machine agent id only
+        """
+        retrieved = {}
+        failed = {}
+        for result in self.Run(jobs):
+            if result.exception is None:
+                retrieved[(result.machine_agent_id, result.backup_name)] = result
+            else:
+                failed[(result.machine_agent_id, result.backup_name)] = result
+        return (retrieved, failed)
@@ -0,0 +1,130 @@
+"""
+Rackspace Cloud Backup Common Caching Functionality
+"""
+import collections
+import threading
+import time
+
+# Python 3.3+ provides a clock that is not affected by system time changes; Python 2 falls back to the wall clock
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class TtlCache(object):
+    """
+    Thread-safe key/value cache where each entry expires after a time-to-live
+
+    Entries are kept in least-recently-used order so that when maxsize is reached the
+    oldest entry is evicted first.
+    """
+
+    def __init__(self, ttl=300, maxsize=None):
+        """
+        Initialize the cache
+          ttl - default number of seconds an entry remains valid; None to never expire
+          maxsize - maximum number of entries to hold; None for unbounded
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            self.Purge()
+            return len(self._entries)
+
+    def __contains__(self, key):
+        return self.Get(key, default=self) is not self
+
+    def _is_expired(self, entry, now):
+        """
+        (Internal) Return whether or not the given entry has expired
+        """
+        return entry[0] is not None and entry[0] <= now
+
+    def Get(self, key, default=None):
+        """
+        Retrieve the value for key, or default if it is not cached or has expired
+        """
+        with self._lock:
+            try:
+                entry = self._entries.pop(key)
+            except KeyError:
+                return default
+
+            if self._is_expired(entry, monotonic()):
+                return default
+
+            # Re-insert to mark it as most recently used
+            self._entries[key] = entry
+            return entry[1]
+
+    def Set(self, key, value, ttl=None):
+        """
+        Store value for key
+          ttl - number of seconds the entry remains valid; defaults to the cache ttl
+        """
+        if ttl is None:
+            ttl = self.ttl
+
+        expires = None
+        if ttl is not None:
+            expires = monotonic() + ttl
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            if self.maxsize is not None:
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+    def GetOrLoad(self, key, loader, ttl=None):
+        """
+        Retrieve the value for key, calling loader(key) to populate the cache if it is missing or expired
+
+        Note: loader is called outside of the cache lock so slow loads do not block other readers
+        """
+        value = self.Get(key, default=self)
+        if value is self:
+            value = loader(key)
+            self.Set(key, value, ttl=ttl)
+        return value
+
+    def Invalidate(self, key):
+        """
+        Remove key from the cache if present
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def Clear(self):
+        """
+        Remove all entries from the cache
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def Purge(self):
+        """
+        Remove all expired entries from the cache
+        """
+        now = monotonic()
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if self._is_expired(entry, now)]:
+                del self._entries[key]
+
+    def Keys(self):
+        """
+        Return a list of the keys for all unexpired entries
+        """
+        with self._lock:
+            self.Purge()
+            return list(self._entries.keys())
+
+    def Items(self):
+        """
+        Return a list of (key, value) pairs for all unexpired entries
+        """
+        with self._lock:
+            self.Purge()
+            return [(key, entry[1]) for key, entry in self._entries.items()]
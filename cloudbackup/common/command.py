@@ -1,6 +1,57 @@
 """
 Rackspace Cloud Backup Command API
 """
+import requests
+
+try:
+    # Python3
+    from urllib.parse import urlparse
+except ImportError:
+    # Python2
+    from urlparse import urlparse
+
+from cloudbackup.common.connections import get_session
+
+
+class _FailoverSession(object):
+    """
+    (Internal) Session wrapper reporting calls that could not connect to the command, see Command.ReportFailure()
+    """
+
+    def __init__(self, session, command):
+        self._session = session
+        self._command = command
+
+    def _call(self, method, uri, *args, **kwargs):
+        """
+        (Internal) Make the call, reporting a connection failure before raising it
+        """
+        try:
+            return method(uri, *args, **kwargs)
+        except requests.exceptions.SSLError:
+            # the host answered; callers may retry without verification
+            raise
+        except requests.exceptions.ConnectionError:
+            self._command.ReportFailure(uri)
+            raise
+
+    def get(self, uri, *args, **kwargs):
+        return self._call(self._session.get, uri, *args, **kwargs)
+
+    def head(self, uri, *args, **kwargs):
+        return self._call(self._session.head, uri, *args, **kwargs)
+
+    def post(self, uri, *args, **kwargs):
+        return self._call(self._session.post, uri, *args, **kwargs)
+
+    def put(self, uri, *args, **kwargs):
+        return self._call(self._session.put, uri, *args, **kwargs)
+
+    def delete(self, uri, *args, **kwargs):
+        return self._call(self._session.delete, uri, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
 
 
 class Command(object):
@@ -21,8 +72,74 @@ class Command(object):
         self.headers['User-Agent'] = self.headers['X-RCBU-Integration-User-Agent']
         self.uri = ''
         self.apihost = apihost
+        # cloudbackup.client.endpoints.EndpointSelector choosing the host, see SelectApiHost()
+        self.selector = None
+        self._selection = None
+        self._selected_uri = None
+        self._session = None
         self.__ReInit(sslenabled, uripath)
 
+    @property
+    def session(self):
+        """
+        requests.Session to make the calls with
+
+        Unless one was assigned this is the calling thread's session for the object's account (its
+        authenticator, or the object itself when it has none), see cloudbackup.common.connections.get_session();
+        all sessions share the same connection pool. When a selector is in use, calls that cannot
+        connect are reported through ReportFailure().
+        """
+        session = self._session
+        if session is None:
+            session = get_session(getattr(self, 'authenticator', self))
+        if self.selector is None:
+            return session
+        return _FailoverSession(session, self)
+
+    @session.setter
+    def session(self, session):
+        """
+        Use the given session for every call, f.e a preconfigured requests.Session
+        """
+        self._session = session
+
+    def SelectApiHost(self, selector, service_name, region=None):
+        """
+        Use the fastest reachable endpoint of a service as the API host instead of a fixed host
+          selector - instance of cloudbackup.client.endpoints.EndpointSelector to choose with
+          service_name - name of the service in the service catalog, f.e 'cloudBackup'
+          region - region (data center) to choose in; None for any region
+
+        Whenever a call cannot connect to the host it is marked as failed with the selector and
+        the next fastest endpoint is used for the following calls, see ReportFailure()
+
+        Returns the API host selected
+        """
+        self.selector = selector
+        self._selection = (service_name, region)
+        return self._select_apihost()
+
+    def _select_apihost(self):
+        """
+        (Internal) Take the API host from the selector
+        """
+        uri = self.selector.GetBestUri(*self._selection)
+        self._selected_uri = uri
+        self.apihost = urlparse(uri).netloc
+        return self.apihost
+
+    def ReportFailure(self, uri):
+        """
+        Report that a call to the URI could not connect
+
+        If the URI is on the API host chosen by SelectApiHost() the endpoint is marked as failed
+        with the selector and the next fastest endpoint is selected; otherwise nothing is done
+        """
+        if self._selected_uri is None or urlparse(uri).netloc != self.apihost:
+            return
+        self.selector.MarkFailed(self._selected_uri)
+        self._select_apihost()
+
     @property
     def ApiHost(self):
         """API Host"""
@@ -53,10 +170,17 @@ class Command(object):
         # By default we set the HTTP Content Type
         self.headers = {}
         self.headers['Content-Type'] = 'application/json; charset=utf-8'
+        self.uri = self.MakeUri(sslenabled, uripath)
+
+    def MakeUri(self, sslenabled, uripath):
+        """
+        Build the HTTP URI for the given path against the API host without modifying the object
+        Useful for making calls from multiple threads with the same object
+        """
         # HTTP or HTTPS
         if (sslenabled):
-            self.uri = "https://" + self.apihost + uripath
+            return "https://" + self.apihost + uripath
         else:
-            self.uri = "http://" + self.apihost + uripath
+            return "http://" + self.apihost + uripath
 
     __ReInit = ReInit
@@ -0,0 +1,190 @@
+"""
+Rackspace Cloud Backup Connection Pooling and DNS Caching
+"""
+import logging
+import socket
+import threading
+import weakref
+
+import requests
+import requests.adapters
+
+from cloudbackup.common.cache import monotonic, TtlCache
+from cloudbackup.common.workers import run_concurrently
+
+try:
+    # Python3
+    from urllib.parse import urlparse
+except ImportError:
+    # Python2
+    from urlparse import urlparse
+
+# Keep a handle on the resolver so the DNS Cache can call through to it
+_system_getaddrinfo = socket.getaddrinfo
+
+_adapter = None
+_lock = threading.Lock()
+_local = threading.local()
+_dns_cache = None
+
+
+def get_adapter(pool_maxsize=32):
+    """
+    Return the requests.adapters.HTTPAdapter shared by every session so that connections are pooled
+    and re-used across calls, objects, threads and accounts
+
+    Note: pool_maxsize only applies when the adapter is first created
+    """
+    global _adapter
+    with _lock:
+        if _adapter is None:
+            _adapter = requests.adapters.HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        return _adapter
+
+
+def get_session(account=None):
+    """
+    Return the calling thread's requests.Session for the account
+      account - object identifying the account the calls are made for, f.e the Authentication
+                instance; it must support weak references. None for calls not tied to an account
+
+    Each thread has its own sessions, and a separate one per account, so cookies and other session
+    state are never shared between threads or accounts. Every session is mounted on the shared
+    adapter (see get_adapter()) so the connections themselves are still pooled.
+    """
+    if account is None:
+        session = getattr(_local, 'session', None)
+        if session is None:
+            session = _local.session = _new_session()
+        return session
+
+    sessions = getattr(_local, 'sessions', None)
+    if sessions is None:
+        sessions = _local.sessions = weakref.WeakKeyDictionary()
+    session = sessions.get(account)
+    if session is None:
+        session = sessions[account] = _new_session()
+    return session
+
+
+def _new_session():
+    """
+    (Internal) Create a session using the shared adapter
+    """
+    session = requests.Session()
+    adapter = get_adapter()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class DnsCache(object):
+    """
+    Cache the results of socket.getaddrinfo() for a time-to-live
+
+    Once installed all name resolution in the process, including that done by requests, is served
+    from the cache until the entry expires.
+
+    Note: Install() replaces socket.getaddrinfo for the whole process, so every library in the
+          process sees cached addresses; nothing installs it unless asked to
+    """
+
+    def __init__(self, ttl=300, maxsize=1024):
+        """
+        Initialize the DNS Cache
+          ttl - number of seconds to keep a resolved address
+          maxsize - maximum number of host/port combinations to keep
+        """
+        self.log = logging.getLogger(__name__)
+        self.cache = TtlCache(ttl=ttl, maxsize=maxsize)
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        """
+        Drop-in replacement for socket.getaddrinfo()
+        """
+        key = (host, port, family, type, proto, flags)
+        return self.cache.GetOrLoad(key, lambda k: _system_getaddrinfo(*k))
+
+    def Resolve(self, host, port=443):
+        """
+        Resolve a host into the cache, returning the list of addresses
+        """
+        return [entry[4][0] for entry in self.getaddrinfo(host, port, 0, socket.SOCK_STREAM)]
+
+    def Install(self):
+        """
+        Route all name resolution through the cache
+        """
+        socket.getaddrinfo = self.getaddrinfo
+
+    def Uninstall(self):
+        """
+        Restore the system resolver
+        """
+        if socket.getaddrinfo == self.getaddrinfo:
+            socket.getaddrinfo = _system_getaddrinfo
+
+
+def enable_dns_cache(ttl=300):
+    """
+    Install the process-wide DNS Cache if it is not already installed and return it
+
+    Note: This affects all name resolution in the process, see DnsCache
+    """
+    global _dns_cache
+    with _lock:
+        if _dns_cache is None:
+            _dns_cache = DnsCache(ttl=ttl)
+            _dns_cache.Install()
+        return _dns_cache
+
+
+def disable_dns_cache():
+    """
+    Remove the process-wide DNS Cache
+    """
+    global _dns_cache
+    with _lock:
+        if _dns_cache is not None:
+            _dns_cache.Uninstall()
+            _dns_cache = None
+
+
+def warm_up(uris, connections_per_host=1, max_workers=8, timeout=5.0, dns_ttl=None):
+    """
+    Open pooled connections to each of the given URIs in parallel
+
+    'connections_per_host' HEAD requests are sent through the shared adapter (see get_adapter()) so
+    that later requests skip the TLS handshake. If dns_ttl is given the process-wide DNS Cache is installed (see
+    enable_dns_cache()) and each URI is resolved into it so later requests also skip the DNS lookup.
+
+    Returns a dictionary mapping each URI to the number of seconds taken to warm it up, or to the
+    exception that prevented it
+    """
+    log = logging.getLogger(__name__)
+    dns_cache = None if dns_ttl is None else enable_dns_cache(ttl=dns_ttl)
+
+    def __warm(job):
+        """
+        Resolve and connect to a single URI
+        """
+        uri = job[0]
+        start = monotonic()
+        parsed = urlparse(uri)
+        port = parsed.port
+        if port is None:
+            port = 443 if parsed.scheme == 'https' else 80
+        if dns_cache is not None:
+            dns_cache.Resolve(parsed.hostname, port)
+        get_session().head(uri, timeout=timeout)
+        return monotonic() - start
+
+    jobs = [(uri, index) for uri in set(uris) for index in range(connections_per_host)]
+    results = {}
+    for job, latency, ex in run_concurrently(__warm, jobs, max_workers=max_workers):
+        if ex is not None:
+            log.warning('Unable to warm up {0:}: {1:}'.format(job[0], ex))
+            results[job[0]] = ex
+        elif not isinstance(results.get(job[0]), Exception):
+            results[job[0]] = max(latency, results.get(job[0], 0))
+    return results
@@ -0,0 +1,69 @@
+"""
+Rackspace Cloud Backup Common Value Conversions
+"""
+import datetime
+import re
+
+_date_expression = re.compile(r'Date\((-?\d+)([+-]\d{4})?\)')
+_size_expression = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*([KMGTP]?i?B?|bytes?)?\s*$', re.IGNORECASE)
+_size_multipliers = {
+    '': 1,
+    'B': 1,
+    'BYTE': 1,
+    'BYTES': 1,
+    'K': 1024,
+    'M': 1024 ** 2,
+    'G': 1024 ** 3,
+    'T': 1024 ** 4,
+    'P': 1024 ** 5
+}
+
+
+def date_to_epoch_ms(value):
+    """
+    Convert an API date string (f.e '/Date(1388424913000)/' or '/Date(1388424913000-0600)/') into
+    milliseconds since the Unix Epoch (UTC)
+
+    The optional offset only describes the time zone the server displayed the time in; the
+    milliseconds are already UTC.
+
+    Returns None if the value is empty; raises ValueError if it is not an API date
+    """
+    if value is None or not len(value):
+        return None
+    match = _date_expression.search(value)
+    if match is None:
+        raise ValueError('Invalid API date: {0:}'.format(value))
+    return int(match.group(1))
+
+
+def epoch_ms_to_datetime(epoch_ms):
+    """
+    Convert milliseconds since the Unix Epoch into a (naive, UTC) datetime.datetime; None stays None
+    """
+    if epoch_ms is None:
+        return None
+    return datetime.datetime.utcfromtimestamp(epoch_ms / 1000.0)
+
+
+def size_to_bytes(value):
+    """
+    Convert an API size string (f.e '60 KB', '1.5 GB' or '0 Bytes') into a number of bytes
+
+    Sizes are treated as powers of 1024. Integers are returned unchanged.
+
+    Returns None if the value is empty; raises ValueError if it is not a size
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not len(value.strip()):
+        return None
+    match = _size_expression.match(value)
+    if match is None:
+        raise ValueError('Invalid size: {0:}'.format(value))
+    unit = (match.group(2) or '').upper()
+    if unit not in _size_multipliers:
+        unit = unit.rstrip('B').rstrip('I')
+    return int(float(match.group(1)) * _size_multipliers[unit])
@@ -0,0 +1,37 @@
+"""
+Rackspace Cloud Backup Common Content Hashing
+"""
+import hashlib
+import json
+
+
+def digest(record):
+    """
+    Return a stable hash (hex string) of a JSON compatible record
+
+    Dictionaries hash the same regardless of key order so records can be compared between API calls.
+    """
+    return hashlib.sha1(json.dumps(record, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def _sort_key(value):
+    """
+    (Internal) Order canonical values by their JSON form
+    """
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def canonicalize(value, ignore_keys=()):
+    """
+    Return a canonical copy of a JSON compatible value so that equivalent values compare and hash equal
+      ignore_keys - dictionary keys to drop at any depth, f.e identifiers that differ between otherwise identical records
+
+    Lists are sorted (their order is treated as insignificant) and whole number floats become integers.
+    """
+    if isinstance(value, dict):
+        return dict((key, canonicalize(item, ignore_keys)) for key, item in value.items() if key not in ignore_keys)
+    if isinstance(value, (list, tuple)):
+        return sorted((canonicalize(item, ignore_keys) for item in value), key=_sort_key)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
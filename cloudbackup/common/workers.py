@@ -0,0 +1,245 @@
+"""
+Rackspace Cloud Backup Common Concurrency Functionality
+"""
+import logging
+import threading
+import time
+
+from cloudbackup.common.cache import monotonic
+
+try:
+    # Python3
+    import queue
+except ImportError:
+    # Python2
+    import Queue as queue
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+class RateLimiter(object):
+    """
+    Thread-safe token bucket limiting how often calls may be made
+
+    Tokens are added at 'rate' per second up to 'burst'; each call to Acquire() takes one,
+    sleeping until one is available.
+    """
+
+    def __init__(self, rate=10.0, burst=10):
+        """
+        Initialize the Rate Limiter
+          rate - number of calls allowed per second on average; None for no limit
+          burst - maximum number of calls that may be made back to back
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """
+        (Internal) Take a token, returning the number of seconds to wait for it
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def Acquire(self):
+        """
+        Wait until a call may be made
+        """
+        if self.rate is None:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def get_rate_limiter(rate=10.0, burst=10):
+    """
+    Return the RateLimiter shared by the bulk API operations
+
+    Note: rate and burst only apply when the limiter is first created
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(rate=rate, burst=burst)
+        return _rate_limiter
+
+
+def _worker(fn, pending, completed, rate_limiter):
+    """
+    (Internal) Pull items until none are left, posting each outcome to the completed queue
+    """
+    log = logging.getLogger(__name__)
+    while True:
+        try:
+            item = pending.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            if rate_limiter is not None:
+                rate_limiter.Acquire()
+            completed.put((item, fn(item), None))
+        except Exception as ex:
+            log.debug('Concurrent call failed for {0:}: {1:}'.format(item, ex))
+            completed.put((item, None, ex))
+
+
+def run_concurrently(fn, items, max_workers=10, rate_limiter=None):
+    """
+    Call fn(item) for each item using up to max_workers threads
+
+    Results are yielded as they complete (not in the order of items) as tuples of:
+        (item, result, exception)
+    where exception is None on success and result is None on failure.
+
+    If a rate_limiter is given each call waits on rate_limiter.Acquire() first.
+
+    Note: The generator must be consumed for all the work to be performed
+    """
+    items = list(items)
+    if not len(items):
+        return
+
+    pending = queue.Queue()
+    for item in items:
+        pending.put(item)
+    completed = queue.Queue()
+
+    workers = []
+    for _ in range(max(1, min(max_workers, len(items)))):
+        worker = threading.Thread(target=_worker, args=(fn, pending, completed, rate_limiter))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+
+    for _ in range(len(items)):
+        yield completed.get()
+
+    for worker in workers:
+        worker.join()
+
+
+class _PipelineStage(object):
+    """
+    (Internal) One stage of run_pipeline()
+    """
+
+    def __init__(self, name, factory, workers, inbound, outbound, downstream_workers):
+        self.name = name
+        self.factory = factory
+        self.workers = workers
+        self.inbound = inbound
+        self.outbound = outbound
+        self.downstream_workers = downstream_workers
+        self.remaining = workers
+        self.lock = threading.Lock()
+
+    def _process(self, fn, entry):
+        """
+        (Internal) Run one entry through the stage; entries that already failed pass straight through
+        """
+        item, value, failed_stage, ex = entry
+        if failed_stage is not None:
+            return entry
+        try:
+            return (item, fn(value), None, None)
+        except Exception as error:
+            logging.getLogger(__name__).debug('Pipeline stage {0:} failed for {1:}: {2:}'.format(self.name, item, error))
+            return (item, None, self.name, error)
+
+    def _create(self):
+        """
+        (Internal) Create the worker's function; if the factory fails every entry the worker receives fails with its error
+        """
+        try:
+            return self.factory()
+        except Exception as error:
+            logging.getLogger(__name__).error('Pipeline stage {0:} failed to start a worker: {1:}'.format(self.name, error))
+            factory_error = error
+
+        def __failed(value):
+            raise factory_error
+        return __failed
+
+    def Run(self):
+        """
+        Worker thread: process entries until told to stop, then hand the stop on once every worker of the stage has finished
+        """
+        try:
+            fn = self._create()
+            while True:
+                entry = self.inbound.get()
+                if entry is None:
+                    break
+                self.outbound.put(self._process(fn, entry))
+        finally:
+            with self.lock:
+                self.remaining -= 1
+                last = (self.remaining == 0)
+            if last:
+                for _ in range(self.downstream_workers):
+                    self.outbound.put(None)
+
+
+def _feed_pipeline(items, inbound, workers):
+    """
+    (Internal) Feed the items into the first stage of run_pipeline(), waiting whenever it is full
+    """
+    try:
+        for item in items:
+            inbound.put((item, item, None, None))
+    finally:
+        for _ in range(workers):
+            inbound.put(None)
+
+
+def run_pipeline(items, stages, queue_size=16):
+    """
+    Pass each item through a series of stages, each running on its own pool of threads
+      items - iterable of items to process
+      stages - list of (name, factory, workers) tuples; factory() is called once per worker thread and
+               returns the function the worker calls with the previous stage's result (the item for the
+               first stage). This allows each worker to have its own non-thread-safe resources.
+      queue_size - maximum number of entries waiting between two stages; a slow stage makes the earlier
+                   stages wait (backpressure)
+
+    Results are yielded as they complete as tuples of:
+        (item, result, failed_stage, exception)
+    where failed_stage and exception are None on success and result is None on failure. An item
+    that fails in one stage skips the remaining stages. If a stage's factory() raises, every item
+    reaching that worker fails in the stage with the factory's exception.
+
+    Note: The generator must be consumed for all the work to be performed
+    """
+    workers = [max(1, stage_workers) for _, _, stage_workers in stages]
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    queues.append(queue.Queue())
+    pipeline = [
+        _PipelineStage(name, factory, workers[index], queues[index], queues[index + 1], (workers + [1])[index + 1])
+        for index, (name, factory, _) in enumerate(stages)
+    ]
+
+    threads = [threading.Thread(target=_feed_pipeline, args=(items, queues[0], workers[0]))]
+    for stage in pipeline:
+        threads.extend(threading.Thread(target=stage.Run) for _ in range(stage.workers))
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    entry = queues[-1].get()
+    while entry is not None:
+        yield entry
+        entry = queues[-1].get()
+
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,423 @@
+"""
+Rackspace Cloud Backup Account Mirror
+
+Keeps a local SQLite copy of an account's agents, agent configurations, backup configurations,
+completed backups and reports so that tools can query the account without waiting on the API.
+"""
+from __future__ import print_function
+
+import json
+import logging
+import sqlite3
+import time
+
+from cloudbackup.common.convert import date_to_epoch_ms, size_to_bytes
+from cloudbackup.common.digest import digest
+from cloudbackup.common.workers import run_concurrently
+
+
+_schema = (
+    'CREATE TABLE IF NOT EXISTS mirror_state (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS agents ('
+    '    machineagentid INTEGER PRIMARY KEY,'
+    '    machinename TEXT,'
+    '    hostserverid TEXT,'
+    '    ipaddress TEXT,'
+    '    datacenter TEXT,'
+    '    status TEXT,'
+    '    agentversion TEXT,'
+    '    isdisabled INTEGER,'
+    '    vaultbytes INTEGER,'
+    '    lastsuccessfulbackup INTEGER,'
+    '    digest TEXT,'
+    '    data TEXT,'
+    '    refreshed REAL)',
+    'CREATE INDEX IF NOT EXISTS agents_machinename ON agents (machinename)',
+    'CREATE INDEX IF NOT EXISTS agents_hostserverid ON agents (hostserverid)',
+    'CREATE INDEX IF NOT EXISTS agents_ipaddress ON agents (ipaddress)',
+    'CREATE INDEX IF NOT EXISTS agents_datacenter ON agents (datacenter)',
+    'CREATE INDEX IF NOT EXISTS agents_lastsuccessfulbackup ON agents (lastsuccessfulbackup)',
+    'CREATE TABLE IF NOT EXISTS agent_configurations ('
+    '    machineagentid INTEGER PRIMARY KEY,'
+    '    data TEXT,'
+    '    refreshed REAL)',
+    'CREATE TABLE IF NOT EXISTS backup_configurations ('
+    '    backupconfigurationid INTEGER PRIMARY KEY,'
+    '    machineagentid INTEGER,'
+    '    name TEXT,'
+    '    isactive INTEGER,'
+    '    data TEXT)',
+    'CREATE INDEX IF NOT EXISTS backup_configurations_machineagentid ON backup_configurations (machineagentid)',
+    'CREATE INDEX IF NOT EXISTS backup_configurations_name ON backup_configurations (name)',
+    'CREATE TABLE IF NOT EXISTS completed_backups ('
+    '    backupid INTEGER PRIMARY KEY,'
+    '    backupconfigurationid INTEGER,'
+    '    machineagentid INTEGER,'
+    '    completedtime INTEGER,'
+    '    numerrors INTEGER,'
+    '    data TEXT)',
+    'CREATE INDEX IF NOT EXISTS completed_backups_configuration ON completed_backups (backupconfigurationid, completedtime)',
+    'CREATE INDEX IF NOT EXISTS completed_backups_machineagentid ON completed_backups (machineagentid, completedtime)',
+    'CREATE TABLE IF NOT EXISTS reports ('
+    '    kind TEXT,'
+    '    id INTEGER,'
+    '    state TEXT,'
+    '    data TEXT,'
+    '    PRIMARY KEY (kind, id))',
+)
+
+
+class AccountMirror(object):
+    """
+    Local SQLite mirror of a Rackspace Cloud Backup account
+
+    Refresh() pulls the account through the API clients, fetching agent configurations,
+    completed backups and reports concurrently. Agent configurations and completed backups are
+    pulled for every agent on every refresh since new or edited backup configurations and
+    failed backups do not show in the agent list; only the agent list entries that changed are
+    rewritten. The Get*/Find* methods only read the local database.
+    """
+
+    def __init__(self, dbfile, agents, backups=None, restores=None, max_workers=10):
+        """
+        Open (creating if needed) the mirror database
+          dbfile - SQLite3 database file to keep the mirror in
+          agents - instance of cloudbackup.client.agents.Agents to pull agents and agent configurations with
+          backups - instance of cloudbackup.client.backup.Backups to pull completed backups and backup reports with
+          restores - instance of cloudbackup.client.backup.Restores to pull restore reports with
+          max_workers - maximum number of API requests to have outstanding at once
+        """
+        self.log = logging.getLogger(__name__)
+        self.dbfile = dbfile
+        self.agents = agents
+        self.backups = backups
+        self.restores = restores
+        self.max_workers = max_workers
+        self.dbinstance = None
+        self.__open_db()
+
+    def __del__(self):
+        """
+        Clean up
+        """
+        self.__close_db()
+
+    def __open_db(self):
+        """
+        Open the database and make sure the tables exist
+        """
+        self.log.debug('Opening mirror database')
+        self.dbinstance = sqlite3.connect(self.dbfile)
+        for statement in _schema:
+            self.dbinstance.execute(statement)
+        self.dbinstance.commit()
+
+    def __close_db(self):
+        """
+        Close the database instance
+        """
+        if self.dbinstance is not None:
+            self.log.debug('Closing mirror database')
+            self.dbinstance.close()
+            self.dbinstance = None
+
+    def _get_state(self, key, default=None):
+        """
+        (Internal) Read a value from the mirror_state table
+        """
+        row = self.dbinstance.execute('SELECT value FROM mirror_state WHERE key=:key', {'key': key}).fetchone()
+        if row is None:
+            return default
+        return row[0]
+
+    def _set_state(self, key, value):
+        """
+        (Internal) Write a value to the mirror_state table
+        """
+        self.dbinstance.execute('INSERT OR REPLACE INTO mirror_state (key, value) VALUES (:key, :value)', {'key': key, 'value': value})
+
+    @property
+    def LastRefresh(self):
+        """
+        Time (seconds since the Unix Epoch) of the last successful refresh; None if never refreshed
+        """
+        value = self._get_state('last_refresh')
+        if value is None:
+            return None
+        return float(value)
+
+    #
+    # Refresh
+    #
+    def Refresh(self, full=False, reports=False):
+        """
+        Bring the mirror up to date with the account
+          full - if True every agent list entry is stored again; otherwise only the entries that changed
+          reports - whether or not to also pull the backup reports for completed backups not yet mirrored
+
+        Returns a dictionary containing:
+            Agents - number of agents in the account
+            Changed - list of agent ids that were new or changed, or whose previous refresh failed
+            Removed - list of agent ids no longer in the account
+            Errors - dictionary of what could not be pulled (id -> exception)
+        """
+        now = time.time()
+        summary = {'Errors': {}}
+        agentlist = self.agents.GetAgentList()
+        summary['Agents'] = len(agentlist)
+        changed, summary['Removed'] = self._refresh_agents(agentlist, now, full)
+        summary['Changed'] = list(changed.keys())
+
+        machine_agent_ids = [agent['MachineAgentId'] for agent in agentlist]
+        configuration_agents = self._refresh_agent_configurations(machine_agent_ids, now, summary['Errors'])
+        if self.backups is not None:
+            self._refresh_completed_backups(configuration_agents, summary['Errors'])
+            if reports:
+                self.RefreshBackupReports(errors=summary['Errors'])
+        self._confirm_agents(changed, configuration_agents, summary['Errors'])
+
+        self._set_state('last_refresh', str(now))
+        self.dbinstance.commit()
+        self.log.info('Mirror refreshed: {0:} agents, {1:} changed, {2:} removed, {3:} errors'.format(summary['Agents'], len(summary['Changed']), len(summary['Removed']), len(summary['Errors'])))
+        return summary
+
+    def _refresh_agents(self, agentlist, now, full):
+        """
+        (Internal) Store the agent list, returning a dictionary of the new or changed agent ids to their
+        digests and the list of removed agent ids
+
+        Note: The digest of a changed agent is only stored by _confirm_agents() once everything
+              for the agent was pulled, so an agent whose pull fails is treated as changed again
+        """
+        known = dict(self.dbinstance.execute('SELECT machineagentid, digest FROM agents'))
+        changed = {}
+        for agent in agentlist:
+            machine_agent_id = agent['MachineAgentId']
+            agent_digest = digest(agent)
+            if not full and known.pop(machine_agent_id, None) == agent_digest:
+                continue
+            known.pop(machine_agent_id, None)
+            changed[machine_agent_id] = agent_digest
+            self.dbinstance.execute(
+                'INSERT OR REPLACE INTO agents (machineagentid, machinename, hostserverid, ipaddress, datacenter, status, agentversion, isdisabled, vaultbytes, lastsuccessfulbackup, digest, data, refreshed) '
+                'VALUES (:id, :name, :host, :ip, :dc, :status, :version, :disabled, :vault, :lastbackup, :digest, :data, :refreshed)',
+                {
+                    'id': machine_agent_id,
+                    'name': agent.get('MachineName'),
+                    'host': agent.get('HostServerId'),
+                    'ip': agent.get('IPAddress'),
+                    'dc': agent.get('Datacenter'),
+                    'status': agent.get('Status'),
+                    'version': agent.get('AgentVersion'),
+                    'disabled': agent.get('IsDisabled'),
+                    'vault': size_to_bytes(agent.get('BackupVaultSize')),
+                    'lastbackup': date_to_epoch_ms(agent.get('TimeOfLastSuccessfulBackup')),
+                    'digest': None,
+                    'data': json.dumps(agent),
+                    'refreshed': now
+                })
+
+        # whatever is left is no longer in the account
+        removed = list(known.keys())
+        for machine_agent_id in removed:
+            self._remove_agent(machine_agent_id)
+        return (changed, removed)
+
+    def _remove_agent(self, machine_agent_id):
+        """
+        (Internal) Remove an agent and everything mirrored for it
+        """
+        parameters = {'id': machine_agent_id}
+        self.dbinstance.execute('DELETE FROM reports WHERE kind=\'backup\' AND id IN (SELECT backupid FROM completed_backups WHERE machineagentid=:id)', parameters)
+        for table in ('completed_backups', 'backup_configurations', 'agent_configurations', 'agents'):
+            self.dbinstance.execute('DELETE FROM {0:} WHERE machineagentid=:id'.format(table), parameters)
+
+    def _confirm_agents(self, changed, configuration_agents, errors):
+        """
+        (Internal) Store the digests of the changed agents whose configuration and completed backups were all pulled
+        """
+        failed = set()
+        for kind, failed_id in errors:
+            if kind == 'agent_configuration':
+                failed.add(failed_id)
+            elif kind == 'completed_backups':
+                failed.add(configuration_agents.get(failed_id))
+        for machine_agent_id, agent_digest in changed.items():
+            if machine_agent_id not in failed:
+                self.dbinstance.execute('UPDATE agents SET digest=:digest WHERE machineagentid=:id', {'id': machine_agent_id, 'digest': agent_digest})
+
+    def _remove_backup_configurations(self, machine_agent_id, keep_ids):
+        """
+        (Internal) Remove the agent's backup configurations, and their completed backups, that are not in keep_ids
+        """
+        parameters = {'id': machine_agent_id}
+        for (backup_config_id,) in self.dbinstance.execute('SELECT backupconfigurationid FROM backup_configurations WHERE machineagentid=:id', parameters).fetchall():
+            if backup_config_id not in keep_ids:
+                config_parameters = {'config': backup_config_id}
+                self.dbinstance.execute('DELETE FROM reports WHERE kind=\'backup\' AND id IN (SELECT backupid FROM completed_backups WHERE backupconfigurationid=:config)', config_parameters)
+                self.dbinstance.execute('DELETE FROM completed_backups WHERE backupconfigurationid=:config', config_parameters)
+        self.dbinstance.execute('DELETE FROM backup_configurations WHERE machineagentid=:id', parameters)
+
+    def _refresh_agent_configurations(self, machine_agent_ids, now, errors):
+        """
+        (Internal) Pull the configurations of the given agents, returning a dictionary of the backup configuration ids they contain to their agent id
+        """
+        configuration_agents = {}
+        for machine_agent_id, configuration, ex in self.agents.IterAgentConfigurations(machine_agent_ids, max_workers=self.max_workers):
+            if ex is not None:
+                errors[('agent_configuration', machine_agent_id)] = ex
+                continue
+
+            self.dbinstance.execute('INSERT OR REPLACE INTO agent_configurations (machineagentid, data, refreshed) VALUES (:id, :data, :refreshed)',
+                                    {'id': machine_agent_id, 'data': json.dumps(configuration.Configuration), 'refreshed': now})
+            self._remove_backup_configurations(machine_agent_id, set(backupconfig['Id'] for backupconfig in configuration.BackupConfigurations))
+            for backupconfig in configuration.BackupConfigurations:
+                configuration_agents[backupconfig['Id']] = machine_agent_id
+                self.dbinstance.execute('INSERT OR REPLACE INTO backup_configurations (backupconfigurationid, machineagentid, name, isactive, data) VALUES (:id, :agent, :name, :active, :data)',
+                                        {'id': backupconfig['Id'], 'agent': machine_agent_id, 'name': backupconfig['Name'], 'active': backupconfig.get('IsActive'), 'data': json.dumps(backupconfig)})
+        return configuration_agents
+
+    def _refresh_completed_backups(self, configuration_agents, errors):
+        """
+        (Internal) Pull the completed backups for the given backup configurations (backup configuration id -> agent id)
+        """
+        for backup_config_id, snapshots, ex in run_concurrently(self.backups._get_completed_backups, list(configuration_agents.keys()), max_workers=self.max_workers):
+            if ex is not None:
+                errors[('completed_backups', backup_config_id)] = ex
+                continue
+
+            for snapshot in snapshots:
+                self.dbinstance.execute('INSERT OR REPLACE INTO completed_backups (backupid, backupconfigurationid, machineagentid, completedtime, numerrors, data) VALUES (:id, :config, :agent, :completed, :errors, :data)',
+                                        {'id': snapshot['BackupId'], 'config': backup_config_id, 'agent': snapshot.get('MachineAgentId', configuration_agents[backup_config_id]), 'completed': date_to_epoch_ms(snapshot.get('CompletedTime')), 'errors': snapshot.get('NumErrors'), 'data': json.dumps(snapshot)})
+
+    def _store_reports(self, kind, fetch, ids, errors):
+        """
+        (Internal) Pull reports concurrently and store them
+        """
+        count = 0
+        for report_id, report, ex in run_concurrently(fetch, ids, max_workers=self.max_workers):
+            if ex is not None or not len(report):
+                errors[(kind + '_report', report_id)] = ex
+                continue
+            self.dbinstance.execute('INSERT OR REPLACE INTO reports (kind, id, state, data) VALUES (:kind, :id, :state, :data)',
+                                    {'kind': kind, 'id': report_id, 'state': report.get('State'), 'data': json.dumps(report)})
+            count = count + 1
+        self.dbinstance.commit()
+        return count
+
+    def RefreshBackupReports(self, errors=None):
+        """
+        Pull the backup reports for every mirrored completed backup that does not have one yet
+
+        Returns the number of reports added
+        """
+        if errors is None:
+            errors = {}
+        backup_ids = [row[0] for row in self.dbinstance.execute('SELECT backupid FROM completed_backups WHERE backupid NOT IN (SELECT id FROM reports WHERE kind=\'backup\')')]
+        return self._store_reports('backup', self.backups.GetBackupReport, backup_ids, errors)
+
+    def RefreshRestoreReports(self, restore_ids, errors=None):
+        """
+        Pull the restore reports for the given restores
+
+        Returns the number of reports added
+        """
+        if errors is None:
+            errors = {}
+        return self._store_reports('restore', self.restores.GetRestoreReport, restore_ids, errors)
+
+    #
+    # Queries
+    #
+    def _query(self, statement, parameters=None):
+        """
+        (Internal) Run a query and return the 'data' column of each row decoded from JSON
+        """
+        return [json.loads(row[0]) for row in self.dbinstance.execute(statement, parameters or {})]
+
+    def GetAgentIds(self):
+        """
+        Return the list of mirrored agent ids
+        """
+        return [row[0] for row in self.dbinstance.execute('SELECT machineagentid FROM agents ORDER BY machineagentid')]
+
+    def GetAgent(self, machine_agent_id):
+        """
+        Return the agent list entry for the agent; None if it is not mirrored
+        """
+        agents = self._query('SELECT data FROM agents WHERE machineagentid=:id', {'id': machine_agent_id})
+        return agents[0] if len(agents) else None
+
+    def FindAgents(self, machine_name=None, host_server_id=None, ip_address=None, datacenter=None):
+        """
+        Return the agent list entries matching all of the given values
+        """
+        clauses = []
+        parameters = {}
+        for column, value in (('machinename', machine_name), ('hostserverid', host_server_id), ('ipaddress', ip_address), ('datacenter', datacenter)):
+            if value is not None:
+                clauses.append('{0:}=:{0:}'.format(column))
+                parameters[column] = value
+        statement = 'SELECT data FROM agents'
+        if len(clauses):
+            statement = '{0:} WHERE {1:}'.format(statement, ' AND '.join(clauses))
+        return self._query(statement, parameters)
+
+    def GetStaleAgents(self, epoch_ms, include_disabled=False):
+        """
+        Return the agent list entries whose last successful backup is before epoch_ms (milliseconds since the Unix Epoch) or that never completed one
+        """
+        statement = 'SELECT data FROM agents WHERE (lastsuccessfulbackup IS NULL OR lastsuccessfulbackup < :cutoff)'
+        if not include_disabled:
+            statement = statement + ' AND NOT isdisabled'
+        return self._query(statement, {'cutoff': epoch_ms})
+
+    def GetAgentConfiguration(self, machine_agent_id):
+        """
+        Return the agent configuration as returned by the API; None if it is not mirrored
+        """
+        configurations = self._query('SELECT data FROM agent_configurations WHERE machineagentid=:id', {'id': machine_agent_id})
+        return configurations[0] if len(configurations) else None
+
+    def GetBackupConfigurations(self, machine_agent_id=None):
+        """
+        Return the backup configurations (agent configuration form), optionally only those for the given agent
+        """
+        if machine_agent_id is None:
+            return self._query('SELECT data FROM backup_configurations')
+        return self._query('SELECT data FROM backup_configurations WHERE machineagentid=:id', {'id': machine_agent_id})
+
+    def GetCompletedBackups(self, backup_config_id=None, machine_agent_id=None, since=None):
+        """
+        Return the completed backups, newest first
+          backup_config_id - only those for the given backup configuration
+          machine_agent_id - only those for the given agent
+          since - only those completed at or after this time (milliseconds since the Unix Epoch)
+        """
+        clauses = []
+        parameters = {}
+        for column, value in (('backupconfigurationid', backup_config_id), ('machineagentid', machine_agent_id)):
+            if value is not None:
+                clauses.append('{0:}=:{0:}'.format(column))
+                parameters[column] = value
+        if since is not None:
+            clauses.append('completedtime >= :since')
+            parameters['since'] = since
+        statement = 'SELECT data FROM completed_backups'
+        if len(clauses):
+            statement = '{0:} WHERE {1:}'.format(statement, ' AND '.join(clauses))
+        return self._query(statement + ' ORDER BY completedtime DESC', parameters)
+
+    def GetBackupReport(self, backup_id):
+        """
+        Return the mirrored backup report; None if it is not mirrored
+        """
+        reports = self._query('SELECT data FROM reports WHERE kind=\'backup\' AND id=:id', {'id': backup_id})
+        return reports[0] if len(reports) else None
+
+    def GetRestoreReport(self, restore_id):
+        """
+        Return the mirrored restore report; None if it is not mirrored
+        """
+        reports = self._query('SELECT data FROM reports WHERE kind=\'restore\' AND id=:id', {'id': restore_id})
+        return reports[0] if len(reports) else None
@@ -0,0 +1,214 @@
+"""
+Rackspace Cloud Backup Report Store
+
+Keeps a local SQLite copy of the backup and restore reports of finished jobs. Reports do not
+change once a job finishes so they are only ever retrieved from the API once.
+"""
+import collections
+import json
+import logging
+import sqlite3
+import time
+
+from cloudbackup.client.backup import BACKUP_FINAL_STATES, RESTORE_STATES
+from cloudbackup.common.digest import digest
+from cloudbackup.common.workers import run_concurrently
+
+REPORT_BACKUP = 'backup'
+REPORT_RESTORE = 'restore'
+
+# RestoreStateIds a restore never leaves (Completed, Stopped, Failed, Completed WithErrors); unlike
+# RESTORE_FINAL_STATES this leaves out StopRequested, after which the restore still changes state
+RESTORE_TERMINAL_STATES = (3, 4, 5, 8)
+
+# Report States after which a report no longer changes
+FINAL_REPORT_STATES = {
+    REPORT_BACKUP: frozenset(BACKUP_FINAL_STATES),
+    REPORT_RESTORE: frozenset([RESTORE_STATES[state] for state in RESTORE_TERMINAL_STATES] + ['CompletedWithErrors'])
+}
+
+_schema = (
+    'CREATE TABLE IF NOT EXISTS report_data ('
+    '    digest TEXT PRIMARY KEY,'
+    '    data TEXT)',
+    'CREATE TABLE IF NOT EXISTS reports ('
+    '    kind TEXT,'
+    '    id TEXT,'
+    '    state TEXT,'
+    '    digest TEXT,'
+    '    stored REAL,'
+    '    PRIMARY KEY (kind, id))',
+)
+
+
+class ReportStore(object):
+    """
+    On-disk cache of backup and restore reports with concurrent bulk retrieval
+
+    Report contents are stored once under their hash and each (kind, id) refers to its
+    contents. Only reports whose State is final are stored; reports of jobs that are still
+    running are retrieved again every time they are asked for.
+    """
+
+    def __init__(self, dbfile, backups=None, restores=None, max_workers=10):
+        """
+        Open (creating if needed) the report database
+          dbfile - SQLite3 database file to keep the reports in
+          backups - instance of cloudbackup.client.backup.Backups to retrieve backup reports with
+          restores - instance of cloudbackup.client.backup.Restores to retrieve restore reports with
+          max_workers - maximum number of API requests to have outstanding at once
+        """
+        self.log = logging.getLogger(__name__)
+        self.dbfile = dbfile
+        self.backups = backups
+        self.restores = restores
+        self.max_workers = max_workers
+        self.hits = 0
+        self.misses = 0
+        self.dbinstance = None
+        self.__open_db()
+
+    def __del__(self):
+        """
+        Clean up
+        """
+        self.__close_db()
+
+    def __open_db(self):
+        """
+        Open the database and make sure the tables exist
+        """
+        self.log.debug('Opening report database')
+        self.dbinstance = sqlite3.connect(self.dbfile)
+        for statement in _schema:
+            self.dbinstance.execute(statement)
+        self.dbinstance.commit()
+
+    def __close_db(self):
+        """
+        Close the database instance
+        """
+        if self.dbinstance is not None:
+            self.log.debug('Closing report database')
+            self.dbinstance.close()
+            self.dbinstance = None
+
+    @staticmethod
+    def IsFinal(kind, report):
+        """
+        Return whether or not the report belongs to a finished job and so will not change
+          kind - REPORT_BACKUP or REPORT_RESTORE
+        """
+        return report.get('State') in FINAL_REPORT_STATES[kind]
+
+    def _fetch_function(self, kind):
+        """
+        (Internal) Return the function retrieving one report of the kind from the API, raising on failure
+        """
+        if kind == REPORT_BACKUP:
+            if self.backups is None:
+                raise ValueError('ReportStore requires a Backups instance to retrieve backup reports')
+            return self.backups.GetBackupReport
+
+        if self.restores is None:
+            raise ValueError('ReportStore requires a Restores instance to retrieve restore reports')
+
+        def __fetch(restore_id):
+            report = self.restores.GetRestoreReport(restore_id)
+            if not len(report):
+                raise RuntimeError('Unable to retrieve restore report for restore id ({0:})'.format(restore_id))
+            return report
+        return __fetch
+
+    def _load(self, kind, ids):
+        """
+        (Internal) Return the dictionary of id -> report for the ids stored on disk
+        """
+        reports = {}
+        for report_id in ids:
+            row = self.dbinstance.execute('SELECT report_data.data FROM reports JOIN report_data ON reports.digest = report_data.digest '
+                                          'WHERE reports.kind=:kind AND reports.id=:id', {'kind': kind, 'id': str(report_id)}).fetchone()
+            if row is not None:
+                reports[report_id] = json.loads(row[0])
+        return reports
+
+    def _store(self, kind, report_id, report):
+        """
+        (Internal) Store a finished report
+        """
+        data = json.dumps(report, sort_keys=True, separators=(',', ':'))
+        report_digest = digest(report)
+        self.dbinstance.execute('INSERT OR IGNORE INTO report_data (digest, data) VALUES (:digest, :data)', {'digest': report_digest, 'data': data})
+        self.dbinstance.execute('INSERT OR REPLACE INTO reports (kind, id, state, digest, stored) VALUES (:kind, :id, :state, :digest, :stored)',
+                                {'kind': kind, 'id': str(report_id), 'state': report.get('State'), 'digest': report_digest, 'stored': time.time()})
+
+    def GetReports(self, kind, ids):
+        """
+        Retrieve many reports, from disk when stored and concurrently from the API otherwise
+          kind - REPORT_BACKUP or REPORT_RESTORE
+          ids - iterable of backup ids or restore ids; repeated ids are only retrieved once
+
+        Returns a tuple of two dictionaries:
+            id -> report
+            id -> exception for each report that could not be retrieved
+        """
+        ids = list(collections.OrderedDict.fromkeys(ids))
+        reports = self._load(kind, ids)
+        missing = [report_id for report_id in ids if report_id not in reports]
+        self.hits += len(reports)
+        self.misses += len(missing)
+
+        errors = {}
+        if len(missing):
+            for report_id, report, ex in run_concurrently(self._fetch_function(kind), missing, max_workers=self.max_workers):
+                if ex is not None:
+                    errors[report_id] = ex
+                    continue
+                reports[report_id] = report
+                if self.IsFinal(kind, report):
+                    self._store(kind, report_id, report)
+            self.dbinstance.commit()
+        self.log.debug('Report Store: {0:} {1:} reports from disk, {2:} from the API, {3:} failed'.format(len(ids) - len(missing), kind, len(missing) - len(errors), len(errors)))
+        return (reports, errors)
+
+    def GetBackupReports(self, backup_ids):
+        """
+        Retrieve many backup reports, see GetReports() and Backups.GetBackupReport()
+        """
+        return self.GetReports(REPORT_BACKUP, backup_ids)
+
+    def GetRestoreReports(self, restore_ids):
+        """
+        Retrieve many restore reports, see GetReports() and Restores.GetRestoreReport()
+        """
+        return self.GetReports(REPORT_RESTORE, restore_ids)
+
+    def GetBackupReport(self, backup_id):
+        """
+        Retrieve a single backup report; raises the API error if it could not be retrieved
+        """
+        reports, errors = self.GetBackupReports([backup_id])
+        if backup_id in errors:
+            raise errors[backup_id]
+        return reports[backup_id]
+
+    def GetRestoreReport(self, restore_id):
+        """
+        Retrieve a single restore report; raises the API error if it could not be retrieved
+        """
+        reports, errors = self.GetRestoreReports([restore_id])
+        if restore_id in errors:
+            raise errors[restore_id]
+        return reports[restore_id]
+
+    def Forget(self, kind, report_id):
+        """
+        Remove a stored report so it is retrieved from the API again
+
+        Note: The report contents are left behind for any other report with the same contents
+        """
+        self.dbinstance.execute('DELETE FROM reports WHERE kind=:kind AND id=:id', {'kind': kind, 'id': str(report_id)})
+        self.dbinstance.commit()
+
+    def __len__(self):
+        return self.dbinstance.execute('SELECT COUNT(*) FROM reports').fetchone()[0]
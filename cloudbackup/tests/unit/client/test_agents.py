@@ -0,0 +1,116 @@
+import threading
+import time
+import unittest
+
+from cloudbackup.client.agents import Agents, AgentConfigurationNotAvailable, AgentLogLevel
+from cloudbackup.common.workers import RateLimiter
+
+
+class FakeAuthenticator(object):
+    AuthToken = 'token'
+
+
+class TestAgentConfigurationCache(unittest.TestCase):
+    def setUp(self):
+        self.agents = Agents(True, FakeAuthenticator(), 'localhost', cache_ttl=0.1)
+        self.loads = []
+        self.agents._get_agent_configuration = self._load
+
+    def _load(self, machine_agent_id):
+        self.loads.append(machine_agent_id)
+        if machine_agent_id < 0:
+            raise AgentConfigurationNotAvailable('agent {0:} not found'.format(machine_agent_id))
+        return {'id': machine_agent_id}
+
+    def test_configuration_is_cached(self):
+        self.assertEqual(self.agents.AgentConfiguration(1), {'id': 1})
+        self.assertEqual(self.agents.AgentConfiguration(1), {'id': 1})
+        self.assertEqual(self.loads, [1])
+        self.assertEqual(self.agents.AgentConfigurationIds, [1])
+
+    def test_expired_configuration_is_retrieved_again(self):
+        self.agents.AgentConfiguration(1)
+        time.sleep(0.15)
+        self.agents.AgentConfiguration(1)
+        self.assertEqual(self.loads, [1, 1])
+
+    def test_failure_is_raised_and_not_cached(self):
+        with self.assertRaises(AgentConfigurationNotAvailable):
+            self.agents.AgentConfiguration(-1)
+        with self.assertRaises(AgentConfigurationNotAvailable):
+            self.agents.AgentConfiguration(-1)
+        self.assertEqual(self.loads, [-1, -1])
+
+    def test_invalidate_agent(self):
+        self.agents.AgentConfiguration(1)
+        self.agents.AgentConfiguration(2)
+        self.agents.InvalidateAgent(1)
+        self.agents.AgentConfiguration(1)
+        self.agents.AgentConfiguration(2)
+        self.assertEqual(self.loads, [1, 2, 1])
+
+    def test_bulk_retrieval_fills_the_cache(self):
+        configurations, errors = self.agents.GetAgentConfigurationsBulk([1, 2, -3], max_workers=2)
+        self.assertEqual(sorted(configurations), [1, 2])
+        self.assertEqual(list(errors), [-3])
+        self.assertEqual(sorted(self.agents.AgentConfigurationIds), [1, 2])
+
+
+class FakeLog(object):
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, message):
+        self.warnings.append(message)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class TestAgentLogLevel(unittest.TestCase):
+    def setUp(self):
+        self.levels = {}
+        self.sets = []
+        self._lock = threading.Lock()
+        self.loglevel = AgentLogLevel(True, FakeAuthenticator(), 'localhost')
+        self.loglevel.log = FakeLog()
+        self.loglevel.GetLogLevel = lambda machine_agent_id: self.levels.get(machine_agent_id, 'Warn')
+        self.loglevel.SetLogLevel = self._set
+
+    def _set(self, machine_agent_id, level):
+        if machine_agent_id < 0:
+            raise IOError('agent {0:} not reachable'.format(machine_agent_id))
+        with self._lock:
+            self.sets.append((machine_agent_id, level))
+        self.levels[machine_agent_id] = level
+        return True
+
+    def test_push_and_pop_many(self):
+        results, errors = self.loglevel.PushLogLevels([1, 2, -3], 'Debug', max_workers=2, rate_limiter=RateLimiter(rate=None))
+        self.assertEqual(results, {1: True, 2: True})
+        self.assertEqual(list(errors), [-3])
+        self.assertIsInstance(errors[-3], IOError)
+        self.assertEqual(self.levels, {1: 'Debug', 2: 'Debug'})
+
+        results, errors = self.loglevel.PopLogLevels([1, 2, 4], rate_limiter=RateLimiter(rate=None))
+        self.assertEqual(results, {1: True, 2: True, 4: False})
+        self.assertEqual(errors, {})
+        self.assertEqual(self.levels, {1: 'Warn', 2: 'Warn'})
+
+    def test_restore_all_goes_to_the_bottom_of_each_stack(self):
+        self.loglevel.PushLogLevel(1, 'Info')
+        self.loglevel.PushLogLevel(1, 'Debug')
+        self.loglevel.PushLogLevel(2, 'Trace')
+        del self.sets[:]
+        self.assertEqual(self.loglevel.RestoreAll(deadline=5), {1: True, 2: True})
+        self.assertEqual(sorted(self.sets), [(1, 'Warn'), (2, 'Warn')])
+        self.assertFalse(self.loglevel.HasLogLevels(1))
+
+    def test_release_only_warns(self):
+        self.loglevel.PushLogLevel(1, 'Debug')
+        del self.sets[:]
+        self.loglevel.__del__()
+        self.assertEqual(self.sets, [])
+        self.assertEqual(len(self.loglevel.log.warnings), 1)
+        self.assertIn('[1]', self.loglevel.log.warnings[0])
+        self.assertIn('RestoreAll', self.loglevel.log.warnings[0])
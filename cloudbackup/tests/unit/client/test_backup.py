@@ -0,0 +1,120 @@
+import time
+import unittest
+
+import cloudbackup.utils.tz
+from cloudbackup.client.backup import BackupConfiguration, Backups
+
+
+class FakeAuthenticator(object):
+    AuthToken = 'token'
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, backups):
+        self.status_code = status_code
+        self.reason = 'reason'
+        self.text = ''
+        self._backups = backups
+
+    def json(self):
+        return self._backups
+
+
+class FakeSession(object):
+    def __init__(self, backups):
+        self.backups = backups
+        self.status_code = 200
+        self.calls = 0
+
+    def get(self, uri, headers=None):
+        self.calls += 1
+        return FakeResponse(self.status_code, self.backups)
+
+
+class TestBackupsAvailableForRestore(unittest.TestCase):
+    def setUp(self):
+        self.session = FakeSession([{'BackupConfigurationId': config_id, 'MachineAgentId': config_id % 3} for config_id in range(30)])
+        self.backups = Backups(False, FakeAuthenticator(), 'localhost')
+        self.backups.session = self.session
+
+    def test_lookups_share_one_api_call(self):
+        for config_id in range(30):
+            available = self.backups.GetBackupsForRestore(config_id % 3, config_id)
+            self.assertEqual(available['code'], 200)
+            self.assertEqual([backup['BackupConfigurationId'] for backup in available['backups']], [config_id])
+        by_agent = self.backups.GetBackupsForRestoreByAgent(1)
+        self.assertEqual([backup['BackupConfigurationId'] for backup in by_agent], list(range(1, 30, 3)))
+        self.assertEqual(self.session.calls, 1)
+
+    def test_unknown_configuration_has_no_backups(self):
+        available = self.backups.GetBackupsForRestore(1, 1000)
+        self.assertEqual(available['code'], 200)
+        self.assertEqual(available['backups'], [])
+        self.assertEqual(self.backups.GetBackupsForRestoreByAgent(1000), [])
+
+    def test_invalidate_retrieves_again(self):
+        self.backups.GetBackupsForRestore(0, 0)
+        self.backups.InvalidateBackupsForRestore()
+        self.backups.GetBackupsForRestore(0, 0)
+        self.assertEqual(self.session.calls, 2)
+
+    def test_failure_is_reported_and_not_cached(self):
+        self.session.status_code = 500
+        available = self.backups.GetBackupsForRestore(0, 0)
+        self.assertEqual(available['code'], 500)
+        self.assertEqual(available['backups'], [])
+        with self.assertRaises(RuntimeError):
+            self.backups.GetBackupsForRestoreByAgent(0)
+        self.session.status_code = 200
+        self.assertEqual(len(self.backups.GetBackupsForRestore(0, 0)['backups']), 1)
+        self.assertEqual(self.session.calls, 3)
+
+
+class TestBackupConfigurationPaths(unittest.TestCase):
+    def setUp(self):
+        # the template asks for the local time zone; keep the tests independent of the host
+        get_timezone = cloudbackup.utils.tz.get_timezone
+        self.addCleanup(setattr, cloudbackup.utils.tz, 'get_timezone', get_timezone)
+        cloudbackup.utils.tz.get_timezone = lambda WindowsZoneName=True: 'UTC'
+        self.config = BackupConfiguration()
+
+    def test_paths_are_added_once(self):
+        self.config.AddFolders(['/a', '/b', '/a'])
+        self.config.AddFile('/a/file')
+        self.config.AddFolder('/a', excluded=True)
+        self.assertEqual([entry['FilePath'] for entry in self.config.to_dict['Inclusions']], ['/a', '/b', '/a/file'])
+        self.assertTrue(self.config.IsFolderIncluded('/b'))
+        self.assertTrue(self.config.IsFileIncluded('/a/file'))
+        self.assertFalse(self.config.IsFolderIncluded('/a/file'))
+        self.assertTrue(self.config.IsFolderExcluded('/a'))
+        self.assertFalse(self.config.IsFileExcluded('/a'))
+
+    def test_adding_many_paths_after_reading_the_dictionary_stays_fast(self):
+        self.config.to_dict
+        paths = ['/data/{0:}'.format(index) for index in range(10000)]
+        start = time.time()
+        self.config.AddFolders(paths)
+        self.config.AddFolders(paths)
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(len(self.config.Configuration['Inclusions']), 10000)
+
+    def test_direct_edits_are_seen(self):
+        self.config.AddFolders(['/a', '/b'])
+        inclusions = self.config.to_dict['Inclusions']
+        inclusions.append({'FilePath': '/c', 'FileItemType': 'Folder'})
+        self.assertTrue(self.config.IsFolderIncluded('/c'))
+        del inclusions[0]
+        self.assertFalse(self.config.IsFolderIncluded('/a'))
+        inclusions[0] = {'FilePath': '/d', 'FileItemType': 'Folder'}
+        self.assertFalse(self.config.IsFolderIncluded('/b'))
+        self.assertTrue(self.config.IsFolderIncluded('/d'))
+        inclusions += [{'FilePath': '/e', 'FileItemType': 'Folder'}]
+        self.assertTrue(self.config.IsFolderIncluded('/e'))
+
+    def test_replaced_lists_are_seen(self):
+        self.config.AddFolder('/a')
+        self.config.backup_config['Inclusions'] = [{'FilePath': '/b', 'FileItemType': 'Folder'}]
+        self.assertFalse(self.config.IsFolderIncluded('/a'))
+        self.assertTrue(self.config.IsFolderIncluded('/b'))
+        self.config.AddFolder('/b')
+        self.assertEqual(len(self.config.backup_config['Inclusions']), 1)
@@ -0,0 +1,128 @@
+import unittest
+
+import requests
+
+from cloudbackup.client.backup import Backups
+from cloudbackup.client.endpoints import EndpointSelector
+from cloudbackup.cloud.files import CloudFiles
+
+
+class FakeAuthenticator(object):
+    AuthToken = 'token'
+
+    def __init__(self, endpoints):
+        self.auth_data = {'access': {'serviceCatalog': [{'name': 'cloudBackup', 'endpoints': endpoints}]}}
+
+
+def selector_for(endpoints, latencies):
+    """
+    Selector probing with the given latencies (uri -> seconds, None when unreachable)
+    """
+    selector = EndpointSelector(FakeAuthenticator(endpoints))
+    selector.probes = []
+
+    def probe(uri):
+        selector.probes.append(uri)
+        return latencies.get(uri)
+
+    selector.ProbeEndpoint = probe
+    return selector
+
+
+class FailingSession(object):
+    """
+    Raises the exception for calls to the failing hosts
+    """
+
+    def __init__(self, failing, exception=requests.exceptions.ConnectionError):
+        self.failing = failing
+        self.exception = exception
+        self.uris = []
+
+    def get(self, uri, **kwargs):
+        self.uris.append(uri)
+        if any(host in uri for host in self.failing):
+            raise self.exception('unable to connect to {0:}'.format(uri))
+        return None
+
+
+class TestEndpointSelector(unittest.TestCase):
+    def setUp(self):
+        self.endpoints = [
+            {'region': 'DFW', 'publicURL': 'https://dfw.public/v1.0/1', 'internalURL': 'https://dfw.snet/v1.0/1'},
+            {'region': 'ORD', 'publicURL': 'https://ord.public/v1.0/1'}
+        ]
+        self.latencies = {'https://dfw.public/v1.0/1': 0.2, 'https://dfw.snet/v1.0/1': 0.1, 'https://ord.public/v1.0/1': 0.3}
+        self.selector = selector_for(self.endpoints, self.latencies)
+
+    def test_candidates(self):
+        self.assertEqual([candidate['name'] for candidate in self.selector.GetCandidates('cloudBackup', 'dfw')], ['public', 'snet'])
+        self.assertEqual(len(self.selector.GetCandidates('cloudBackup')), 3)
+        self.assertEqual(self.selector.GetCandidates('cloudFiles'), [])
+
+    def test_fastest_is_selected_and_the_ranking_cached(self):
+        self.assertEqual(self.selector.GetBestUri('cloudBackup'), 'https://dfw.snet/v1.0/1')
+        self.assertEqual(self.selector.GetBestApiHost('cloudBackup', 'ORD', include_path=False), 'ord.public')
+        self.selector.GetBestUri('cloudBackup')
+        self.assertEqual(len(self.selector.probes), 4)
+
+    def test_unreachable_endpoint_is_skipped(self):
+        self.latencies['https://dfw.snet/v1.0/1'] = None
+        self.assertEqual(self.selector.GetBestUri('cloudBackup', 'DFW'), 'https://dfw.public/v1.0/1')
+
+    def test_marked_endpoint_fails_over_and_probes_again(self):
+        self.selector.GetBestUri('cloudBackup', 'DFW')
+        self.selector.MarkFailed('https://dfw.snet/v1.0/1')
+        self.assertEqual(self.selector.GetBestUri('cloudBackup', 'DFW'), 'https://dfw.public/v1.0/1')
+        self.assertEqual(len(self.selector.probes), 4)
+
+    def test_everything_failed_probes_again(self):
+        for uri in self.latencies:
+            self.selector.MarkFailed(uri)
+        self.assertEqual(self.selector.GetBestUri('cloudBackup', 'DFW'), 'https://dfw.snet/v1.0/1')
+
+
+class TestApiHostSelection(unittest.TestCase):
+    def setUp(self):
+        endpoints = [{'region': 'DFW', 'publicURL': 'https://dfw.public/v1.0/1', 'internalURL': 'https://dfw.snet/v1.0/1'}]
+        self.selector = selector_for(endpoints, {'https://dfw.public/v1.0/1': 0.2, 'https://dfw.snet/v1.0/1': 0.1})
+
+    def test_client_uses_the_selected_host(self):
+        backups = Backups(True, FakeAuthenticator([]), 'dfw.public', selector=self.selector, region='DFW')
+        self.assertEqual(backups.apihost, 'dfw.snet')
+        self.assertEqual(backups.MakeUri(True, '/v1.0/backup/1'), 'https://dfw.snet/v1.0/backup/1')
+
+    def test_connection_failure_fails_over(self):
+        backups = Backups(True, FakeAuthenticator([]), 'dfw.public', selector=self.selector, region='DFW')
+        session = FailingSession(['dfw.snet'])
+        backups.session = session
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            backups.session.get(backups.MakeUri(True, '/v1.0/backup/1'))
+        self.assertEqual(backups.apihost, 'dfw.public')
+        backups.session.get(backups.MakeUri(True, '/v1.0/backup/1'))
+        self.assertEqual(session.uris[-1], 'https://dfw.public/v1.0/backup/1')
+
+    def test_ssl_error_does_not_fail_over(self):
+        backups = Backups(True, FakeAuthenticator([]), 'dfw.public', selector=self.selector, region='DFW')
+        backups.session = FailingSession(['dfw.snet'], exception=requests.exceptions.SSLError)
+        with self.assertRaises(requests.exceptions.SSLError):
+            backups.session.get(backups.MakeUri(True, '/v1.0/backup/1'))
+        self.assertEqual(backups.apihost, 'dfw.snet')
+
+    def test_fixed_host_is_not_failed_over(self):
+        backups = Backups(True, FakeAuthenticator([]), 'fixed.host')
+        session = FailingSession(['fixed.host'])
+        backups.session = session
+        self.assertIs(backups.session, session)
+
+
+class TestCloudFilesSelection(unittest.TestCase):
+    def test_storage_host_fails_over_to_the_other_network(self):
+        selector = selector_for([], {'https://storage/v1/acct': 0.2, 'https://snet-storage/v1/acct': 0.1})
+        files = CloudFiles(True, FakeAuthenticator([]), selector=selector)
+        self.assertEqual(files._select_container('storage/v1/acct'), 'snet-storage/v1/acct')
+        files.session = FailingSession(['snet-storage'])
+        files.apihost = files._get_container('storage/v1/acct')
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            files.session.get(files.MakeUri(True, '/container'))
+        self.assertEqual(files._get_container('snet-storage/v1/acct'), 'storage/v1/acct')
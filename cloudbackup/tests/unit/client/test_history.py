@@ -0,0 +1,96 @@
+import time
+import unittest
+
+from cloudbackup.client.history import CompletedBackupHistory, is_successful
+
+
+def snapshot(backup_id, completed_ms, state='Completed'):
+    return {'BackupId': backup_id, 'CompletedTime': '/Date({0:})/'.format(completed_ms), 'State': state}
+
+
+class TestIsSuccessful(unittest.TestCase):
+    def test_states(self):
+        self.assertTrue(is_successful({'State': 'Completed'}))
+        self.assertFalse(is_successful({'State': 'CompletedWithErrors'}))
+        self.assertTrue(is_successful({'State': 'CompletedWithErrors'}, allow_errors=True))
+        self.assertFalse(is_successful({'State': 'Failed'}, allow_errors=True))
+
+    def test_falls_back_to_error_count(self):
+        self.assertTrue(is_successful({'NumErrors': 0}))
+        self.assertFalse(is_successful({'NumErrors': 2}))
+
+
+class TestCompletedBackupHistory(unittest.TestCase):
+    def setUp(self):
+        self.loads = []
+        self.snapshots = [snapshot(1, 1000), snapshot(2, 3000, 'Failed'), snapshot(3, 2000)]
+
+    def _load(self, backup_config_id):
+        self.loads.append(backup_config_id)
+        return list(self.snapshots)
+
+    def test_completed_is_in_completion_order(self):
+        history = CompletedBackupHistory(self._load)
+        self.assertEqual([entry['BackupId'] for entry in history.Completed(7)], [1, 3, 2])
+        self.assertEqual([entry['BackupId'] for entry in history.Completed(7, since=2000)], [3, 2])
+        self.assertEqual([entry['BackupId'] for entry in history.Completed(7, until=3000)], [1, 3])
+        self.assertEqual(self.loads, [7])
+
+    def test_latest_successful(self):
+        history = CompletedBackupHistory(self._load)
+        self.assertEqual(history.LatestSuccessful(7)['BackupId'], 3)
+
+    def test_get_refreshes_on_miss(self):
+        history = CompletedBackupHistory(self._load)
+        self.assertIsNone(history.Get(7, 4, refresh_on_miss=False))
+        self.snapshots.append(snapshot(4, 4000))
+        self.assertEqual(history.Get(7, 4)['BackupId'], 4)
+        self.assertEqual(self.loads, [7, 7])
+
+    def test_miss_on_a_cold_cache_retrieves_once(self):
+        history = CompletedBackupHistory(self._load)
+        self.assertIsNone(history.Get(7, 99))
+        self.assertEqual(self.loads, [7])
+
+    def test_repeated_misses_are_remembered_until_the_miss_ttl(self):
+        history = CompletedBackupHistory(self._load, ttl=60, miss_ttl=0.1)
+        for _ in range(20):
+            self.assertIsNone(history.Get(7, 99))
+        # only the initial load; the miss is remembered from it
+        self.assertEqual(self.loads, [7])
+        time.sleep(0.15)
+        self.snapshots.append(snapshot(99, 5000))
+        self.assertEqual(history.Get(7, 99)['BackupId'], 99)
+
+    def test_expired_history_is_retrieved_again(self):
+        history = CompletedBackupHistory(self._load, ttl=0.05)
+        history.Completed(7)
+        time.sleep(0.1)
+        self.snapshots.append(snapshot(5, 500))
+        self.assertEqual([entry['BackupId'] for entry in history.Completed(7)], [5, 1, 3, 2])
+        self.assertEqual(self.loads, [7, 7])
+
+    def test_refresh_finds_a_remembered_miss(self):
+        history = CompletedBackupHistory(self._load, ttl=60, miss_ttl=60)
+        self.assertIsNone(history.Get(7, 99))
+        self.snapshots.append(snapshot(99, 5000))
+        history.Refresh(7)
+        self.assertEqual(history.Get(7, 99)['BackupId'], 99)
+        self.assertEqual(history._histories[7].misses, {})
+
+    def test_invalidate_forgets_misses(self):
+        history = CompletedBackupHistory(self._load, ttl=60, miss_ttl=60)
+        self.assertIsNone(history.Get(7, 99))
+        self.snapshots.append(snapshot(99, 5000))
+        self.assertIsNone(history.Get(7, 99))
+        history.Invalidate(7)
+        self.assertEqual(history.Get(7, 99)['BackupId'], 99)
+
+    def test_unparsable_entry_is_not_indexed(self):
+        self.snapshots.append({'BackupId': 6, 'CompletedTime': 'yesterday'})
+        history = CompletedBackupHistory(self._load)
+        with self.assertRaises(ValueError):
+            history.Refresh(7)
+        indexed = history._histories[7]
+        self.assertNotIn('6', indexed.by_id)
+        self.assertEqual(sorted(indexed.by_id), sorted(backup_id for _, backup_id in indexed.timeline))
@@ -0,0 +1,90 @@
+import threading
+import time
+import unittest
+
+from cloudbackup.client.inventory import AgentInventory
+
+
+class TestAgentInventory(unittest.TestCase):
+    def setUp(self):
+        self.loads = 0
+        self.agentlist = [
+            {'MachineAgentId': 1, 'MachineName': 'web1', 'HostServerId': 'h1', 'IPAddress': '10.0.0.1'},
+            {'MachineAgentId': 2, 'MachineName': 'web2', 'HostServerId': 'h2', 'IPAddress': '10.0.0.2'},
+            {'MachineAgentId': 3, 'MachineName': 'web1', 'HostServerId': 'h3', 'IPAddress': '10.0.0.3'}
+        ]
+
+    def _load(self):
+        self.loads += 1
+        return [dict(agent) for agent in self.agentlist]
+
+    def _ids(self, agents):
+        return [agent['MachineAgentId'] for agent in agents]
+
+    def test_match_by_each_key(self):
+        inventory = AgentInventory(self._load)
+        self.assertEqual(self._ids(inventory.MatchHost(cloud_server_name='web1')), [1, 3])
+        self.assertEqual(self._ids(inventory.MatchHost(cloud_server_id='h2')), [2])
+        self.assertEqual(self._ids(inventory.MatchHost(cloud_server_ips=['10.0.0.3', '192.168.0.1'])), [3])
+        self.assertEqual(inventory.MatchHost(cloud_server_name='nothing'), [])
+
+    def test_agent_matching_several_keys_is_returned_once(self):
+        inventory = AgentInventory(self._load)
+        matches = inventory.MatchHost(cloud_server_name='web2', cloud_server_id='h2', cloud_server_ips=['10.0.0.2'])
+        self.assertEqual(self._ids(matches), [2])
+
+    def test_batch_uses_a_single_load(self):
+        inventory = AgentInventory(self._load)
+        results = inventory.MatchHosts([('web1', None, None), (None, 'h2', None), (None, None, ['10.0.0.9'])])
+        self.assertEqual([self._ids(matches) for matches in results], [[1, 3], [2], []])
+        self.assertEqual(self.loads, 1)
+
+    def test_expired_list_is_retrieved_again(self):
+        inventory = AgentInventory(self._load, ttl=0.05)
+        self.assertEqual(len(inventory), 3)
+        self.agentlist.append({'MachineAgentId': 4, 'MachineName': 'db1', 'HostServerId': 'h4', 'IPAddress': '10.0.0.4'})
+        self.assertEqual(len(inventory), 3)
+        time.sleep(0.1)
+        self.assertEqual(self._ids(inventory.MatchHost(cloud_server_name='db1')), [4])
+        self.assertEqual(self.loads, 2)
+
+    def test_discard_and_update(self):
+        inventory = AgentInventory(self._load)
+        self.assertEqual(len(inventory), 3)
+        inventory.Discard(1)
+        self.assertEqual(self._ids(inventory.MatchHost(cloud_server_name='web1')), [3])
+        inventory.Update(3, {'Status': 'Offline'})
+        self.assertEqual(inventory.MatchHost(cloud_server_id='h3')[0]['Status'], 'Offline')
+        self.assertEqual(len(inventory), 2)
+
+    def test_single_ip_string(self):
+        inventory = AgentInventory(self._load)
+        self.assertEqual(self._ids(inventory.MatchHost(cloud_server_ips='10.0.0.2')), [2])
+        self.assertEqual(inventory.MatchHost(cloud_server_ips='1'), [])
+
+    def test_discard_and_update_keep_the_indexes(self):
+        inventory = AgentInventory(self._load)
+        self.assertEqual(len(inventory), 3)
+        inventory.Discard('1')
+        self.assertEqual(inventory.MatchHost(cloud_server_id='h1'), [])
+        inventory.Update(2, {'MachineName': 'web9'})
+        self.assertEqual(inventory.MatchHost(cloud_server_name='web2'), [])
+        self.assertEqual(self._ids(inventory.MatchHost(cloud_server_name='web9')), [2])
+
+    def test_retrieval_does_not_hold_the_lock(self):
+        acquired = []
+
+        def try_lock():
+            if inventory._lock.acquire(False):
+                acquired.append(True)
+                inventory._lock.release()
+
+        def load():
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+            return self._load()
+
+        inventory = AgentInventory(load)
+        self.assertEqual(len(inventory), 3)
+        self.assertEqual(acquired, [True])
@@ -0,0 +1,159 @@
+import threading
+import time
+import unittest
+
+from cloudbackup.client.jobs import JOB_BACKUP, JOB_RESTORE, JobWatcher, RseJobNotifier
+
+
+class FakeBackups(object):
+    """
+    Each backup reports the states in order, repeating the last one
+    """
+
+    def __init__(self, states):
+        self.states = states
+        self.polls = {}
+        self._lock = threading.Lock()
+
+    def GetBackupDetails(self, snapshot_id):
+        with self._lock:
+            polls = self.polls.get(snapshot_id, 0)
+            self.polls[snapshot_id] = polls + 1
+        state = self.states[min(polls, len(self.states) - 1)]
+        if state is None:
+            # the status could not be retrieved
+            return {}
+        return {'BackupId': snapshot_id, 'CurrentState': state}
+
+
+class TestJobWatcher(unittest.TestCase):
+    def _watcher(self, states, **kwargs):
+        self.backups = FakeBackups(states)
+        watcher = JobWatcher(backups=self.backups, min_interval=0.01, max_interval=0.05, queued_interval=0.02, **kwargs)
+        self.addCleanup(watcher.Stop)
+        return watcher
+
+    def test_jobs_resolve_in_their_final_state(self):
+        watcher = self._watcher(['Queued', 'InProgress', 'InProgress', 'Completed'])
+        futures = [watcher.WatchBackup(snapshot_id, timeout=5) for snapshot_id in range(20)]
+        for future in futures:
+            self.assertEqual(future.Result(5)['CurrentState'], 'Completed')
+            self.assertFalse(future.timed_out)
+            self.assertEqual(future.polls, 4)
+        self.assertEqual(len(watcher), 0)
+
+    def test_failed_poll_is_retried(self):
+        watcher = self._watcher([None, 'Failed'])
+        future = watcher.WatchBackup(1, timeout=5)
+        self.assertEqual(future.Result(5)['CurrentState'], 'Failed')
+        self.assertEqual(future.polls, 2)
+
+    def test_watch_times_out_with_the_last_status(self):
+        watcher = self._watcher(['InProgress'])
+        future = watcher.WatchBackup(1, timeout=0.1)
+        self.assertEqual(future.Result(5)['CurrentState'], 'InProgress')
+        self.assertTrue(future.Done())
+        self.assertTrue(future.timed_out)
+
+    def test_watching_a_job_twice_returns_the_same_future(self):
+        watcher = self._watcher(['InProgress'])
+        self.assertIs(watcher.WatchBackup(1), watcher.WatchBackup(1))
+        self.assertEqual(len(watcher), 1)
+
+    def test_poke_polls_right_away(self):
+        watcher = self._watcher(['InProgress', 'Completed'])
+        future = watcher.WatchBackup(1, timeout=30, poll_interval=30)
+        while future.polls == 0:
+            time.sleep(0.01)
+        self.assertTrue(watcher.Poke(JOB_BACKUP, 1))
+        self.assertEqual(future.Result(5)['CurrentState'], 'Completed')
+        self.assertFalse(future.timed_out)
+        self.assertFalse(watcher.Poke(JOB_BACKUP, 1))
+
+    def test_callbacks_are_called_once_resolved(self):
+        watcher = self._watcher(['Completed'])
+        resolved = []
+        done = threading.Event()
+
+        def callback(future):
+            resolved.append(future.job_id)
+            done.set()
+
+        future = watcher.WatchBackup(1)
+        future.AddDoneCallback(callback)
+        self.assertTrue(done.wait(5))
+        future.AddDoneCallback(callback)
+        self.assertEqual(resolved, [1, 1])
+
+    def test_stop_resolves_outstanding_jobs_as_timed_out(self):
+        watcher = self._watcher(['InProgress'])
+        future = watcher.WatchBackup(1)
+        watcher.Stop()
+        self.assertTrue(future.Done())
+        self.assertTrue(future.timed_out)
+
+    def test_restore_requires_restores(self):
+        watcher = self._watcher(['Completed'])
+        with self.assertRaises(ValueError):
+            watcher.WatchRestore(1)
+
+
+class FakeWatcher(object):
+    def __init__(self, watched):
+        self.watched = watched
+        self.pokes = []
+
+    def Poke(self, kind, job_id):
+        self.pokes.append((kind, job_id))
+        return (kind, job_id) in self.watched
+
+
+class FakeRse(object):
+    def Clone(self, agents):
+        return self
+
+
+class TestRseJobNotifier(unittest.TestCase):
+    def setUp(self):
+        self.jobs = {(JOB_BACKUP, 10): None, (JOB_RESTORE, 20): None}
+        self.watcher = FakeWatcher(self.jobs)
+        self.notifier = RseJobNotifier(self.watcher, FakeRse(), None)
+
+    def test_event_naming_a_job_affects_only_that_job(self):
+        event = {'data': {'MachineAgentId': 5, 'BackupId': 10}}
+        self.assertEqual(RseJobNotifier._affected(5, event, self.jobs), [(JOB_BACKUP, 10)])
+        event = {'data': {'MachineAgentId': 5, 'BackupId': 11}}
+        self.assertEqual(RseJobNotifier._affected(5, event, self.jobs), [])
+
+    def test_agent_id_is_compared_as_a_string(self):
+        event = {'data': {'MachineAgentId': '5', 'RestoreId': 20}}
+        self.assertEqual(RseJobNotifier._affected(5, event, self.jobs), [(JOB_RESTORE, 20)])
+        self.assertEqual(RseJobNotifier._affected('5', {'data': {'MachineAgentId': 5, 'RestoreId': 20}}, self.jobs), [(JOB_RESTORE, 20)])
+
+    def test_other_agents_and_heartbeats_are_ignored(self):
+        self.assertEqual(RseJobNotifier._affected(5, {'data': {'MachineAgentId': 6, 'BackupId': 10}}, self.jobs), [])
+        self.assertEqual(RseJobNotifier._affected(5, {'data': {'MachineAgentId': 5, 'Event': 'Heartbeat'}}, self.jobs), [])
+
+    def test_event_without_a_job_affects_every_job(self):
+        affected = RseJobNotifier._affected(5, {'data': {'MachineAgentId': 5, 'Event': 'Status'}}, self.jobs)
+        self.assertEqual(sorted(affected), sorted(self.jobs))
+
+    def test_events_are_handled_once_by_id(self):
+        event = {'id': 'a', 'data': {'MachineAgentId': 5, 'BackupId': 10}}
+        self.notifier._dispatch(5, [event], self.jobs)
+        self.notifier._dispatch(5, [dict(event)], self.jobs)
+        self.assertEqual(self.watcher.pokes, [(JOB_BACKUP, 10)])
+        self.assertEqual(self.notifier.events_seen, 1)
+        self.assertEqual(self.notifier.jobs_poked, 1)
+
+    def test_events_without_an_id_are_handled_once_per_posting(self):
+        # a wide bucket so the reads below do not straddle a boundary
+        self.notifier.POSTED_BUCKET = 10 ** 6
+        event = {'data': {'MachineAgentId': 5, 'BackupId': 10}, 'age': 1}
+        self.notifier._dispatch(5, [event], self.jobs)
+        # the same event read again, older
+        self.notifier._dispatch(5, [dict(event, age=2)], self.jobs)
+        self.assertEqual(self.watcher.pokes, [(JOB_BACKUP, 10)])
+        # an identical event posted well before the first
+        self.notifier._dispatch(5, [dict(event, age=10 ** 7)], self.jobs)
+        self.assertEqual(self.watcher.pokes, [(JOB_BACKUP, 10), (JOB_BACKUP, 10)])
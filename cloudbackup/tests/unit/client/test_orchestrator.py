@@ -0,0 +1,134 @@
+import threading
+import time
+import unittest
+
+from cloudbackup.client.orchestrator import BackupOrchestrator, BackupSkippedError, BackupTimeoutError
+
+
+class FakeBackups(object):
+    """
+    Runs each backup for a short time, recording the order and how many ran at once
+    """
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.order = []
+        self.active = 0
+        self.most_active = 0
+        self._lock = threading.Lock()
+
+    def RunBackup(self, backup_config_id, retry_attempts, monitor):
+        with self._lock:
+            self.order.append(backup_config_id)
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+        time.sleep(0.01)
+        with self._lock:
+            self.active -= 1
+        if backup_config_id in self.failing:
+            raise RuntimeError('backup {0:} failed'.format(backup_config_id))
+        return {'BackupConfigurationId': backup_config_id}
+
+
+class MonitoringBackups(FakeBackups):
+    """
+    Starts each backup as a snapshot of the same id and waits for it with the monitor
+    """
+
+    def RunBackup(self, backup_config_id, retry_attempts, monitor):
+        with self._lock:
+            self.order.append(backup_config_id)
+        monitor(backup_config_id)
+        return {'BackupConfigurationId': backup_config_id}
+
+
+class FakeFuture(object):
+    def __init__(self, timed_out):
+        self.timed_out = timed_out
+
+    def Result(self):
+        return {'BackupStatus': 'Running' if self.timed_out else 'Completed'}
+
+
+class FakeWatcher(object):
+    """
+    Times out watching the given snapshot ids
+    """
+
+    def __init__(self, timing_out=()):
+        self.timing_out = set(timing_out)
+
+    def WatchBackup(self, snapshot_id, timeout=None):
+        return FakeFuture(snapshot_id in self.timing_out)
+
+
+def by_id(results):
+    return dict((result.backup_config_id, result) for result in results)
+
+
+class TestBackupOrchestrator(unittest.TestCase):
+    def test_all_backups_are_run(self):
+        backups = FakeBackups(failing=[3])
+        orchestrator = BackupOrchestrator(backups, watcher=object(), max_concurrent=4)
+        succeeded, failed = orchestrator.RunAll([(backup_config_id, backup_config_id % 5) for backup_config_id in range(20)])
+        self.assertEqual(sorted(result.backup_config_id for result in succeeded), [backup_config_id for backup_config_id in range(20) if backup_config_id != 3])
+        self.assertEqual([result.backup_config_id for result in failed], [3])
+        self.assertIsInstance(failed[0].exception, RuntimeError)
+        self.assertEqual(by_id(succeeded)[4].output, {'BackupConfigurationId': 4})
+        self.assertLessEqual(backups.most_active, 4)
+
+    def test_backups_of_an_agent_run_one_at_a_time_in_order(self):
+        backups = FakeBackups()
+        orchestrator = BackupOrchestrator(backups, watcher=object(), max_concurrent=10)
+        succeeded, failed = orchestrator.RunAll([(backup_config_id, 1) for backup_config_id in range(5)])
+        self.assertEqual(backups.order, list(range(5)))
+        self.assertEqual(backups.most_active, 1)
+
+    def test_job_forms(self):
+        backups = FakeBackups()
+        orchestrator = BackupOrchestrator(backups, watcher=object())
+        succeeded, failed = orchestrator.RunAll([(1, 1), {'BackupConfigurationId': 2, 'MachineAgentId': 2}])
+        self.assertEqual(sorted(result.backup_config_id for result in succeeded), [1, 2])
+        self.assertEqual(by_id(succeeded)[2].machine_agent_id, 2)
+
+    def test_repeated_backup_config_ids_are_all_reported(self):
+        backups = FakeBackups(failing=[2])
+        orchestrator = BackupOrchestrator(backups, watcher=object())
+        succeeded, failed = orchestrator.RunAll([(1, 1), (1, 1), (2, 2), (2, 2)])
+        self.assertEqual([result.backup_config_id for result in succeeded], [1, 1])
+        self.assertEqual([result.backup_config_id for result in failed], [2, 2])
+
+    def test_timed_out_backup_stops_the_agent_queue(self):
+        backups = MonitoringBackups()
+        orchestrator = BackupOrchestrator(backups, watcher=FakeWatcher(timing_out=[2]), max_concurrent=2)
+        succeeded, failed = orchestrator.RunAll([(1, 1), (2, 1), (3, 1), (4, 2), (5, 1)])
+        self.assertEqual(sorted(result.backup_config_id for result in succeeded), [1, 4])
+        failed = by_id(failed)
+        self.assertEqual(sorted(failed), [2, 3, 5])
+        self.assertIsInstance(failed[2].exception, BackupTimeoutError)
+        self.assertIsInstance(failed[3].exception, BackupSkippedError)
+        self.assertIsInstance(failed[5].exception, BackupSkippedError)
+        self.assertNotIn(3, backups.order)
+        self.assertNotIn(5, backups.order)
+
+    def test_malformed_jobs_are_reported_and_the_rest_run(self):
+        backups = FakeBackups()
+        orchestrator = BackupOrchestrator(backups, watcher=object())
+        results = list(orchestrator.Run([(1, 1), {'BackupConfigurationId': 2}, (3, 3)]))
+        self.assertEqual(sorted(result.backup_config_id for result in results if result.exception is None), [1, 3])
+        malformed = [result for result in results if result.exception is not None]
+        self.assertEqual(len(malformed), 1)
+        self.assertIsNone(malformed[0].backup_config_id)
+        self.assertIsInstance(malformed[0].exception, KeyError)
+
+    def test_error_iterating_the_jobs_is_reported(self):
+        def jobs():
+            yield (1, 1)
+            raise IOError('unable to read the job list')
+
+        orchestrator = BackupOrchestrator(FakeBackups(), watcher=object())
+        succeeded, failed = orchestrator.RunAll(jobs())
+        self.assertEqual([result.backup_config_id for result in succeeded], [1])
+        self.assertEqual(len(failed), 1)
+        self.assertIsNone(failed[0].backup_config_id)
+        self.assertIsInstance(failed[0].exception, IOError)
@@ -0,0 +1,52 @@
+import unittest
+
+from cloudbackup.client.rse import Rse
+
+
+class FakeAuthenticator(object):
+    AuthToken = 'token'
+
+
+class FakeAgents(object):
+    """
+    Serves every agent from one RSE channel, counting the lookups
+    """
+
+    def __init__(self):
+        self.lookups = 0
+
+    def GetRseHost(self, machine_agent_id):
+        self.lookups += 1
+        return 'rse.example.com'
+
+    def GetRseChannel(self, machine_agent_id):
+        self.lookups += 1
+        return '/v1.0/channel'
+
+
+def heartbeat(machine_agent_id, age=1):
+    return {'data': {'Event': 'Heartbeat', 'MachineAgentId': machine_agent_id}, 'age': age}
+
+
+class TestMonitorForHeartBeats(unittest.TestCase):
+    def setUp(self):
+        self.agents = FakeAgents()
+        self.rse = Rse('test', '1.0', FakeAuthenticator(), self.agents, 'key')
+        self.queries = 0
+        self.events = []
+        self.rse.Query = self._query
+
+    def _query(self):
+        self.queries += 1
+        return {'events': list(self.events)}
+
+    def test_shared_channel_is_resolved_and_queried_once(self):
+        self.events = [heartbeat(1), heartbeat(2)]
+        self.assertEqual(self.rse.MonitorForHeartBeats([1]), set([1]))
+        self.assertEqual(self.queries, 1)
+        self.assertEqual(self.agents.lookups, 2)
+
+    def test_agent_ids_are_compared_as_strings(self):
+        self.events = [heartbeat('1'), heartbeat(2), heartbeat(3, age=60)]
+        self.assertEqual(self.rse.MonitorForHeartBeats([1, '2', 3]), set([1, '2']))
+        self.assertEqual(self.queries, 1)
@@ -0,0 +1,128 @@
+import threading
+import time
+import unittest
+
+from cloudbackup.client.wake import KeepAwakeScheduler, WakeCoordinator, WakeWaiter
+
+
+class FakeAgents(object):
+    def __init__(self):
+        self.wakes = 0
+
+    def WakeAgents(self):
+        self.wakes += 1
+        return 200
+
+
+class FakeRse(object):
+    """
+    Reports the heart beats of the agents in 'awake'
+    """
+
+    def __init__(self, awake=()):
+        self.agentkey = 'key'
+        self.awake = set(awake)
+        self.polls = 0
+
+    def Clone(self, agents):
+        return self
+
+    def MonitorForHeartBeats(self, machine_agent_ids):
+        self.polls += 1
+        return [machine_agent_id for machine_agent_id in machine_agent_ids if machine_agent_id in self.awake]
+
+
+class TestWakeCoordinator(unittest.TestCase):
+    def _coordinator(self, **kwargs):
+        self.agents = FakeAgents()
+        coordinator = WakeCoordinator(self.agents, min_poll=0.01, max_poll=0.02, **kwargs)
+        self.addCleanup(coordinator.Stop)
+        return coordinator
+
+    def test_agents_share_one_wake(self):
+        coordinator = self._coordinator(wake_interval=30)
+        rse = FakeRse(awake=range(10))
+        waiters = [coordinator.Register(machine_agent_id, rse, 5) for machine_agent_id in range(10)]
+        self.assertTrue(all(waiter.Wait(5) for waiter in waiters))
+        self.assertEqual(self.agents.wakes, 1)
+
+    def test_waiter_times_out_on_time(self):
+        coordinator = self._coordinator(wake_interval=30)
+        start = time.time()
+        waiter = coordinator.Register(1, FakeRse(), 0.2)
+        self.assertIs(waiter.Wait(5), False)
+        self.assertLess(time.time() - start, 1.0)
+
+    def test_waiter_wake_interval_shortens_the_coordinator_interval(self):
+        coordinator = self._coordinator(wake_interval=30)
+        waiter = coordinator.Register(1, FakeRse(), 0.5, wake_interval=0.1)
+        self.assertIs(waiter.Wait(5), False)
+        # posted at the start and then about every 0.1 seconds while waiting
+        self.assertGreaterEqual(self.agents.wakes, 3)
+        self.assertLessEqual(self.agents.wakes, 7)
+
+    def test_stop_fails_outstanding_waiters(self):
+        coordinator = self._coordinator(wake_interval=30)
+        waiter = coordinator.Register(1, FakeRse(), 30)
+        coordinator.Stop()
+        self.assertIs(waiter.Wait(1), False)
+
+
+class FakeCoordinator(object):
+    """
+    Resolves every registration right away, the agents in 'awake' as woken
+    """
+
+    def __init__(self, awake):
+        self.awake = set(awake)
+        self.registered = []
+        self._lock = threading.Lock()
+
+    def Register(self, machine_agent_id, rse, timeout, wake_interval=None):
+        with self._lock:
+            self.registered.append((machine_agent_id, wake_interval))
+        waiter = WakeWaiter(machine_agent_id, rse.agentkey, None, wake_interval)
+        waiter.Resolve(machine_agent_id in self.awake)
+        return waiter
+
+    def Count(self, machine_agent_id):
+        with self._lock:
+            return len([entry for entry in self.registered if entry[0] == machine_agent_id])
+
+
+class TestKeepAwakeScheduler(unittest.TestCase):
+    def setUp(self):
+        self.coordinator = FakeCoordinator(awake=[1])
+        self.scheduler = KeepAwakeScheduler(self.coordinator, retry_period=0.05)
+        self.addCleanup(self.scheduler.Stop)
+
+    def test_agents_are_woken_every_period(self):
+        self.scheduler.Add(1, 0.1, FakeRse())
+        time.sleep(0.35)
+        self.assertGreaterEqual(self.coordinator.Count(1), 3)
+        self.assertLessEqual(self.coordinator.Count(1), 5)
+        self.assertEqual(set(self.coordinator.registered), set([(1, 0.1)]))
+
+    def test_agents_not_seen_are_retried_sooner(self):
+        self.scheduler.Add(2, 10, FakeRse())
+        time.sleep(0.2)
+        self.assertGreaterEqual(self.coordinator.Count(2), 3)
+
+    def test_removed_agent_is_no_longer_woken(self):
+        self.scheduler.Add(1, 0.05, FakeRse())
+        self.assertIn(1, self.scheduler)
+        time.sleep(0.1)
+        self.scheduler.Remove(1)
+        self.assertNotIn(1, self.scheduler)
+        self.assertEqual(len(self.scheduler), 0)
+        count = self.coordinator.Count(1)
+        time.sleep(0.15)
+        self.assertEqual(self.coordinator.Count(1), count)
+
+    def test_adding_again_replaces_the_schedule(self):
+        self.scheduler.Add(1, 10, FakeRse())
+        time.sleep(0.1)
+        self.scheduler.Add(1, 10, FakeRse())
+        time.sleep(0.1)
+        self.assertEqual(len(self.scheduler), 1)
+        self.assertEqual(self.coordinator.Count(1), 2)
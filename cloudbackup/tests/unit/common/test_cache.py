@@ -0,0 +1,83 @@
+import time
+import unittest
+
+from cloudbackup.common.cache import TtlCache
+
+
+class TestTtlCache(unittest.TestCase):
+    def test_get_returns_stored_value(self):
+        cache = TtlCache(ttl=60)
+        cache.Set('a', 1)
+        self.assertEqual(cache.Get('a'), 1)
+        self.assertIn('a', cache)
+        self.assertEqual(len(cache), 1)
+
+    def test_missing_key_returns_default(self):
+        cache = TtlCache(ttl=60)
+        self.assertIsNone(cache.Get('a'))
+        self.assertEqual(cache.Get('a', default=5), 5)
+        self.assertNotIn('a', cache)
+
+    def test_expired_entry_is_not_returned(self):
+        cache = TtlCache(ttl=0.05)
+        cache.Set('a', 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.Get('a'))
+        self.assertNotIn('a', cache)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.Keys(), [])
+
+    def test_entry_ttl_overrides_cache_ttl(self):
+        cache = TtlCache(ttl=0.05)
+        cache.Set('short', 1)
+        cache.Set('long', 2, ttl=60)
+        time.sleep(0.1)
+        self.assertEqual(cache.Items(), [('long', 2)])
+
+    def test_no_ttl_never_expires(self):
+        cache = TtlCache(ttl=None)
+        cache.Set('a', 1)
+        time.sleep(0.05)
+        self.assertEqual(cache.Get('a'), 1)
+
+    def test_maxsize_evicts_least_recently_used(self):
+        cache = TtlCache(ttl=60, maxsize=2)
+        cache.Set('a', 1)
+        cache.Set('b', 2)
+        # touch 'a' so that 'b' is the oldest
+        cache.Get('a')
+        cache.Set('c', 3)
+        self.assertEqual(sorted(cache.Keys()), ['a', 'c'])
+
+    def test_get_or_load_only_loads_missing_or_expired(self):
+        loads = []
+
+        def loader(key):
+            loads.append(key)
+            return key * 2
+
+        cache = TtlCache(ttl=0.05)
+        self.assertEqual(cache.GetOrLoad(2, loader), 4)
+        self.assertEqual(cache.GetOrLoad(2, loader), 4)
+        self.assertEqual(loads, [2])
+        time.sleep(0.1)
+        self.assertEqual(cache.GetOrLoad(2, loader), 4)
+        self.assertEqual(loads, [2, 2])
+
+    def test_get_or_load_does_not_cache_failures(self):
+        def loader(key):
+            raise RuntimeError('unavailable')
+
+        cache = TtlCache(ttl=60)
+        with self.assertRaises(RuntimeError):
+            cache.GetOrLoad('a', loader)
+        self.assertNotIn('a', cache)
+
+    def test_invalidate_and_clear(self):
+        cache = TtlCache(ttl=60)
+        cache.Set('a', 1)
+        cache.Set('b', 2)
+        cache.Invalidate('a')
+        self.assertEqual(cache.Keys(), ['b'])
+        cache.Clear()
+        self.assertEqual(len(cache), 0)
@@ -0,0 +1,63 @@
+import threading
+import unittest
+
+from cloudbackup.common.command import Command
+from cloudbackup.common.connections import get_adapter, get_session
+
+
+class Account(object):
+    pass
+
+
+class TestGetSession(unittest.TestCase):
+    def _in_thread(self, fn):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(fn()))
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def test_same_thread_and_account_share_a_session(self):
+        account = Account()
+        self.assertIs(get_session(account), get_session(account))
+        self.assertIs(get_session(), get_session())
+
+    def test_accounts_have_their_own_sessions(self):
+        first = Account()
+        second = Account()
+        self.assertIsNot(get_session(first), get_session(second))
+        self.assertIsNot(get_session(first), get_session())
+
+    def test_threads_have_their_own_sessions(self):
+        account = Account()
+        self.assertIsNot(self._in_thread(lambda: get_session(account)), get_session(account))
+        self.assertIsNot(self._in_thread(get_session), get_session())
+
+    def test_sessions_share_the_connection_pool(self):
+        account = Account()
+        sessions = [get_session(), get_session(account), self._in_thread(get_session)]
+        for session in sessions:
+            self.assertIs(session.get_adapter('https://example.com/'), get_adapter())
+            self.assertIs(session.get_adapter('http://example.com/'), get_adapter())
+
+
+class TestCommandSession(unittest.TestCase):
+    def test_session_follows_the_authenticator(self):
+        account = Account()
+        first = Command(True, 'localhost', '/')
+        second = Command(True, 'localhost', '/')
+        first.authenticator = account
+        second.authenticator = account
+        self.assertIs(first.session, get_session(account))
+        self.assertIs(first.session, second.session)
+
+    def test_command_without_authenticator_has_its_own_session(self):
+        first = Command(True, 'localhost', '/')
+        second = Command(True, 'localhost', '/')
+        self.assertIsNot(first.session, second.session)
+
+    def test_assigned_session_is_used(self):
+        command = Command(True, 'localhost', '/')
+        session = object()
+        command.session = session
+        self.assertIs(command.session, session)
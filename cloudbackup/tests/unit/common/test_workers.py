@@ -0,0 +1,132 @@
+import threading
+import time
+import unittest
+
+from cloudbackup.common.workers import RateLimiter, run_concurrently, run_pipeline
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst_does_not_wait(self):
+        limiter = RateLimiter(rate=1.0, burst=5)
+        start = time.time()
+        for _ in range(5):
+            limiter.Acquire()
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_waits_once_burst_is_used(self):
+        limiter = RateLimiter(rate=20.0, burst=1)
+        start = time.time()
+        for _ in range(5):
+            limiter.Acquire()
+        # 4 calls beyond the burst at 20 per second
+        self.assertGreaterEqual(time.time() - start, 0.15)
+
+    def test_no_rate_never_waits(self):
+        limiter = RateLimiter(rate=None, burst=1)
+        start = time.time()
+        for _ in range(100):
+            limiter.Acquire()
+        self.assertLess(time.time() - start, 0.5)
+
+
+class TestRunConcurrently(unittest.TestCase):
+    def test_all_items_are_processed(self):
+        results = dict((item, result) for item, result, ex in run_concurrently(lambda item: item * 2, range(20), max_workers=4))
+        self.assertEqual(results, dict((item, item * 2) for item in range(20)))
+
+    def test_failures_are_returned_not_raised(self):
+        def fn(item):
+            if item % 2:
+                raise ValueError(item)
+            return item
+
+        outcomes = list(run_concurrently(fn, range(6), max_workers=3))
+        self.assertEqual(len(outcomes), 6)
+        failed = sorted(item for item, result, ex in outcomes if ex is not None)
+        self.assertEqual(failed, [1, 3, 5])
+        for item, result, ex in outcomes:
+            if ex is not None:
+                self.assertIsNone(result)
+                self.assertIsInstance(ex, ValueError)
+
+    def test_no_items(self):
+        self.assertEqual(list(run_concurrently(lambda item: item, [])), [])
+
+    def test_max_workers_is_respected(self):
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def fn(item):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+        list(run_concurrently(fn, range(20), max_workers=3))
+        self.assertLessEqual(active[1], 3)
+
+
+class TestRunPipeline(unittest.TestCase):
+    def test_items_pass_through_every_stage(self):
+        stages = [
+            ('double', lambda: (lambda value: value * 2), 2),
+            ('increment', lambda: (lambda value: value + 1), 3)
+        ]
+        results = list(run_pipeline(range(50), stages, queue_size=2))
+        self.assertEqual(sorted(result for item, result, failed_stage, ex in results), [item * 2 + 1 for item in range(50)])
+        for item, result, failed_stage, ex in results:
+            self.assertEqual(result, item * 2 + 1)
+            self.assertIsNone(failed_stage)
+            self.assertIsNone(ex)
+
+    def test_failed_item_skips_later_stages(self):
+        def check(value):
+            if value == 3:
+                raise ValueError(value)
+            return value
+
+        later = []
+
+        def record(value):
+            later.append(value)
+            return value
+
+        stages = [('check', lambda: check, 2), ('record', lambda: record, 2)]
+        results = dict((item, (failed_stage, ex)) for item, result, failed_stage, ex in run_pipeline(range(6), stages))
+        self.assertEqual(results[3][0], 'check')
+        self.assertIsInstance(results[3][1], ValueError)
+        self.assertNotIn(3, later)
+        self.assertEqual(sorted(later), [0, 1, 2, 4, 5])
+
+    def test_factory_failure_fails_items_instead_of_hanging(self):
+        def factory():
+            raise IOError('no connection')
+
+        stages = [('first', lambda: (lambda value: value), 2), ('broken', factory, 3)]
+        results = []
+
+        def consume():
+            results.extend(run_pipeline(range(20), stages, queue_size=2))
+
+        consumer = threading.Thread(target=consume)
+        consumer.daemon = True
+        consumer.start()
+        consumer.join(10)
+        self.assertFalse(consumer.is_alive())
+        self.assertEqual(len(results), 20)
+        for item, result, failed_stage, ex in results:
+            self.assertEqual(failed_stage, 'broken')
+            self.assertIsInstance(ex, IOError)
+
+    def test_factory_is_called_once_per_worker(self):
+        calls = []
+
+        def factory():
+            calls.append(threading.current_thread().name)
+            return lambda value: value
+
+        list(run_pipeline(range(10), [('stage', factory, 3)]))
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(set(calls)), 3)
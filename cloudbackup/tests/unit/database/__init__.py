@@ -0,0 +1,4 @@
+"""
+Rackspace Cloud Backup API
+Unit Tests - Database
+"""
@@ -0,0 +1,153 @@
+import unittest
+
+from cloudbackup.client.agents import AgentConfiguration
+from cloudbackup.database.mirror import AccountMirror
+
+
+def agent_entry(machine_agent_id, status='Online'):
+    return {
+        'MachineAgentId': machine_agent_id,
+        'MachineName': 'web{0:}'.format(machine_agent_id),
+        'HostServerId': 'host{0:}'.format(machine_agent_id),
+        'IPAddress': '10.0.0.{0:}'.format(machine_agent_id),
+        'Datacenter': 'DFW',
+        'Status': status,
+        'AgentVersion': '1.0',
+        'IsDisabled': False,
+        'BackupVaultSize': '1 KB',
+        'TimeOfLastSuccessfulBackup': '/Date({0:})/'.format(machine_agent_id * 1000)
+    }
+
+
+class FakeAgents(object):
+    """
+    Each agent has one backup configuration (agent id * 10) unless given others in 'configurations'
+    """
+
+    def __init__(self, machine_agent_ids):
+        self.agentlist = [agent_entry(machine_agent_id) for machine_agent_id in machine_agent_ids]
+        self.configurations = {}
+        self.failing = set()
+
+    def GetAgentList(self):
+        return [dict(agent) for agent in self.agentlist]
+
+    def IterAgentConfigurations(self, machine_agent_ids, max_workers=10):
+        for machine_agent_id in machine_agent_ids:
+            if machine_agent_id in self.failing:
+                yield (machine_agent_id, None, RuntimeError('agent {0:} not available'.format(machine_agent_id)))
+                continue
+            config_ids = self.configurations.get(machine_agent_id, [machine_agent_id * 10])
+            backup_configurations = [{'Id': config_id, 'Name': 'backup{0:}'.format(config_id), 'IsActive': True} for config_id in config_ids]
+            yield (machine_agent_id, AgentConfiguration({'BackupConfigurations': backup_configurations, 'Volumes': []}), None)
+
+
+class FakeBackups(object):
+    """
+    Each backup configuration has two completed backups: config id * 100 and config id * 100 + 1
+    """
+
+    def __init__(self):
+        self.failing = set()
+        self.reports = []
+
+    def _get_completed_backups(self, backup_config_id):
+        if backup_config_id in self.failing:
+            raise RuntimeError('backup configuration {0:} not available'.format(backup_config_id))
+        return [{'BackupId': backup_config_id * 100 + index, 'MachineAgentId': backup_config_id // 10,
+                 'CompletedTime': '/Date({0:})/'.format((index + 1) * 5000), 'NumErrors': 0} for index in range(2)]
+
+    def GetBackupReport(self, backup_id):
+        self.reports.append(backup_id)
+        return {'BackupId': backup_id, 'State': 'Completed'}
+
+
+class TestAccountMirror(unittest.TestCase):
+    def setUp(self):
+        self.agents = FakeAgents([1, 2, 3])
+        self.backups = FakeBackups()
+        self.mirror = AccountMirror(':memory:', self.agents, self.backups)
+
+    def _backup_ids(self, **kwargs):
+        return sorted(backup['BackupId'] for backup in self.mirror.GetCompletedBackups(**kwargs))
+
+    def test_first_refresh_mirrors_everything(self):
+        summary = self.mirror.Refresh(reports=True)
+        self.assertEqual(summary['Agents'], 3)
+        self.assertEqual(sorted(summary['Changed']), [1, 2, 3])
+        self.assertEqual(summary['Removed'], [])
+        self.assertEqual(summary['Errors'], {})
+        self.assertEqual(self.mirror.GetAgentIds(), [1, 2, 3])
+        self.assertEqual(self.mirror.FindAgents(ip_address='10.0.0.2')[0]['MachineAgentId'], 2)
+        self.assertEqual([config['Id'] for config in self.mirror.GetBackupConfigurations(2)], [20])
+        self.assertEqual(self._backup_ids(machine_agent_id=1), [1000, 1001])
+        self.assertEqual(self._backup_ids(backup_config_id=10, since=10000), [1001])
+        self.assertEqual(self.mirror.GetBackupReport(3000), {'BackupId': 3000, 'State': 'Completed'})
+        self.assertEqual(len(self.backups.reports), 6)
+        self.assertIsNotNone(self.mirror.LastRefresh)
+
+    def test_unchanged_agents_are_not_reported_as_changed(self):
+        self.mirror.Refresh()
+        self.agents.agentlist[1]['Status'] = 'Offline'
+        summary = self.mirror.Refresh()
+        self.assertEqual(summary['Changed'], [2])
+        self.assertEqual(self.mirror.GetAgent(2)['Status'], 'Offline')
+        self.assertEqual(sorted(self.mirror.Refresh(full=True)['Changed']), [1, 2, 3])
+
+    def test_new_backup_configuration_is_mirrored_without_an_agent_change(self):
+        self.mirror.Refresh()
+        self.agents.configurations[1] = [10, 11]
+        summary = self.mirror.Refresh()
+        self.assertEqual(summary['Changed'], [])
+        self.assertEqual(sorted(config['Id'] for config in self.mirror.GetBackupConfigurations(1)), [10, 11])
+        self.assertEqual(self._backup_ids(machine_agent_id=1), [1000, 1001, 1100, 1101])
+
+    def test_removed_backup_configuration_drops_its_completed_backups(self):
+        self.agents.configurations[1] = [10, 11]
+        self.mirror.Refresh(reports=True)
+        self.agents.configurations[1] = [11]
+        self.mirror.Refresh()
+        self.assertEqual([config['Id'] for config in self.mirror.GetBackupConfigurations(1)], [11])
+        self.assertEqual(self._backup_ids(machine_agent_id=1), [1100, 1101])
+        self.assertIsNone(self.mirror.GetBackupReport(1000))
+        self.assertIsNotNone(self.mirror.GetBackupReport(1100))
+
+    def test_removed_agent_is_deleted(self):
+        self.mirror.Refresh(reports=True)
+        del self.agents.agentlist[2]
+        summary = self.mirror.Refresh()
+        self.assertEqual(summary['Removed'], [3])
+        self.assertEqual(self.mirror.GetAgentIds(), [1, 2])
+        self.assertIsNone(self.mirror.GetAgentConfiguration(3))
+        self.assertEqual(self.mirror.GetBackupConfigurations(3), [])
+        self.assertEqual(self._backup_ids(machine_agent_id=3), [])
+        self.assertIsNone(self.mirror.GetBackupReport(3000))
+
+    def test_agent_configuration_failure_is_retried_on_the_next_refresh(self):
+        self.agents.failing.add(2)
+        summary = self.mirror.Refresh()
+        self.assertEqual(list(summary['Errors']), [('agent_configuration', 2)])
+        self.assertIsNone(self.mirror.GetAgentConfiguration(2))
+
+        self.agents.failing.clear()
+        summary = self.mirror.Refresh()
+        self.assertEqual(summary['Changed'], [2])
+        self.assertEqual(summary['Errors'], {})
+        self.assertIsNotNone(self.mirror.GetAgentConfiguration(2))
+        self.assertEqual(self._backup_ids(machine_agent_id=2), [2000, 2001])
+        self.assertEqual(self.mirror.Refresh()['Changed'], [])
+
+    def test_completed_backups_failure_is_retried_on_the_next_refresh(self):
+        self.backups.failing.add(30)
+        summary = self.mirror.Refresh()
+        self.assertEqual(list(summary['Errors']), [('completed_backups', 30)])
+        self.assertEqual(self._backup_ids(machine_agent_id=3), [])
+
+        self.backups.failing.clear()
+        summary = self.mirror.Refresh()
+        self.assertEqual(summary['Changed'], [3])
+        self.assertEqual(self._backup_ids(machine_agent_id=3), [3000, 3001])
+
+    def test_stale_agents(self):
+        self.mirror.Refresh()
+        self.assertEqual(sorted(agent['MachineAgentId'] for agent in self.mirror.GetStaleAgents(2500)), [1, 2])
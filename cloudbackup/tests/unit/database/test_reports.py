@@ -0,0 +1,104 @@
+import threading
+import unittest
+
+from cloudbackup.database.reports import REPORT_BACKUP, REPORT_RESTORE, ReportStore
+
+
+class FakeBackups(object):
+    """
+    Backup reports are Completed except for the ids in 'running'; the ids in 'failing' raise
+    """
+
+    def __init__(self, running=(), failing=()):
+        self.running = set(running)
+        self.failing = set(failing)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def GetBackupReport(self, backup_id):
+        with self._lock:
+            self.calls.append(backup_id)
+        if backup_id in self.failing:
+            raise RuntimeError('report {0:} not available'.format(backup_id))
+        return {'BackupId': backup_id, 'State': 'InProgress' if backup_id in self.running else 'Completed'}
+
+
+class FakeRestores(object):
+    def __init__(self, states):
+        self.states = states
+        self.calls = []
+
+    def GetRestoreReport(self, restore_id):
+        self.calls.append(restore_id)
+        if restore_id not in self.states:
+            return {}
+        return {'RestoreId': restore_id, 'State': self.states[restore_id]}
+
+
+class TestReportStore(unittest.TestCase):
+    def test_final_reports_are_only_retrieved_once(self):
+        backups = FakeBackups()
+        store = ReportStore(':memory:', backups=backups)
+        reports, errors = store.GetBackupReports(range(10))
+        self.assertEqual(sorted(reports), list(range(10)))
+        self.assertEqual(errors, {})
+        self.assertEqual(len(store), 10)
+
+        reports, errors = store.GetBackupReports(range(10))
+        self.assertEqual(reports[4], {'BackupId': 4, 'State': 'Completed'})
+        self.assertEqual(len(backups.calls), 10)
+        self.assertEqual(store.hits, 10)
+        self.assertEqual(store.misses, 10)
+
+    def test_running_reports_are_not_stored(self):
+        backups = FakeBackups(running=[2])
+        store = ReportStore(':memory:', backups=backups)
+        store.GetBackupReports([1, 2])
+        store.GetBackupReports([1, 2])
+        self.assertEqual(sorted(backups.calls), [1, 2, 2])
+        self.assertEqual(len(store), 1)
+
+    def test_repeated_ids_are_retrieved_once(self):
+        backups = FakeBackups()
+        store = ReportStore(':memory:', backups=backups)
+        reports, errors = store.GetBackupReports([1, 2, 1, 1, 2])
+        self.assertEqual(sorted(reports), [1, 2])
+        self.assertEqual(sorted(backups.calls), [1, 2])
+
+    def test_failures_are_returned_and_not_stored(self):
+        backups = FakeBackups(failing=[3])
+        store = ReportStore(':memory:', backups=backups)
+        reports, errors = store.GetBackupReports([1, 3])
+        self.assertEqual(list(reports), [1])
+        self.assertIsInstance(errors[3], RuntimeError)
+        with self.assertRaises(RuntimeError):
+            store.GetBackupReport(3)
+        self.assertEqual(backups.calls.count(3), 2)
+
+    def test_restore_reports_stop_requested_is_not_final(self):
+        restores = FakeRestores({1: 'Completed WithErrors', 2: 'StopRequested', 3: 'Stopped'})
+        store = ReportStore(':memory:', restores=restores)
+        reports, errors = store.GetRestoreReports([1, 2, 3, 4])
+        self.assertEqual(sorted(reports), [1, 2, 3])
+        self.assertEqual(list(errors), [4])
+        store.GetRestoreReports([1, 2, 3])
+        self.assertEqual(sorted(restores.calls), [1, 2, 2, 3, 4])
+
+    def test_is_final(self):
+        self.assertTrue(ReportStore.IsFinal(REPORT_BACKUP, {'State': 'Failed'}))
+        self.assertFalse(ReportStore.IsFinal(REPORT_BACKUP, {'State': 'InProgress'}))
+        self.assertTrue(ReportStore.IsFinal(REPORT_RESTORE, {'State': 'CompletedWithErrors'}))
+        self.assertFalse(ReportStore.IsFinal(REPORT_RESTORE, {'State': 'StopRequested'}))
+
+    def test_forget_retrieves_again(self):
+        backups = FakeBackups()
+        store = ReportStore(':memory:', backups=backups)
+        store.GetBackupReport(1)
+        store.Forget(REPORT_BACKUP, 1)
+        store.GetBackupReport(1)
+        self.assertEqual(backups.calls, [1, 1])
+
+    def test_missing_client_is_an_error(self):
+        store = ReportStore(':memory:')
+        with self.assertRaises(ValueError):
+            store.GetBackupReports([1])
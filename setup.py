@@ -48,6 +48,9 @@ setup(
     packages=find_packages(),
     zip_safe=False,
     install_requires=REQUIRES,
+    extras_require={
+        'analytics': ['numpy']
+    },
     include_package_data=True,
     classifiers=[
         'Development Status :: 4 - Beta',